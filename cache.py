@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of the geometries and images of crystals."""
+
+from __future__ import division
+import errno
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import numpy
+from generator import Crystal
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Fraction of the size cap left after an eviction, so that the cache is
+# not scanned again at each put once it is full
+LOW_WATER = 0.9
+
+_generator_version = []
+
+
+def generator_version():
+    """
+    Hash of the source of crystalpy, so that the entries written by
+    another version of the generator are never used.
+    """
+    if not _generator_version:
+        digest = hashlib.sha1()
+        for path in sorted(glob.glob(os.path.join(SOURCE_DIRECTORY,
+                                                  '*.py'))):
+            digest.update(os.path.basename(path))
+            digest.update(open(path, 'rb').read())
+        _generator_version.append(digest.hexdigest())
+    return _generator_version[0]
+
+
+def canonical(value):
+    """
+    Plain form of a value of a crystal description, made of dicts, lists
+    and numbers, which gives the same JSON for equal descriptions.  The
+    objects (inclusion types, sparse maps...) are given by their class
+    and their attributes, and the arrays by their type and their items.
+    """
+    if isinstance(value, dict):
+        return dict([(str(key), canonical(item))
+                     for key, item in value.iteritems()])
+    elif isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    elif isinstance(value, numpy.ndarray):
+        return {'dtype': str(value.dtype), 'shape': list(value.shape),
+                'items': canonical(value.tolist())}
+    elif isinstance(value, numpy.generic):
+        return value.item()
+    elif hasattr(value, '__dict__'):
+        return {'class': value.__class__.__name__,
+                'attributes': canonical(vars(value))}
+    return value
+
+
+def description_key(description):
+    """Hash of a crystal description, with the version of the generator."""
+    text = json.dumps([generator_version(), canonical(description)],
+                      sort_keys=True)
+    return hashlib.sha256(text).hexdigest()
+
+
+class GeometryCache:
+    def __init__(self, directory, max_size=2 ** 30):
+        """
+        Cache of the .geo and .svg outputs of crystals, by hash of their
+        description.
+
+        The entries are written to temporary files, then renamed, so that
+        several processes can share the cache: a reader either finds a
+        whole entry or none.  The modification time of an entry is its
+        last use, and the least recently used entries are deleted when
+        the cache grows over max_size bytes, down to LOW_WATER times it.
+
+        The size of the cache is only scanned at the first put, then kept
+        up to date with the entries stored through this object.  The
+        entries stored by other processes are thus only counted at the
+        next eviction, and the cache may go over its cap by them.
+
+        @param max_size: size cap of the cache, in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        # Running size of the cache, None until it is scanned
+        self.known_size = None
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError, error:
+                if error.errno != errno.EEXIST:
+                    raise
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2],
+                            "%s.%s" % (key, extension))
+
+    def get(self, key, extension):
+        """Content of an entry, None if it is not in the cache."""
+        path = self.path(key, extension)
+        try:
+            content = open(path, 'rb').read()
+            os.utime(path, None)
+        except (IOError, OSError), error:
+            # Missing, or deleted by another process in the meantime
+            if error.errno != errno.ENOENT:
+                raise
+            return None
+        return content
+
+    def put(self, key, extension, content):
+        """Store an entry, then evict the oldest ones over the size cap."""
+        path = self.path(key, extension)
+        subdirectory = os.path.dirname(path)
+        if not os.path.isdir(subdirectory):
+            try:
+                os.makedirs(subdirectory)
+            except OSError, error:
+                if error.errno != errno.EEXIST:
+                    raise
+        handle, temporary = tempfile.mkstemp(dir=subdirectory,
+                                             suffix='.tmp')
+        fileobj = os.fdopen(handle, 'wb')
+        fileobj.write(content)
+        fileobj.close()
+        try:
+            replaced_size = os.stat(path).st_size
+        except OSError:
+            replaced_size = 0
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            # Another process stored the same entry first (Windows)
+            os.remove(temporary)
+            if not os.path.exists(path):
+                raise
+        if self.known_size is None:
+            self.known_size = self.size()
+        else:
+            self.known_size += len(content) - replaced_size
+        if self.known_size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        """(last use, size, path) of the entries, the oldest first."""
+        result = []
+        for path in glob.glob(os.path.join(self.directory, '*', '*.*')):
+            if path.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, path))
+        return sorted(result)
+
+    def size(self):
+        return sum([size for _, size, _ in self.entries()])
+
+    def evict(self):
+        """
+        Delete the least recently used entries, until the cache is under
+        LOW_WATER times its size cap.
+        """
+        entries = self.entries()
+        total = sum([size for _, size, _ in entries])
+        for _, size, path in entries:
+            if total <= LOW_WATER * self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already deleted by another process
+                pass
+            total -= size
+        self.known_size = total
+
+    def mesh(self, description):
+        """Gmsh geometry of a crystal, as Crystal(**description).mesh()."""
+        key = description_key(description)
+        content = self.get(key, 'geo')
+        if content is None:
+            content = Crystal(**description).mesh()
+            self.put(key, 'geo', content)
+        return content
+
+    def image(self, description):
+        """SVG image of a crystal, as saved by Crystal.image()."""
+        key = description_key(description)
+        content = self.get(key, 'svg')
+        if content is None:
+            svg = Crystal(**description).image()
+            content = svg.wrap_xml(svg.getXML(), 'ISO-8859-1', 'no')
+            self.put(key, 'svg', content)
+        return content
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Array-backed storage of the Gmsh entities of a crystal."""
+
+from __future__ import division
+import numpy
+from merging import SharedEntities
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Number of rows formatted together before each write to the output file
+CHUNK_SIZE = 4096
+
+POINT_DTYPE = [('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+               ('size', 'f8'), ('size_id', 'i4')]
+
+# Kind codes of the entities sharing the line ids, with their number of
+# references (None when variable)
+KINDS = ['Line', 'Circle', 'Ellipse', 'Line Loop', 'Plane Surface',
+         'Ruled Surface', 'Surface Loop', 'Volume']
+KIND_CODES = dict((kind, code) for code, kind in enumerate(KINDS))
+KIND_ARITIES = [2, 3, 4, None, 1, 1, None, 1]
+# Any other entity (periodicity constraints...) is kept as an object
+OBJECT_KIND = len(KINDS)
+
+
+class GrowingArray:
+    """
+    Numpy array with an amortized constant time append.
+
+    The appended values are buffered in a list and copied to the array by
+    chunks, which is much faster than setting the array items one by one.
+    """
+
+    def __init__(self, dtype, capacity=CHUNK_SIZE):
+        self.array = numpy.empty(capacity, dtype=dtype)
+        self.size = 0
+        self.pending = []
+
+    def flush(self):
+        if self.pending:
+            size = self.size + len(self.pending)
+            if size > len(self.array):
+                capacity = max(size, 2 * len(self.array))
+                array = numpy.empty(capacity, dtype=self.array.dtype)
+                array[:self.size] = self.array[:self.size]
+                self.array = array
+            self.array[self.size:size] = numpy.array(self.pending,
+                                                     dtype=self.array.dtype)
+            self.size = size
+            self.pending = []
+
+    def append(self, value):
+        self.pending.append(value)
+        if len(self.pending) >= CHUNK_SIZE:
+            self.flush()
+
+    def extend(self, values):
+        self.pending.extend(values)
+        if len(self.pending) >= CHUNK_SIZE:
+            self.flush()
+
+    def data(self):
+        self.flush()
+        return self.array[:self.size]
+
+    def __len__(self):
+        return self.size + len(self.pending)
+
+
+def format_rows(template, columns):
+    """Format the rows made of the given columns, all at once."""
+    nb_rows = len(columns[0])
+    table = numpy.empty((nb_rows, len(columns)), dtype=object)
+    for index, column in enumerate(columns):
+        table[:, index] = column
+    return (template * nb_rows) % tuple(table.ravel().tolist())
+
+
+class ArrayGeometry:
+    """
+    Geometry storing the points and lines in numpy arrays.
+
+    It has the same interface as generator.Geometry, but it does not keep
+    the entity objects: the points are stored as coordinates plus a size
+    index, and the lines, loops, surfaces and volumes as a kind code plus
+    the signed ids they refer to.  The coordinates are written with 16
+    significant digits, so the output is not byte-identical to the one
+    of generator.Geometry.
+
+    The entities are still created as objects by the shapes, which keep
+    their lines until the geometry is written, so only the memory held
+    afterwards is much smaller than with generator.Geometry, not the peak
+    memory (see README.rst).
+    """
+
+    def __init__(self, merge_tolerance=None):
+        self.values = []
+        self.value_ids = {}
+        self.points = GrowingArray(POINT_DTYPE)
+        self.kinds = GrowingArray('i1')
+        self.offsets = GrowingArray('i8')
+        self.refs = GrowingArray('i8')
+        self.objects = {}
+        self.physical_entities = []
+        self.shared = None
+        if merge_tolerance is not None:
+            self.shared = SharedEntities(merge_tolerance)
+
+    def add_value(self, value):
+        assert value.name not in self.value_ids
+        self.value_ids[value.name] = len(self.values)
+        self.values.append(value)
+
+    def add_point(self, point):
+        if point.size in self.value_ids:
+            self.points.append((point.x, point.y, point.z,
+                                0, self.value_ids[point.size]))
+        else:
+            self.points.append((point.x, point.y, point.z, point.size, -1))
+        return len(self.points)
+
+    def add_line(self, line):
+        code = KIND_CODES.get(getattr(line, 'kind', None), OBJECT_KIND)
+        self.kinds.append(code)
+        self.offsets.append(len(self.refs))
+        if code == OBJECT_KIND:
+            self.objects[len(self.kinds)] = line
+        else:
+            self.refs.extend(line.refs())
+        return len(self.kinds)
+
+    def add_physical_entity(self, entity):
+        self.physical_entities.append(entity)
+
+    def section(self, name, slot=None):
+        """The entities are not grouped by sections here."""
+
+    def write_values(self, fileobj):
+        fileobj.write(''.join([repr(value) for value in self.values]))
+
+    def write_points(self, fileobj):
+        points = self.points.data()
+        names = numpy.array([value.name for value in self.values] + [None],
+                            dtype=object)
+        for start in range(0, len(points), CHUNK_SIZE):
+            chunk = points[start:start + CHUNK_SIZE]
+            sizes = names[chunk['size_id']]
+            numeric = chunk['size_id'] < 0
+            sizes[numeric] = ['%.16g' % size
+                              for size in chunk['size'][numeric].tolist()]
+            ids = numpy.arange(start + 1, start + len(chunk) + 1)
+            fileobj.write(format_rows(
+                "Point(%d) = {%.16g, %.16g, %.16g, %s};\n",
+                [ids, chunk['x'], chunk['y'], chunk['z'], sizes]))
+
+    def write_lines(self, fileobj):
+        kinds = self.kinds.data()
+        offsets = numpy.append(self.offsets.data(), len(self.refs))
+        refs = self.refs.data()
+        # Split the lines into blocks of the same kind
+        bounds = numpy.flatnonzero(numpy.diff(kinds)) + 1
+        starts = numpy.concatenate(([0], bounds)).tolist()
+        ends = numpy.concatenate((bounds, [len(kinds)])).tolist()
+        for block_start, block_end in zip(starts, ends):
+            for start in range(block_start, block_end, CHUNK_SIZE):
+                end = min(start + CHUNK_SIZE, block_end)
+                self.write_block(fileobj, kinds[start], start, end,
+                                 offsets, refs)
+
+    def write_block(self, fileobj, code, start, end, offsets, refs):
+        ids = numpy.arange(start + 1, end + 1)
+        if code == OBJECT_KIND:
+            fileobj.write(''.join([repr(self.objects[line_id])
+                                   for line_id in ids.tolist()]))
+        elif KIND_ARITIES[code] is None:
+            fileobj.write(''.join(
+                ["%s(%d) = {%s};\n"
+                 % (KINDS[code], line_id,
+                    ', '.join(map(str, refs[begin:finish].tolist())))
+                 for line_id, begin, finish
+                 in zip(ids.tolist(), offsets[start:end].tolist(),
+                        offsets[start + 1:end + 1].tolist())]))
+        else:
+            arity = KIND_ARITIES[code]
+            block = refs[offsets[start]:offsets[end]].reshape(-1, arity)
+            template = ("%s(%%d) = {%s};\n"
+                        % (KINDS[code], ', '.join(['%d'] * arity)))
+            fileobj.write(format_rows(template, [ids] + list(block.T)))
+
+    def write(self, fileobj):
+        self.write_values(fileobj)
+        fileobj.write('\n')
+        self.write_points(fileobj)
+        fileobj.write('\n')
+        self.write_lines(fileobj)
+        fileobj.write('\n')
+        fileobj.write(''.join([repr(entity)
+                               for entity in self.physical_entities]))
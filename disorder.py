@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Generation of the sites of disordered crystals."""
+
+from __future__ import division
+import numpy
+from lattice import make_sites, site_dimensions
+from validation import find_conflicts
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Number of candidate inclusions drawn at once by random_packing
+BATCH_SIZE = 1024
+
+# Neighbouring cells of a cell, itself included
+NEIGHBOURS = [(offset_x, offset_y) for offset_x in (-1, 0, 1)
+              for offset_y in (-1, 0, 1)]
+
+
+def jitter(sites, sigma, inclusion_types, min_gap=0, seed=None,
+           max_attempts=1000):
+    """
+    Return a copy of the sites, moved by a gaussian noise.
+
+    The displacements of the sites which overlap another one, or are
+    closer than min_gap, are drawn again (see redraw_conflicts).
+
+    @param sigma: standard deviation of the displacements along x and y
+    """
+    random = numpy.random.RandomState(seed)
+
+    def draw(result, indices):
+        result['x'][indices] = (sites['x'][indices]
+                                + random.normal(0, sigma, len(indices)))
+        result['y'][indices] = (sites['y'][indices]
+                                + random.normal(0, sigma, len(indices)))
+
+    return redraw_conflicts(sites, inclusion_types, draw, min_gap,
+                            max_attempts)
+
+
+def random_dims(sites, inclusion_types, spread, min_gap=0, seed=None,
+                max_attempts=1000):
+    """
+    Return a copy of the sites, with random dimensions.
+
+    The dimensions of the type of each site are scaled by a factor drawn
+    uniformly in [1 - spread, 1 + spread], which keeps their aspect ratio.
+    The factors of the sites which overlap another one, or are closer
+    than min_gap, are drawn again (see redraw_conflicts).
+    """
+    assert 0 <= spread < 1, "Wrong spread!"
+    random = numpy.random.RandomState(seed)
+    types_dim_x = numpy.array([numpy.nan if type is None else type.dim_x
+                               for type in inclusion_types])
+    types_dim_y = numpy.array([numpy.nan if type is None else type.dim_y
+                               for type in inclusion_types])
+
+    def draw(result, indices):
+        scales = random.uniform(1 - spread, 1 + spread, len(indices))
+        types = sites['type'][indices]
+        result['dim_x'][indices] = types_dim_x[types] * scales
+        result['dim_y'][indices] = types_dim_y[types] * scales
+
+    return redraw_conflicts(sites, inclusion_types, draw, min_gap,
+                            max_attempts)
+
+
+def redraw_conflicts(sites, inclusion_types, draw, min_gap, max_attempts):
+    """
+    Apply a random change to a copy of the sites, then draw it again for
+    the sites in conflict, until no two inclusions overlap or are closer
+    than min_gap.  The conflicts are found with validation.find_conflicts,
+    which only compares the inclusions of neighbouring grid cells.  Of
+    each pair in conflict, the second site is drawn again.
+
+    @param draw: function(result, indices) drawing the change of the
+        sites of the given indices into result
+    """
+    result = sites.copy()
+    dim_x, dim_y, _ = site_dimensions(sites, inclusion_types)
+    present = numpy.flatnonzero(~numpy.isnan(dim_x))
+    indices = present
+    for _ in range(max_attempts):
+        draw(result, indices)
+        dim_x, dim_y, ellipse = site_dimensions(result[present],
+                                                inclusion_types)
+        report = find_conflicts(result['x'][present],
+                                result['y'][present], dim_x / 2,
+                                dim_y / 2, ellipse, numpy.inf, numpy.inf,
+                                min_gap)
+        seconds = ([second for _, second in report.overlaps]
+                   + [second for _, second, _ in report.too_close])
+        if not seconds:
+            return result
+        indices = present[numpy.unique(seconds)]
+    raise Exception('Overlapping sites after %d draws' % max_attempts)
+
+
+def random_packing(dim_x,
+                   dim_y,
+                   type_id,
+                   diameter,
+                   filling_fraction,
+                   spread=0,
+                   min_gap=0,
+                   pos_x=0,
+                   pos_y=0,
+                   seed=None,
+                   max_attempts=1000000):
+    """
+    Return the sites of a random packing of non-overlapping disks.
+
+    The disks are added one by one at random positions inside the matrix
+    (random sequential addition) until they cover filling_fraction of its
+    area.  The candidates are drawn by batches, and each batch is compared
+    at once to the disks of the neighbouring cells of a uniform grid, so
+    the packing takes a linear time.
+
+    @param type_id: type of the inclusions, which should be circular
+    @param diameter: mean diameter of the disks
+    @param spread: the diameters are drawn uniformly in
+        [diameter * (1 - spread), diameter * (1 + spread)]
+    @param min_gap: minimal distance between two disks
+    """
+    assert 0 <= spread < 1, "Wrong spread!"
+    random = numpy.random.RandomState(seed)
+    target_area = filling_fraction * dim_x * dim_y
+    max_diameter = diameter * (1 + spread)
+    # Two disks of neighbouring cells, or farther, can not overlap
+    cell_size = max_diameter + min_gap
+    # Margin of one cell, so that the neighbours of a cell never wrap
+    stride = int(numpy.ceil(dim_y / cell_size)) + 3
+    nb_cells = (int(numpy.ceil(dim_x / cell_size)) + 3) * stride
+    # Disks of each cell, NaN for the free slots, which are never close
+    grid = numpy.empty((3, nb_cells, 4))
+    grid.fill(numpy.nan)
+    counts = numpy.zeros(nb_cells, dtype=int)
+    added_disks = [(numpy.zeros(0),) * 3]
+    area = 0
+    attempts = 0
+
+    while area < target_area:
+        if attempts >= max_attempts:
+            raise Exception('Filling fraction not reached')
+        batch_diameters = random.uniform(diameter * (1 - spread),
+                                         max_diameter, BATCH_SIZE)
+        batch_x = random.uniform(-0.5, 0.5, BATCH_SIZE) \
+            * (dim_x - batch_diameters) + pos_x
+        batch_y = random.uniform(-0.5, 0.5, BATCH_SIZE) \
+            * (dim_y - batch_diameters) + pos_y
+        batch_keys = (
+            (numpy.floor((batch_x - pos_x + dim_x / 2) / cell_size)
+             .astype(numpy.int64) + 1) * stride
+            + numpy.floor((batch_y - pos_y + dim_y / 2) / cell_size)
+            .astype(numpy.int64) + 1)
+
+        free = numpy.ones(BATCH_SIZE, dtype=bool)
+        with numpy.errstate(invalid='ignore'):
+            for offset_x, offset_y in NEIGHBOURS:
+                cells = grid[:, batch_keys + offset_x * stride + offset_y]
+                distances = ((batch_diameters[:, None] + cells[2]) / 2
+                             + min_gap)
+                free &= ~((batch_x[:, None] - cells[0]) ** 2
+                          + (batch_y[:, None] - cells[1]) ** 2
+                          < distances ** 2).any(axis=1)
+        # The candidates are added in order, so of two close candidates
+        # only the first one is kept
+        batch = (batch_x, batch_y, batch_diameters, batch_keys)
+        firsts, seconds = close_disks(batch, batch, stride, min_gap)
+        kept = (firsts < seconds) & free[firsts] & free[seconds]
+        for second, first in sorted(zip(seconds[kept].tolist(),
+                                         firsts[kept].tolist())):
+            if free[first]:
+                free[second] = False
+
+        added = numpy.flatnonzero(free)
+        areas = numpy.cumsum(numpy.concatenate(
+            [[area], numpy.pi * batch_diameters[added]
+             * batch_diameters[added] / 4]))[1:]
+        nb_added = min(numpy.searchsorted(areas, target_area) + 1,
+                       len(added))
+        if nb_added < len(added):
+            attempts += added[nb_added - 1] + 1
+        else:
+            attempts += BATCH_SIZE
+        if not nb_added:
+            continue
+        added = added[:nb_added]
+        area = areas[nb_added - 1]
+        added_disks.append((batch_x[added], batch_y[added],
+                            batch_diameters[added]))
+
+        # Each added disk takes the next free slot of its cell
+        order = numpy.argsort(batch_keys[added], kind='mergesort')
+        added, keys = added[order], batch_keys[added][order]
+        slots = (counts[keys] + numpy.arange(len(keys))
+                 - numpy.searchsorted(keys, keys, 'left'))
+        while slots.max() >= grid.shape[2]:
+            extra = numpy.empty((3, nb_cells, grid.shape[2]))
+            extra.fill(numpy.nan)
+            grid = numpy.concatenate([grid, extra], axis=2)
+        grid[:, keys, slots] = (batch_x[added], batch_y[added],
+                                batch_diameters[added])
+        numpy.add.at(counts, keys, 1)
+
+    xs, ys, diameters = [numpy.concatenate(disks)
+                         for disks in zip(*added_disks)]
+    return make_sites(xs, ys, type_id, diameters, diameters)
+
+
+def close_disks(disks1, disks2, stride, min_gap):
+    """
+    Pairs of disks closer than min_gap, one of each set, the disks being
+    only compared to the ones of the neighbouring cells of a grid.
+
+    @param disks1, disks2: (x, y, diameters, cell keys) of each set, the
+        key of the cell (i, j) being i * stride + j
+    @return: (indices in disks1, indices in disks2)
+    """
+    x1, y1, diameters1, keys1 = disks1
+    x2, y2, diameters2, keys2 = disks2
+    order = numpy.argsort(keys2, kind='mergesort')
+    sorted_keys = keys2[order]
+    firsts, seconds = [], []
+    for offset_x, offset_y in NEIGHBOURS:
+        neighbour_keys = keys1 + offset_x * stride + offset_y
+        starts = numpy.searchsorted(sorted_keys, neighbour_keys, 'left')
+        counts = (numpy.searchsorted(sorted_keys, neighbour_keys, 'right')
+                  - starts)
+        ranks = (numpy.arange(counts.sum())
+                 - numpy.repeat(numpy.cumsum(counts) - counts, counts))
+        firsts.append(numpy.repeat(numpy.arange(len(keys1)), counts))
+        seconds.append(order[numpy.repeat(starts, counts) + ranks])
+    firsts = numpy.concatenate(firsts)
+    seconds = numpy.concatenate(seconds)
+    distances = (diameters1[firsts] + diameters2[seconds]) / 2 + min_gap
+    close = ((x1[firsts] - x2[seconds]) ** 2 + (y1[firsts] - y2[seconds]) ** 2
+             < distances ** 2)
+    return firsts[close], seconds[close]
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Prediction of the size of the meshes, before running Gmsh."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Mean area of the triangles, and volume of the tetrahedra, of the Gmsh
+# meshes of a square and a cube, in units of el_size ** 2 and el_size ** 3.
+# The triangles are nearly equilateral, the tetrahedra are about twice as
+# large as the regular one.
+ELEMENT_MEASURES = {2: numpy.sqrt(3) / 4, 3: 0.223}
+
+# Number of elements per node of those meshes
+ELEMENTS_PER_NODE = {2: 2, 3: 5.7}
+
+# Peak memory used by Gmsh, to mesh and write the elements, in bytes
+GMSH_BASE_MEMORY = 40e6
+GMSH_MEMORY_PER_ELEMENT = {2: 700, 3: 500}
+
+
+def shape_areas(dim_x, dim_y, ellipse):
+    """Areas of ellipses, or of rectangles, given by their dimensions."""
+    return numpy.where(ellipse, numpy.pi / 4, 1) * dim_x * dim_y
+
+
+def extent(centers, dims, domain_dim):
+    """Length of the span of shapes along an axis, inside a domain."""
+    return (min((centers + dims / 2).max(), domain_dim / 2)
+            - max((centers - dims / 2).min(), -domain_dim / 2))
+
+
+def size_density(el_size, dim):
+    """Number of elements per unit of area, or volume, for a uniform size."""
+    return el_size ** -dim
+
+
+def ramp_density(size1, size2, dim):
+    """
+    Mean size_density of a domain along which the element size goes
+    linearly from size1 to size2, like Gmsh does between the points.
+    """
+    if abs(size2 - size1) <= 1e-9 * size1:
+        return size_density(size1, dim)
+    return ((size1 ** (1 - dim) - size2 ** (1 - dim))
+            / ((dim - 1) * (size2 - size1)))
+
+
+class RegionEstimate:
+    def __init__(self, tag, dim):
+        """Size of the mesh of a physical surface, or volume in 3D."""
+        self.tag = tag
+        self.dim = dim
+        self.measure = 0
+        self.nb_elements = 0
+        self.nb_nodes = 0
+
+    def add(self, measure, density):
+        """
+        Add a part of the region.
+
+        @param density: mean size_density of that part
+        """
+        nb_elements = measure * density / ELEMENT_MEASURES[self.dim]
+        self.measure += measure
+        self.nb_elements += nb_elements
+        self.nb_nodes += nb_elements / ELEMENTS_PER_NODE[self.dim]
+
+    def __repr__(self):
+        return ("%s: %.4g, %d elements, %d nodes"
+                % (self.tag, self.measure, self.nb_elements, self.nb_nodes))
+
+
+class MeshEstimate:
+    def __init__(self, dim):
+        """
+        Predicted size of the mesh of a crystal, by region.
+
+        @param dim: 2 for a mesh of triangles, 3 for a mesh of tetrahedra
+        """
+        self.dim = dim
+        self.regions = []
+
+    def region(self, tag):
+        """RegionEstimate of a tag, created at its first use."""
+        for region in self.regions:
+            if region.tag == tag:
+                return region
+        region = RegionEstimate(tag, self.dim)
+        self.regions.append(region)
+        return region
+
+    def nb_elements(self):
+        return int(round(sum([region.nb_elements
+                              for region in self.regions])))
+
+    def nb_nodes(self):
+        return int(round(sum([region.nb_nodes for region in self.regions])))
+
+    def memory(self):
+        """Approximate peak memory used by Gmsh, in bytes."""
+        return (GMSH_BASE_MEMORY
+                + GMSH_MEMORY_PER_ELEMENT[self.dim] * self.nb_elements())
+
+    def size_scale(self, max_elements):
+        """
+        Factor of all the element sizes which brings the mesh to
+        max_elements elements.
+        """
+        assert max_elements > 0, "Wrong element budget!"
+        return (self.nb_elements() / max_elements) ** (1 / self.dim)
+
+    def __repr__(self):
+        return ("%d elements, %d nodes, about %d MB for Gmsh"
+                % (self.nb_elements(), self.nb_nodes(),
+                   self.memory() / 1e6))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Gmsh mesh size fields, refining the mesh near some entities."""
+
+from __future__ import division
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Number of points sampled on each curve by the distance fields
+NB_SAMPLES = 100
+
+
+def field_options(field_id, options):
+    """Gmsh statements setting the options of a field, given by pairs."""
+    return ''.join(["Field[%d].%s = %s;\n" % (field_id, name, value)
+                    for name, value in options])
+
+
+def id_list(entities):
+    return "{%s}" % ', '.join([format(entity.id) for entity in entities])
+
+
+class DistanceField:
+    def __init__(self, geometry, points=[], lines=[], surfaces=[]):
+        """Distance to the nearest of the entities."""
+        self.options = []
+        if points:
+            self.options.append(('NodesList', id_list(points)))
+        if lines:
+            self.options.append(('EdgesList', id_list(lines)))
+            self.options.append(('NNodesByEdge', NB_SAMPLES))
+        if surfaces:
+            self.options.append(('FacesList', id_list(surfaces)))
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Field[%d] = Distance;\n" % self.id
+                + field_options(self.id, self.options))
+
+
+class ThresholdField:
+    def __init__(self, geometry, field, size_min, size_max, dist_min,
+                 dist_max):
+        """
+        Size of size_min where field is below dist_min, growing linearly
+        to size_max where it is above dist_max.
+        """
+        self.options = [('IField', field.id),
+                        ('LcMin', size_min),
+                        ('LcMax', size_max),
+                        ('DistMin', dist_min),
+                        ('DistMax', dist_max)]
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Field[%d] = Threshold;\n" % self.id
+                + field_options(self.id, self.options))
+
+
+class BoxField:
+    def __init__(self, geometry, size_in, size_out, box):
+        """
+        Size of size_in inside the box, and of size_out outside it.
+
+        @param box: (x_min, y_min, z_min, x_max, y_max, z_max)
+        """
+        x_min, y_min, z_min, x_max, y_max, z_max = box
+        self.options = [('VIn', size_in),
+                        ('VOut', size_out),
+                        ('XMin', x_min),
+                        ('XMax', x_max),
+                        ('YMin', y_min),
+                        ('YMax', y_max),
+                        ('ZMin', z_min),
+                        ('ZMax', z_max)]
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Field[%d] = Box;\n" % self.id
+                + field_options(self.id, self.options))
+
+
+class MinField:
+    def __init__(self, geometry, fields):
+        """Smallest size of the fields."""
+        self.fields = id_list(fields)
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Field[%d] = Min;\n" % self.id
+                + field_options(self.id, [('FieldsList', self.fields)]))
+
+
+class BackgroundField:
+    def __init__(self, geometry, field):
+        """Field giving the size of the elements."""
+        self.field_id = field.id
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return "Background Field = %d;\n" % self.field_id
+
+
+class Refinement:
+    def __init__(self,
+                 size_min,
+                 size_max,
+                 dist_min,
+                 dist_max,
+                 near='inclusions',
+                 only=None):
+        """
+        Size of the elements growing with the distance to some entities of
+        a crystal, from size_min up to dist_min, to size_max beyond
+        dist_max.
+
+        @param near:
+            'inclusions' (their boundaries)
+            'points' (the physical points)
+            'lines' (the physical lines)
+        @param only: InclusionType objects, or names of physical points or
+            lines, to select some of the entities (all of them by default)
+        """
+        assert near in ['inclusions', 'points', 'lines'], \
+            "Wrong refinement target!"
+        self.size_min = size_min
+        self.size_max = size_max
+        self.dist_min = dist_min
+        self.dist_max = dist_max
+        self.near = near
+        self.only = only
+
+    def mesh(self, geometry, points=[], lines=[], surfaces=[]):
+        distance = DistanceField(geometry, points, lines, surfaces)
+        return ThresholdField(geometry, distance, self.size_min,
+                              self.size_max, self.dist_min, self.dist_max)
+
+
+class BoxRefinement:
+    def __init__(self,
+                 size_in,
+                 size_out,
+                 x_min,
+                 x_max,
+                 y_min,
+                 y_max,
+                 z_min=0,
+                 z_max=0):
+        """Size of the elements inside a box, and outside it."""
+        self.size_in = size_in
+        self.size_out = size_out
+        self.box = (x_min, y_min, z_min, x_max, y_max, z_max)
+
+    def mesh(self, geometry):
+        return BoxField(geometry, self.size_in, self.size_out, self.box)
@@ -2,6 +2,31 @@
 """Script for generating crystal meshes and images."""
 
 from __future__ import division
+from cStringIO import StringIO
+import numpy
+from columnar import ArrayGeometry
+from lattice import (SparseMap, lattice_frame, lattice_sites,
+                     rectangle_blocks, site_dimensions)
+from script import (InclusionMacro, LatticeBlock, ScriptLineLoop,
+                    ScriptList, ScriptPlaneSurface)
+from sections import SectionedGeometry
+from occ import (TOLERANCE, BooleanDifference, BooleanFragments,
+                 BooleanIntersection, CharacteristicLength, EntitiesInBox,
+                 OccBox, OccCylinder, OccDelete, OccDisk, OccRectangle,
+                 PeriodicTranslation, RemainingEntities)
+from structured import (RecombineSurface, TransfiniteLine,
+                        TransfiniteSurface, block_grid, nb_nodes)
+from msh import BlockMesh, write_msh
+from estimate import (MeshEstimate, extent, ramp_density, shape_areas,
+                      size_density)
+from fields import BackgroundField, BoxRefinement, MinField
+from merging import SharedEntities, unpaired
+from ordering import curve_order
+from periods import map_periods
+from tiling import tile_cuts, tile_indices
+from symmetry import (clip_segment, mirror_invariant, segment_rows,
+                      segments_invariant)
+from validation import find_conflicts
 import pysvg
 from pysvg.builders import StyleBuilder
 from pysvg.core import *
@@ -25,32 +50,79 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see U{http://www.gnu.org/licenses/}.
 """
 
+# Number of entities joined together before each write to the output file
+CHUNK_SIZE = 4096
+
+
+def write_chunked(fileobj, entities):
+    """Write the representation of the entities to fileobj, by chunks."""
+    chunk = []
+    for entity in entities:
+        chunk.append(repr(entity))
+        if len(chunk) == CHUNK_SIZE:
+            fileobj.write(''.join(chunk))
+            chunk = []
+    fileobj.write(''.join(chunk))
 
-class Value:
-    instances = {}
 
-    def __init__(self, name, value):
+class Geometry:
+    """Gmsh entities of one crystal, which hands out their ids."""
+
+    def __init__(self, merge_tolerance=None):
+        """
+        @param merge_tolerance: if set, the points closer than it and the
+            straight lines, line loops and plane surfaces made of the same
+            entities are shared, and the entities shared by touching shapes
+            are left out of the loops around them
+        """
+        self.values = []
+        self.points = []
+        self.lines = []
+        self.physical_entities = []
+        self.shared = None
+        if merge_tolerance is not None:
+            self.shared = SharedEntities(merge_tolerance)
+
+    def add_value(self, value):
+        assert value.name not in [other.name for other in self.values]
+        self.values.append(value)
+
+    def add_point(self, point):
+        self.points.append(point)
+        return len(self.points)
+
+    def add_line(self, line):
+        self.lines.append(line)
+        return len(self.lines)
+
+    def add_physical_entity(self, entity):
+        self.physical_entities.append(entity)
+
+    def section(self, name, slot=None):
+        """The entities are not grouped by sections here."""
+
+    def write(self, fileobj):
+        write_chunked(fileobj, self.values)
+        fileobj.write('\n')
+        write_chunked(fileobj, self.points)
+        fileobj.write('\n')
+        write_chunked(fileobj, self.lines)
+        fileobj.write('\n')
+        write_chunked(fileobj, self.physical_entities)
+
+
+class Value:
+    def __init__(self, geometry, name, value):
         self.name = name
         self.value = value
-        assert name not in Value.instances.keys()
-        Value.instances[name] = self
+        geometry.add_value(self)
 
     def __repr__(self):
         return "%s = %s;\n" % (self.name, self.value)
 
-    def print_all():
-        result = ''
-        for value in Value.instances.values():
-            result += '%r' % value
-        return result
-
-    print_all = staticmethod(print_all)
-
 
 class Point:
-    instances = []
-
-    def __init__(self, x, y, z, size):
+    def __init__(self, geometry, x, y, z, size):
         self.x = x
         self.y = y
         self.z = z
@@ -60,72 +132,76 @@ class Point:
         else:
             self.size = size
 
-        Point.instances.append(self)
-        self.id = len(Point.instances)
+        self.id = None
+        if geometry.shared is not None:
+            self.id = geometry.shared.find_point(x, y, z)
+        if self.id is None:
+            self.id = geometry.add_point(self)
+            if geometry.shared is not None:
+                geometry.shared.add_point(x, y, z, self.id)
 
     def __repr__(self):
         return ("Point(%d) = {%s, %s, %s, %s};\n"
                 % (self.id, self.x, self.y, self.z, self.size))
 
-    def print_all():
-        result = ''
-        for point in Point.instances:
-            result += '%r' % point
-        return result
-
-    print_all = staticmethod(print_all)
 
+class StraightLine:
+    kind = 'Line'
 
-class Line:
-    instances = []
-
-    def print_all():
-        result = ''
-        for line in Line.instances:
-            result += '%r' % line
-        return result
-
-    print_all = staticmethod(print_all)
-
-
-class StraightLine(Line):
-    def __init__(self, pt1, pt2):
+    def __init__(self, geometry, pt1, pt2):
         self.pt1_id = pt1.id
         self.pt2_id = pt2.id
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = None
+        if geometry.shared is not None:
+            self.id = geometry.shared.find_line(pt1.id, pt2.id)
+        if self.id is None:
+            self.id = geometry.add_line(self)
+            if geometry.shared is not None:
+                geometry.shared.add_line(pt1.id, pt2.id, self.id)
 
     def __repr__(self):
         return ("Line(%d) = {%s, %s};\n"
                 % (self.id, self.pt1_id, self.pt2_id))
 
+    def refs(self):
+        return [self.pt1_id, self.pt2_id]
+
 
-class PeriodicLine(Line):
-    def __init__(self, line1, line2):
+class PeriodicLine:
+    def __init__(self, geometry, line1, line2, reverse=True):
+        """
+        Mesh of line1 copied from the one of line2, reversed by default
+        since the lines of a Rectangle go around it.
+        """
         self.line1_id = line1.id
         self.line2_id = line2.id
+        if not reverse:
+            self.line2_id = -self.line2_id
+        # A shared line may be reversed
+        if self.line1_id < 0:
+            self.line1_id = -self.line1_id
+            self.line2_id = -self.line2_id
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
-        return ("Periodic Line(%d) = {-%s};\n"
-                % (self.line1_id, self.line2_id))
+        return ("Periodic Line(%d) = {%s};\n"
+                % (self.line1_id, -self.line2_id))
 
 
-class PeriodicSurface(Line):
-    def __init__(self, surface1, pos_lines1, neg_lines1,
+class PeriodicSurface:
+    def __init__(self, geometry, surface1, pos_lines1, neg_lines1,
                  surface2, pos_lines2, neg_lines2, permutation):
         self.surface1_id = surface1.id
         self.surface2_id = surface2.id
 
         lines1_list = ["%r" % line.id for line in pos_lines1]
-        lines1_list.extend(["-%r" % line.id for line in neg_lines1])
+        lines1_list.extend(["%r" % -line.id for line in neg_lines1])
         self.lines1_list = ', '.join(lines1_list)
 
         lines2_list = ["%r" % line.id for line in pos_lines2]
-        lines2_list.extend(["-%r" % line.id for line in neg_lines2])
+        lines2_list.extend(["%r" % -line.id for line in neg_lines2])
         if permutation > 0:
             for _ in range(permutation):
                 lines2_list.append(lines2_list.pop(0))
@@ -134,8 +210,7 @@ class PeriodicSurface(Line):
                 lines2_list.insert(0, lines2_list.pop())
         self.lines2_list = ', '.join(lines2_list)
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
         return ("Periodic Surface(%d) {%s} = (%s) {%s};\n"
@@ -144,72 +219,90 @@ class PeriodicSurface(Line):
 
 
 class LineLoop:
-    def __init__(self, pos_lines, neg_lines=[]):
-        lines_list = ["%r" % line.id for line in pos_lines]
-        lines_list.extend(["-%r" % line.id for line in neg_lines])
-        self.lines_list = ', '.join(lines_list)
+    kind = 'Line Loop'
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+    def __init__(self, geometry, pos_lines, neg_lines=[]):
+        self.line_ids = [line.id for line in pos_lines]
+        self.line_ids.extend([-line.id for line in neg_lines])
+
+        self.id = None
+        if geometry.shared is not None:
+            self.line_ids = unpaired(self.line_ids)
+            self.id = geometry.shared.find_loop(self.line_ids)
+        if self.id is None:
+            self.id = geometry.add_line(self)
+            if geometry.shared is not None:
+                geometry.shared.add_loop(self.line_ids, self.id)
 
     def __repr__(self):
-        return ("Line Loop(%s) = {%s};\n" % (self.id, self.lines_list))
+        return ("Line Loop(%s) = {%s};\n"
+                % (self.id, ', '.join([format(line_id)
+                                       for line_id in self.line_ids])))
+
+    def refs(self):
+        return self.line_ids
 
 
 class PlaneSurface:
-    def __init__(self, loop):
+    kind = 'Plane Surface'
+
+    def __init__(self, geometry, loop):
         self.loop = loop
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = None
+        if geometry.shared is not None:
+            self.id = geometry.shared.find_surface(loop.id)
+        if self.id is None:
+            self.id = geometry.add_line(self)
+            if geometry.shared is not None:
+                geometry.shared.add_surface(loop.id, self.id)
 
     def __repr__(self):
         return ("Plane Surface(%s) = {%s};\n"
                 % (self.id, self.loop.id))
 
+    def refs(self):
+        return [self.loop.id]
+
 
 class RuledSurface:
-    def __init__(self, loop):
+    kind = 'Ruled Surface'
+
+    def __init__(self, geometry, loop):
         self.loop = loop
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
         return ("Ruled Surface(%s) = {%s};\n"
                 % (self.id, self.loop.id))
 
+    def refs(self):
+        return [self.loop.id]
+
 
 class Volume:
-    def __init__(self, loop):
+    kind = 'Volume'
+
+    def __init__(self, geometry, loop):
         self.loop = loop
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
         return ("Volume(%s) = {%s};\n"
                 % (self.id, self.loop.id))
 
-
-class PhysicalEntity:
-    instances = []
-
-    def print_all():
-        result = ''
-        for line in PhysicalEntity.instances:
-            result += '%r' % line
-        return result
-
-    print_all = staticmethod(print_all)
+    def refs(self):
+        return [self.loop.id]
 
 
 class PhysicalPoint:
-    def __init__(self, points, name):
+    def __init__(self, geometry, points, name):
         self.points = ', '.join([format(point.id) for point in points])
         self.name = name
 
-        PhysicalEntity.instances.append(self)
+        geometry.add_physical_entity(self)
 
     def __repr__(self):
         return ('Physical Point("%s") = {%s};\n'
@@ -217,11 +310,11 @@ class PhysicalPoint:
 
 
 class PhysicalLine:
-    def __init__(self, lines, name):
+    def __init__(self, geometry, lines, name):
         self.lines = ', '.join([format(line.id) for line in lines])
         self.name = name
 
-        PhysicalEntity.instances.append(self)
+        geometry.add_physical_entity(self)
 
     def __repr__(self):
         return ('Physical Line("%s") = {%s};\n'
@@ -229,11 +322,11 @@ class PhysicalLine:
 
 
 class PhysicalSurface:
-    def __init__(self, surfaces, name):
+    def __init__(self, geometry, surfaces, name):
         self.surfaces = ', '.join([format(surface.id) for surface in surfaces])
         self.name = name
 
-        PhysicalEntity.instances.append(self)
+        geometry.add_physical_entity(self)
 
     def __repr__(self):
         return ('Physical Surface("%s") = {%s};\n'
@@ -241,11 +334,11 @@ class PhysicalSurface:
 
 
 class PhysicalVolume:
-    def __init__(self, volumes, name):
+    def __init__(self, geometry, volumes, name):
         self.volumes = ', '.join([format(volume.id) for volume in volumes])
         self.name = name
 
-        PhysicalEntity.instances.append(self)
+        geometry.add_physical_entity(self)
 
     def __repr__(self):
         return ('Physical Volume("%s") = {%s};\n'
@@ -253,19 +346,20 @@ class PhysicalVolume:
 
 
 class LineInSurface:
-    def __init__(self, line, surface):
+    def __init__(self, geometry, line, surface):
         self.line = line
         self.surface = surface
 
-        PhysicalEntity.instances.append(self)
+        geometry.add_physical_entity(self)
 
     def __repr__(self):
         return ('Line{%s} In Surface {%s};\n'
                 % (self.line.id, self.surface))
 
 
-class Rectangle():
+class Rectangle:
     def __init__(self,
+                 geometry,
                  dim_x,
                  dim_y,
                  pos_x,
@@ -276,44 +370,49 @@ class Rectangle():
 
         self.el_size = el_size
 
-        pt_tl = Point(pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
-        pt_bl = Point(pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
-        pt_tr = Point(pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
-        pt_br = Point(pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
+        pt_tl = Point(geometry, pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
+        pt_bl = Point(geometry, pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
+        pt_tr = Point(geometry, pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
+        pt_br = Point(geometry, pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
 
-        line_left = StraightLine(pt_bl, pt_tl)
-        line_top = StraightLine(pt_tl, pt_tr)
-        line_right = StraightLine(pt_tr, pt_br)
-        line_bottom = StraightLine(pt_br, pt_bl)
+        line_left = StraightLine(geometry, pt_bl, pt_tl)
+        line_top = StraightLine(geometry, pt_tl, pt_tr)
+        line_right = StraightLine(geometry, pt_tr, pt_br)
+        line_bottom = StraightLine(geometry, pt_br, pt_bl)
 
         self.lines = [line_left, line_top, line_right, line_bottom]
 
         if periodicity[0]:
-            PeriodicLine(line_left, line_right)
-            PhysicalLine([line_left], 'minus_x')
-            PhysicalLine([line_right], 'plus_x')
+            PeriodicLine(geometry, line_left, line_right)
+            PhysicalLine(geometry, [line_left], 'minus_x')
+            PhysicalLine(geometry, [line_right], 'plus_x')
         if periodicity[1]:
-            PeriodicLine(line_bottom, line_top)
-            PhysicalLine([line_bottom], 'minus_y')
-            PhysicalLine([line_top], 'plus_y')
+            PeriodicLine(geometry, line_bottom, line_top)
+            PhysicalLine(geometry, [line_bottom], 'minus_y')
+            PhysicalLine(geometry, [line_top], 'plus_y')
+
 
+class Circle:
+    kind = 'Circle'
 
-class Circle(Line):
-    def __init__(self, pt_l, pt_c, pt_r):
+    def __init__(self, geometry, pt_l, pt_c, pt_r):
         self.pt_l = pt_l.id
         self.pt_c = pt_c.id
         self.pt_r = pt_r.id
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
         return ("Circle(%s) = {%s, %s, %s};\n"
                % (self.id, self.pt_l, self.pt_c, self.pt_r))
 
+    def refs(self):
+        return [self.pt_l, self.pt_c, self.pt_r]
+
 
 class FullCircle:
     def __init__(self,
+                 geometry,
                  radius,
                  pos_x,
                  pos_y,
@@ -322,34 +421,39 @@ class FullCircle:
 
         self.el_size = el_size
 
-        pt_c = Point(pos_x, pos_y, pos_z, el_size)
-        pt_l = Point(pos_x - radius, pos_y, pos_z, el_size)
-        pt_r = Point(pos_x + radius, pos_y, pos_z, el_size)
+        pt_c = Point(geometry, pos_x, pos_y, pos_z, el_size)
+        pt_l = Point(geometry, pos_x - radius, pos_y, pos_z, el_size)
+        pt_r = Point(geometry, pos_x + radius, pos_y, pos_z, el_size)
 
-        circle_top = Circle(pt_l, pt_c, pt_r)
-        circle_bottom = Circle(pt_r, pt_c, pt_l)
+        circle_top = Circle(geometry, pt_l, pt_c, pt_r)
+        circle_bottom = Circle(geometry, pt_r, pt_c, pt_l)
 
         self.lines = [circle_top, circle_bottom]
 
 
-class Ellipse(Line):
-    def __init__(self, pt_begin, pt_center, pt_axis, pt_end):
+class Ellipse:
+    kind = 'Ellipse'
+
+    def __init__(self, geometry, pt_begin, pt_center, pt_axis, pt_end):
         self.pt_begin = pt_begin.id
         self.pt_center = pt_center.id
         self.pt_axis = pt_axis.id
         self.pt_end = pt_end.id
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
         return ("Ellipse(%s) = {%s, %s, %s, %s};\n"
                % (self.id, self.pt_begin, self.pt_center,
                   self.pt_axis, self.pt_end))
 
+    def refs(self):
+        return [self.pt_begin, self.pt_center, self.pt_axis, self.pt_end]
+
 
 class FullEllipse:
     def __init__(self,
+                 geometry,
                  size_x,
                  size_y,
                  pos_x,
@@ -359,35 +463,43 @@ class FullEllipse:
 
         self.el_size = el_size
 
-        pt_c = Point(pos_x, pos_y, 0, el_size)
-        pt_l = Point(pos_x - size_x / 2, pos_y, 0, el_size)
-        pt_r = Point(pos_x + size_x / 2, pos_y, 0, el_size)
-        pt_t = Point(pos_x, pos_y + size_y / 2, 0, el_size)
-        pt_b = Point(pos_x, pos_y - size_y / 2, 0, el_size)
+        pt_c = Point(geometry, pos_x, pos_y, 0, el_size)
+        pt_l = Point(geometry, pos_x - size_x / 2, pos_y, 0, el_size)
+        pt_r = Point(geometry, pos_x + size_x / 2, pos_y, 0, el_size)
+        pt_t = Point(geometry, pos_x, pos_y + size_y / 2, 0, el_size)
+        pt_b = Point(geometry, pos_x, pos_y - size_y / 2, 0, el_size)
 
-        ellipse_1 = Ellipse(pt_l, pt_c, pt_r, pt_t)
-        ellipse_2 = Ellipse(pt_t, pt_c, pt_b, pt_r)
-        ellipse_3 = Ellipse(pt_r, pt_c, pt_l, pt_b)
-        ellipse_4 = Ellipse(pt_b, pt_c, pt_t, pt_l)
+        ellipse_1 = Ellipse(geometry, pt_l, pt_c, pt_r, pt_t)
+        ellipse_2 = Ellipse(geometry, pt_t, pt_c, pt_b, pt_r)
+        ellipse_3 = Ellipse(geometry, pt_r, pt_c, pt_l, pt_b)
+        ellipse_4 = Ellipse(geometry, pt_b, pt_c, pt_t, pt_l)
 
         self.lines = [ellipse_1, ellipse_2, ellipse_3, ellipse_4]
 
 
 class SurfaceLoop:
-    def __init__(self, pos_lines, neg_lines=[]):
-        lines_list = ["%r" % line.id for line in pos_lines]
-        lines_list.extend(["-%r" % line.id for line in neg_lines])
-        self.lines_list = ', '.join(lines_list)
+    kind = 'Surface Loop'
+
+    def __init__(self, geometry, pos_lines, neg_lines=[]):
+        self.line_ids = [line.id for line in pos_lines]
+        self.line_ids.extend([-line.id for line in neg_lines])
+        if geometry.shared is not None:
+            self.line_ids = unpaired(self.line_ids)
 
-        Line.instances.append(self)
-        self.id = len(Line.instances)
+        self.id = geometry.add_line(self)
 
     def __repr__(self):
-        return ("Surface Loop(%s) = {%s};\n" % (self.id, self.lines_list))
+        return ("Surface Loop(%s) = {%s};\n"
+                % (self.id, ', '.join([format(line_id)
+                                       for line_id in self.line_ids])))
+
+    def refs(self):
+        return self.line_ids
 
 
 class CircularCylinder:
     def __init__(self,
+                 geometry,
                  radius,
                  pos_x,
                  pos_y,
@@ -396,39 +508,40 @@ class CircularCylinder:
 
         self.el_size = el_size
 
-        pt_c_bottom = Point(pos_x, pos_y, 0, el_size)
-        pt_l_bottom = Point(pos_x - radius, pos_y, 0, el_size)
-        pt_r_bottom = Point(pos_x + radius, pos_y, 0, el_size)
+        pt_c_bottom = Point(geometry, pos_x, pos_y, 0, el_size)
+        pt_l_bottom = Point(geometry, pos_x - radius, pos_y, 0, el_size)
+        pt_r_bottom = Point(geometry, pos_x + radius, pos_y, 0, el_size)
 
-        pt_c_top = Point(pos_x, pos_y, dim_z, el_size)
-        pt_l_top = Point(pos_x - radius, pos_y, dim_z, el_size)
-        pt_r_top = Point(pos_x + radius, pos_y, dim_z, el_size)
+        pt_c_top = Point(geometry, pos_x, pos_y, dim_z, el_size)
+        pt_l_top = Point(geometry, pos_x - radius, pos_y, dim_z, el_size)
+        pt_r_top = Point(geometry, pos_x + radius, pos_y, dim_z, el_size)
 
-        circle_1_top = Circle(pt_l_top, pt_c_top, pt_r_top)
-        circle_1_bottom = Circle(pt_l_bottom, pt_c_bottom, pt_r_bottom)
+        circle_1_top = Circle(geometry, pt_l_top, pt_c_top, pt_r_top)
+        circle_1_bottom = Circle(geometry, pt_l_bottom, pt_c_bottom, pt_r_bottom)
 
-        circle_2_top = Circle(pt_r_top, pt_c_top, pt_l_top)
-        circle_2_bottom = Circle(pt_r_bottom, pt_c_bottom, pt_l_bottom)
+        circle_2_top = Circle(geometry, pt_r_top, pt_c_top, pt_l_top)
+        circle_2_bottom = Circle(geometry, pt_r_bottom, pt_c_bottom, pt_l_bottom)
 
-        line1 = StraightLine(pt_l_bottom, pt_l_top)
-        line2 = StraightLine(pt_r_bottom, pt_r_top)
+        line1 = StraightLine(geometry, pt_l_bottom, pt_l_top)
+        line2 = StraightLine(geometry, pt_r_bottom, pt_r_top)
 
-        loop1 = LineLoop([circle_1_bottom, line2], [circle_1_top, line1])
-        loop2 = LineLoop([circle_2_bottom, line1], [circle_2_top, line2])
+        loop1 = LineLoop(geometry, [circle_1_bottom, line2], [circle_1_top, line1])
+        loop2 = LineLoop(geometry, [circle_2_bottom, line1], [circle_2_top, line2])
 
         self.lines_top = [circle_1_top, circle_2_top]
         self.lines_bottom = [circle_1_bottom, circle_2_bottom]
 
         self.surfaces = []
 
-        self.surfaces.append(RuledSurface(loop1))
-        self.surfaces.append(RuledSurface(loop2))
+        self.surfaces.append(RuledSurface(geometry, loop1))
+        self.surfaces.append(RuledSurface(geometry, loop2))
 
         self.lines = [line1, line2]
 
 
 class EllipticCylinder:
     def __init__(self,
+                 geometry,
                  size_x,
                  size_y,
                  pos_x,
@@ -438,55 +551,56 @@ class EllipticCylinder:
 
         self.el_size = el_size
 
-        pt_c_bottom = Point(pos_x, pos_y, 0, el_size)
-        pt_l_bottom = Point(pos_x - size_x / 2, pos_y, 0, el_size)
-        pt_r_bottom = Point(pos_x + size_x / 2, pos_y, 0, el_size)
-        pt_t_bottom = Point(pos_x, pos_y + size_y / 2, 0, el_size)
-        pt_b_bottom = Point(pos_x, pos_y - size_y / 2, 0, el_size)
+        pt_c_bottom = Point(geometry, pos_x, pos_y, 0, el_size)
+        pt_l_bottom = Point(geometry, pos_x - size_x / 2, pos_y, 0, el_size)
+        pt_r_bottom = Point(geometry, pos_x + size_x / 2, pos_y, 0, el_size)
+        pt_t_bottom = Point(geometry, pos_x, pos_y + size_y / 2, 0, el_size)
+        pt_b_bottom = Point(geometry, pos_x, pos_y - size_y / 2, 0, el_size)
 
-        pt_c_top = Point(pos_x, pos_y, dim_z, el_size)
-        pt_l_top = Point(pos_x - size_x / 2, pos_y, dim_z, el_size)
-        pt_r_top = Point(pos_x + size_x / 2, pos_y, dim_z, el_size)
-        pt_t_top = Point(pos_x, pos_y + size_y / 2, dim_z, el_size)
-        pt_b_top = Point(pos_x, pos_y - size_y / 2, dim_z, el_size)
+        pt_c_top = Point(geometry, pos_x, pos_y, dim_z, el_size)
+        pt_l_top = Point(geometry, pos_x - size_x / 2, pos_y, dim_z, el_size)
+        pt_r_top = Point(geometry, pos_x + size_x / 2, pos_y, dim_z, el_size)
+        pt_t_top = Point(geometry, pos_x, pos_y + size_y / 2, dim_z, el_size)
+        pt_b_top = Point(geometry, pos_x, pos_y - size_y / 2, dim_z, el_size)
 
-        ellipse_1_top = Ellipse(pt_l_top, pt_c_top, pt_r_top, pt_t_top)
-        ellipse_1_bottom = Ellipse(pt_l_bottom, pt_c_bottom, pt_r_bottom, pt_t_bottom)
+        ellipse_1_top = Ellipse(geometry, pt_l_top, pt_c_top, pt_r_top, pt_t_top)
+        ellipse_1_bottom = Ellipse(geometry, pt_l_bottom, pt_c_bottom, pt_r_bottom, pt_t_bottom)
 
-        ellipse_2_top = Ellipse(pt_t_top, pt_c_top, pt_b_top, pt_r_top)
-        ellipse_2_bottom = Ellipse(pt_t_bottom, pt_c_bottom, pt_b_bottom, pt_r_bottom)
+        ellipse_2_top = Ellipse(geometry, pt_t_top, pt_c_top, pt_b_top, pt_r_top)
+        ellipse_2_bottom = Ellipse(geometry, pt_t_bottom, pt_c_bottom, pt_b_bottom, pt_r_bottom)
 
-        ellipse_3_top = Ellipse(pt_r_top, pt_c_top, pt_l_top, pt_b_top)
-        ellipse_3_bottom = Ellipse(pt_r_bottom, pt_c_bottom, pt_l_bottom, pt_b_bottom)
+        ellipse_3_top = Ellipse(geometry, pt_r_top, pt_c_top, pt_l_top, pt_b_top)
+        ellipse_3_bottom = Ellipse(geometry, pt_r_bottom, pt_c_bottom, pt_l_bottom, pt_b_bottom)
 
-        ellipse_4_top = Ellipse(pt_b_top, pt_c_top, pt_t_top, pt_l_top)
-        ellipse_4_bottom = Ellipse(pt_b_bottom, pt_c_bottom, pt_t_bottom, pt_l_bottom)
+        ellipse_4_top = Ellipse(geometry, pt_b_top, pt_c_top, pt_t_top, pt_l_top)
+        ellipse_4_bottom = Ellipse(geometry, pt_b_bottom, pt_c_bottom, pt_t_bottom, pt_l_bottom)
 
-        line1 = StraightLine(pt_l_bottom, pt_l_top)
-        line2 = StraightLine(pt_t_bottom, pt_t_top)
-        line3 = StraightLine(pt_r_bottom, pt_r_top)
-        line4 = StraightLine(pt_b_bottom, pt_b_top)
+        line1 = StraightLine(geometry, pt_l_bottom, pt_l_top)
+        line2 = StraightLine(geometry, pt_t_bottom, pt_t_top)
+        line3 = StraightLine(geometry, pt_r_bottom, pt_r_top)
+        line4 = StraightLine(geometry, pt_b_bottom, pt_b_top)
 
-        loop1 = LineLoop([ellipse_1_bottom, line2], [ellipse_1_top, line1])
-        loop2 = LineLoop([ellipse_2_bottom, line3], [ellipse_2_top, line2])
-        loop3 = LineLoop([ellipse_3_bottom, line4], [ellipse_3_top, line3])
-        loop4 = LineLoop([ellipse_4_bottom, line1], [ellipse_4_top, line4])
+        loop1 = LineLoop(geometry, [ellipse_1_bottom, line2], [ellipse_1_top, line1])
+        loop2 = LineLoop(geometry, [ellipse_2_bottom, line3], [ellipse_2_top, line2])
+        loop3 = LineLoop(geometry, [ellipse_3_bottom, line4], [ellipse_3_top, line3])
+        loop4 = LineLoop(geometry, [ellipse_4_bottom, line1], [ellipse_4_top, line4])
 
         self.lines_top = [ellipse_1_top, ellipse_2_top, ellipse_3_top, ellipse_4_top]
         self.lines_bottom = [ellipse_1_bottom, ellipse_2_bottom, ellipse_3_bottom, ellipse_4_bottom]
 
         self.surfaces = []
 
-        self.surfaces.append(RuledSurface(loop1))
-        self.surfaces.append(RuledSurface(loop2))
-        self.surfaces.append(RuledSurface(loop3))
-        self.surfaces.append(RuledSurface(loop4))
+        self.surfaces.append(RuledSurface(geometry, loop1))
+        self.surfaces.append(RuledSurface(geometry, loop2))
+        self.surfaces.append(RuledSurface(geometry, loop3))
+        self.surfaces.append(RuledSurface(geometry, loop4))
 
         self.lines = [line1, line2, line3, line4]
 
 
-class Cuboid():
+class Cuboid:
     def __init__(self,
+                 geometry,
                  dim_x,
                  dim_y,
                  dim_z,
@@ -498,30 +612,30 @@ class Cuboid():
 
         self.el_size = el_size
 
-        pt_tl_bottom = Point(pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
-        pt_bl_bottom = Point(pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
-        pt_tr_bottom = Point(pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
-        pt_br_bottom = Point(pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
+        pt_tl_bottom = Point(geometry, pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
+        pt_bl_bottom = Point(geometry, pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
+        pt_tr_bottom = Point(geometry, pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z, el_size)
+        pt_br_bottom = Point(geometry, pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z, el_size)
 
-        pt_tl_top = Point(pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z + dim_z, el_size)
-        pt_bl_top = Point(pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z + dim_z, el_size)
-        pt_tr_top = Point(pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z + dim_z, el_size)
-        pt_br_top = Point(pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z + dim_z, el_size)
+        pt_tl_top = Point(geometry, pos_x - dim_x / 2, pos_y + dim_y / 2, pos_z + dim_z, el_size)
+        pt_bl_top = Point(geometry, pos_x - dim_x / 2, pos_y - dim_y / 2, pos_z + dim_z, el_size)
+        pt_tr_top = Point(geometry, pos_x + dim_x / 2, pos_y + dim_y / 2, pos_z + dim_z, el_size)
+        pt_br_top = Point(geometry, pos_x + dim_x / 2, pos_y - dim_y / 2, pos_z + dim_z, el_size)
 
-        line_left_bottom = StraightLine(pt_bl_bottom, pt_tl_bottom)
-        line_top_bottom = StraightLine(pt_tl_bottom, pt_tr_bottom)
-        line_right_bottom = StraightLine(pt_tr_bottom, pt_br_bottom)
-        line_bottom_bottom = StraightLine(pt_br_bottom, pt_bl_bottom)
+        line_left_bottom = StraightLine(geometry, pt_bl_bottom, pt_tl_bottom)
+        line_top_bottom = StraightLine(geometry, pt_tl_bottom, pt_tr_bottom)
+        line_right_bottom = StraightLine(geometry, pt_tr_bottom, pt_br_bottom)
+        line_bottom_bottom = StraightLine(geometry, pt_br_bottom, pt_bl_bottom)
 
-        line_left_top = StraightLine(pt_bl_top, pt_tl_top)
-        line_top_top = StraightLine(pt_tl_top, pt_tr_top)
-        line_right_top = StraightLine(pt_tr_top, pt_br_top)
-        line_bottom_top = StraightLine(pt_br_top, pt_bl_top)
+        line_left_top = StraightLine(geometry, pt_bl_top, pt_tl_top)
+        line_top_top = StraightLine(geometry, pt_tl_top, pt_tr_top)
+        line_right_top = StraightLine(geometry, pt_tr_top, pt_br_top)
+        line_bottom_top = StraightLine(geometry, pt_br_top, pt_bl_top)
 
-        line_bottom_left = StraightLine(pt_bl_bottom, pt_bl_top)
-        line_top_left = StraightLine(pt_tl_bottom, pt_tl_top)
-        line_top_right = StraightLine(pt_tr_bottom, pt_tr_top)
-        line_bottom_right = StraightLine(pt_br_bottom, pt_br_top)
+        line_bottom_left = StraightLine(geometry, pt_bl_bottom, pt_bl_top)
+        line_top_left = StraightLine(geometry, pt_tl_bottom, pt_tl_top)
+        line_top_right = StraightLine(geometry, pt_tr_bottom, pt_tr_top)
+        line_bottom_right = StraightLine(geometry, pt_br_bottom, pt_br_top)
 
         self.lines_top = [line_left_top, line_top_top,
                           line_right_top, line_bottom_top]
@@ -532,19 +646,19 @@ class Cuboid():
         self.lines = [line_bottom_left, line_top_left,
                       line_top_right, line_bottom_right]
 
-        loop1 = LineLoop([line_bottom_left, line_left_top],
+        loop1 = LineLoop(geometry, [line_bottom_left, line_left_top],
                          [line_top_left, line_left_bottom])
-        loop2 = LineLoop([line_bottom_right, line_bottom_top],
+        loop2 = LineLoop(geometry, [line_bottom_right, line_bottom_top],
                          [line_bottom_left, line_bottom_bottom])
-        loop3 = LineLoop([line_top_right, line_right_top],
+        loop3 = LineLoop(geometry, [line_top_right, line_right_top],
                          [line_bottom_right, line_right_bottom])
-        loop4 = LineLoop([line_top_bottom, line_top_right],
+        loop4 = LineLoop(geometry, [line_top_bottom, line_top_right],
                          [line_top_top, line_top_left])
 
-        surface_left = PlaneSurface(loop1)
-        surface_bottom = PlaneSurface(loop2)
-        surface_right = PlaneSurface(loop3)
-        surface_top = PlaneSurface(loop4)
+        surface_left = PlaneSurface(geometry, loop1)
+        surface_bottom = PlaneSurface(geometry, loop2)
+        surface_right = PlaneSurface(geometry, loop3)
+        surface_top = PlaneSurface(geometry, loop4)
 
         self.surfaces = []
 
@@ -554,34 +668,34 @@ class Cuboid():
         self.surfaces.append(surface_top)
 
         if periodicity[0]:
-            PeriodicLine(line_left_bottom, line_right_bottom)
-            PhysicalLine([line_left_bottom], 'minus_x_bottom')
-            PhysicalLine([line_right_bottom], 'plus_x_bottom')
-            PeriodicLine(line_left_top, line_right_top)
-            PhysicalLine([line_left_top], 'minus_x_top')
-            PhysicalLine([line_right_top], 'plus_x_top')
-            PeriodicLine(line_bottom_left, line_bottom_right)
-            PeriodicLine(line_top_left, line_top_right)
-            PhysicalSurface([surface_right], 'surface_right')
-            PhysicalSurface([surface_left], 'surface_left')
-            PeriodicSurface(surface_right,
+            PeriodicLine(geometry, line_left_bottom, line_right_bottom)
+            PhysicalLine(geometry, [line_left_bottom], 'minus_x_bottom')
+            PhysicalLine(geometry, [line_right_bottom], 'plus_x_bottom')
+            PeriodicLine(geometry, line_left_top, line_right_top)
+            PhysicalLine(geometry, [line_left_top], 'minus_x_top')
+            PhysicalLine(geometry, [line_right_top], 'plus_x_top')
+            PeriodicLine(geometry, line_bottom_left, line_bottom_right)
+            PeriodicLine(geometry, line_top_left, line_top_right)
+            PhysicalSurface(geometry, [surface_right], 'surface_right')
+            PhysicalSurface(geometry, [surface_left], 'surface_left')
+            PeriodicSurface(geometry, surface_right,
                             [line_top_right, line_right_top],
                             [line_bottom_right, line_right_bottom],
                             surface_left,
                             [line_left_bottom, line_top_left],
                             [line_left_top, line_bottom_left], 1)
         if periodicity[1]:
-            PeriodicLine(line_bottom_bottom, line_top_bottom)
-            PhysicalLine([line_bottom_bottom], 'minus_y_bottom')
-            PhysicalLine([line_top_bottom], 'plus_y_bottom')
-            PeriodicLine(line_bottom_top, line_top_top)
-            PhysicalLine([line_bottom_top], 'minus_y_top')
-            PhysicalLine([line_top_top], 'plus_y_top')
-            PeriodicLine(line_bottom_left, line_top_left)
-            PeriodicLine(line_bottom_right, line_top_right)
-            PhysicalSurface([surface_top], 'surface_top')
-            PhysicalSurface([surface_bottom], 'surface_bottom')
-            PeriodicSurface(surface_top,
+            PeriodicLine(geometry, line_bottom_bottom, line_top_bottom)
+            PhysicalLine(geometry, [line_bottom_bottom], 'minus_y_bottom')
+            PhysicalLine(geometry, [line_top_bottom], 'plus_y_bottom')
+            PeriodicLine(geometry, line_bottom_top, line_top_top)
+            PhysicalLine(geometry, [line_bottom_top], 'minus_y_top')
+            PhysicalLine(geometry, [line_top_top], 'plus_y_top')
+            PeriodicLine(geometry, line_bottom_left, line_top_left)
+            PeriodicLine(geometry, line_bottom_right, line_top_right)
+            PhysicalSurface(geometry, [surface_top], 'surface_top')
+            PhysicalSurface(geometry, [surface_bottom], 'surface_bottom')
+            PeriodicSurface(geometry, surface_top,
                             [line_top_bottom, line_top_right],
                             [line_top_top, line_top_left],
                             surface_bottom,
@@ -589,6 +703,280 @@ class Cuboid():
                             [line_bottom_left, line_bottom_bottom], -1)
 
 
+def tile_grid(geometry, xs, ys, z, el_size):
+    """
+    Points and lines of a grid at height z: lines_x[i][j] goes from
+    points[i][j] to points[i + 1][j], and lines_y[i][j] from points[i][j]
+    to points[i][j + 1].
+    """
+    points = [[Point(geometry, x, y, z, el_size) for y in ys] for x in xs]
+    lines_x = [[StraightLine(geometry, points[i][j], points[i + 1][j])
+                for j in range(len(ys))] for i in range(len(xs) - 1)]
+    lines_y = [[StraightLine(geometry, points[i][j], points[i][j + 1])
+                for j in range(len(ys) - 1)] for i in range(len(xs))]
+    return points, lines_x, lines_y
+
+
+def tile_loop(lines_x, lines_y, i, j):
+    """(pos_lines, neg_lines) going around the tile (i, j) of a grid."""
+    return ([lines_y[i][j], lines_x[i][j + 1]],
+            [lines_y[i + 1][j], lines_x[i][j]])
+
+
+class TiledRectangle:
+    def __init__(self,
+                 geometry,
+                 xs,
+                 ys,
+                 pos_z,
+                 el_size,
+                 periodicity):
+        """
+        Rectangle split into a grid of tiles, which share their sides.
+
+        @param xs, ys: bounds of the tiles along x and y, the first and
+            last ones being those of the rectangle
+        """
+        self.el_size = el_size
+
+        _, lines_x, lines_y = tile_grid(geometry, xs, ys, pos_z, el_size)
+        nb_x = len(xs) - 1
+        nb_y = len(ys) - 1
+
+        self.tiles = [[tile_loop(lines_x, lines_y, i, j)
+                       for j in range(nb_y)] for i in range(nb_x)]
+
+        if periodicity[0]:
+            for j in range(nb_y):
+                PeriodicLine(geometry, lines_y[0][j], lines_y[nb_x][j],
+                             reverse=False)
+            PhysicalLine(geometry, lines_y[0], 'minus_x')
+            PhysicalLine(geometry, lines_y[nb_x], 'plus_x')
+        if periodicity[1]:
+            for i in range(nb_x):
+                PeriodicLine(geometry, lines_x[i][0], lines_x[i][nb_y],
+                             reverse=False)
+            PhysicalLine(geometry, [lines[0] for lines in lines_x], 'minus_y')
+            PhysicalLine(geometry, [lines[nb_y] for lines in lines_x],
+                         'plus_y')
+
+
+class TiledCuboid:
+    def __init__(self,
+                 geometry,
+                 xs,
+                 ys,
+                 dim_z,
+                 el_size,
+                 periodicity):
+        """
+        Cuboid standing on z = 0, split into a grid of vertical prisms,
+        which share their lateral faces.
+
+        @param xs, ys: bounds of the tiles along x and y, the first and
+            last ones being those of the cuboid
+        """
+        self.el_size = el_size
+
+        points_bottom, lines_x_bottom, lines_y_bottom = \
+            tile_grid(geometry, xs, ys, 0, el_size)
+        points_top, lines_x_top, lines_y_top = \
+            tile_grid(geometry, xs, ys, dim_z, el_size)
+        nb_x = len(xs) - 1
+        nb_y = len(ys) - 1
+
+        edges = [[StraightLine(geometry, bottom, top)
+                  for bottom, top in zip(column_bottom, column_top)]
+                 for column_bottom, column_top in zip(points_bottom,
+                                                      points_top)]
+        faces_x = [[PlaneSurface(geometry, LineLoop(
+                        geometry, [lines_x_bottom[i][j], edges[i + 1][j]],
+                        [lines_x_top[i][j], edges[i][j]]))
+                    for j in range(nb_y + 1)] for i in range(nb_x)]
+        faces_y = [[PlaneSurface(geometry, LineLoop(
+                        geometry, [lines_y_bottom[i][j], edges[i][j + 1]],
+                        [lines_y_top[i][j], edges[i][j]]))
+                    for j in range(nb_y)] for i in range(nb_x + 1)]
+
+        self.tiles_bottom = [[tile_loop(lines_x_bottom, lines_y_bottom, i, j)
+                              for j in range(nb_y)] for i in range(nb_x)]
+        self.tiles_top = [[tile_loop(lines_x_top, lines_y_top, i, j)
+                           for j in range(nb_y)] for i in range(nb_x)]
+        self.tile_surfaces = [[[faces_y[i][j], faces_x[i][j + 1],
+                                faces_y[i + 1][j], faces_x[i][j]]
+                               for j in range(nb_y)] for i in range(nb_x)]
+
+        # The entities of the lower sides are copies of the higher ones,
+        # each entity being copied once
+        if periodicity[0]:
+            for j in range(nb_y):
+                PeriodicLine(geometry, lines_y_bottom[0][j],
+                             lines_y_bottom[nb_x][j], reverse=False)
+                PeriodicLine(geometry, lines_y_top[0][j],
+                             lines_y_top[nb_x][j], reverse=False)
+            for j in range(nb_y + 1):
+                PeriodicLine(geometry, edges[0][j], edges[nb_x][j],
+                             reverse=False)
+            for j in range(nb_y):
+                PeriodicSurface(geometry, faces_y[0][j],
+                                [lines_y_bottom[0][j], edges[0][j + 1]],
+                                [lines_y_top[0][j], edges[0][j]],
+                                faces_y[nb_x][j],
+                                [lines_y_bottom[nb_x][j], edges[nb_x][j + 1]],
+                                [lines_y_top[nb_x][j], edges[nb_x][j]], 0)
+            PhysicalLine(geometry, lines_y_bottom[0], 'minus_x_bottom')
+            PhysicalLine(geometry, lines_y_bottom[nb_x], 'plus_x_bottom')
+            PhysicalLine(geometry, lines_y_top[0], 'minus_x_top')
+            PhysicalLine(geometry, lines_y_top[nb_x], 'plus_x_top')
+            PhysicalSurface(geometry, faces_y[nb_x], 'surface_right')
+            PhysicalSurface(geometry, faces_y[0], 'surface_left')
+        if periodicity[1]:
+            for i in range(nb_x):
+                PeriodicLine(geometry, lines_x_bottom[i][0],
+                             lines_x_bottom[i][nb_y], reverse=False)
+                PeriodicLine(geometry, lines_x_top[i][0],
+                             lines_x_top[i][nb_y], reverse=False)
+            for i in range(nb_x + 1):
+                if not (periodicity[0] and i == 0):
+                    PeriodicLine(geometry, edges[i][0], edges[i][nb_y],
+                                 reverse=False)
+            for i in range(nb_x):
+                PeriodicSurface(geometry, faces_x[i][0],
+                                [lines_x_bottom[i][0], edges[i + 1][0]],
+                                [lines_x_top[i][0], edges[i][0]],
+                                faces_x[i][nb_y],
+                                [lines_x_bottom[i][nb_y], edges[i + 1][nb_y]],
+                                [lines_x_top[i][nb_y], edges[i][nb_y]], 0)
+            PhysicalLine(geometry, [lines[0] for lines in lines_x_bottom],
+                         'minus_y_bottom')
+            PhysicalLine(geometry, [lines[nb_y] for lines in lines_x_bottom],
+                         'plus_y_bottom')
+            PhysicalLine(geometry, [lines[0] for lines in lines_x_top],
+                         'minus_y_top')
+            PhysicalLine(geometry, [lines[nb_y] for lines in lines_x_top],
+                         'plus_y_top')
+            PhysicalSurface(geometry, [faces[nb_y] for faces in faces_x],
+                            'surface_top')
+            PhysicalSurface(geometry, [faces[0] for faces in faces_x],
+                            'surface_bottom')
+
+
+class ListItemId:
+    """Signed id of an entity created by Gmsh, only known as a list item."""
+
+    def __init__(self, name, index, sign=1):
+        self.name = name
+        self.index = index
+        self.sign = sign
+
+    def __neg__(self):
+        return ListItemId(self.name, self.index, -self.sign)
+
+    def __str__(self):
+        if self.sign < 0:
+            return "-%s[%d]" % (self.name, self.index)
+        return "%s[%d]" % (self.name, self.index)
+
+    __repr__ = __str__
+
+
+class GeneratedEntity:
+    def __init__(self, entity_id):
+        self.id = entity_id
+
+
+class Duplicata:
+    def __init__(self, geometry, lines, dx, dy):
+        """
+        Translated copy of lines, with their points, made by Gmsh.
+
+        Gmsh numbers the copies after the greatest existing ids, so no line
+        may be defined after a Duplicata: the copies are only referred to
+        through the list variable, as copy_<id>[<index of the line>].
+        """
+        self.line_ids = [line.id for line in lines]
+        self.dx = dx
+        self.dy = dy
+
+        self.id = geometry.add_line(self)
+        self.name = "copy_%d" % self.id
+        self.lines = [GeneratedEntity(ListItemId(self.name, index))
+                      for index in range(len(lines))]
+
+    def __repr__(self):
+        return ("%s[] = Translate {%s, %s, 0} { Duplicata { Line{%s}; } };\n"
+                % (self.name, self.dx, self.dy,
+                   ', '.join([format(line_id) for line_id in self.line_ids])))
+
+
+class TranslatedShape:
+    def __init__(self, geometry, shape, dx, dy):
+        """
+        Copy of an inclusion shape, moved by (dx, dy).
+
+        Only the lines are copied by Gmsh: the loops and the surfaces of the
+        copy are written again, on the copied lines.
+        """
+        lines = shape.lines
+        if hasattr(shape, 'lines_top'):
+            lines = shape.lines_top + shape.lines_bottom + shape.lines
+        duplicata = Duplicata(geometry, lines, dx, dy)
+        copies = dict(zip([line.id for line in lines], duplicata.lines))
+
+        self.el_size = shape.el_size
+        self.lines = [copies[line.id] for line in shape.lines]
+        if hasattr(shape, 'lines_top'):
+            self.lines_top = [copies[line.id] for line in shape.lines_top]
+            self.lines_bottom = [copies[line.id]
+                                 for line in shape.lines_bottom]
+            self.surfaces = []
+            for surface in shape.surfaces:
+                line_ids = surface.loop.line_ids
+                loop = LineLoop(geometry,
+                                [copies[line_id] for line_id in line_ids
+                                 if line_id > 0],
+                                [copies[-line_id] for line_id in line_ids
+                                 if line_id < 0])
+                self.surfaces.append(surface.__class__(geometry, loop))
+
+
+class Extrusion:
+    def __init__(self, geometry, surface, dz, layers=None, recombine=False):
+        """
+        Prism swept by Gmsh from a plane surface, along z.
+
+        Gmsh lists the top surface, the volume, then the lateral surfaces
+        in the order of the lines of the loop of the surface.
+
+        @param layers: number of layers of elements along z, None for an
+            unstructured mesh
+        @param recombine: with layers, mesh the prism by hexahedra (from
+            quadrangles) instead of prisms
+        """
+        self.surface_id = surface.id
+        self.dz = dz
+        self.layers = layers
+        self.recombine = recombine
+
+        self.id = geometry.add_line(self)
+        self.name = "extrusion_%d" % self.id
+        self.top = GeneratedEntity(ListItemId(self.name, 0))
+        self.volume = GeneratedEntity(ListItemId(self.name, 1))
+
+    def lateral(self, index):
+        """Lateral surface swept by the index-th line of the loop."""
+        return GeneratedEntity(ListItemId(self.name, index + 2))
+
+    def __repr__(self):
+        options = ''
+        if self.layers is not None:
+            options = " Layers{%d};" % self.layers
+            if self.recombine:
+                options += " Recombine;"
+        return ("%s[] = Extrude {0, 0, %s} { Surface{%s};%s };\n"
+                % (self.name, self.dz, self.surface_id, options))
+
+
 class Matrix:
     def __init__(self,
                  dim_x,
@@ -621,66 +1009,87 @@ class Matrix:
                                 fill='white',
                                 style=style_line.getStyle())
 
-    def mesh(self):
+    def mesh(self, geometry, tile_bounds=None):
+        """
+        @param tile_bounds: (xs, ys) bounds of the tiles, to split the
+            matrix into a grid of tiles
+        """
+        if tile_bounds is not None:
+            xs, ys = tile_bounds
+            if self.dim_z == 0:
+                return TiledRectangle(geometry, xs, ys, self.pos_z,
+                                      self.el_size, self.periodicity)
+            else:
+                return TiledCuboid(geometry, xs, ys, self.dim_z,
+                                   self.el_size, self.periodicity)
         if self.dim_z == 0:
-            return Rectangle(self.dim_x, self.dim_y,
+            return Rectangle(geometry, self.dim_x, self.dim_y,
                              self.pos_x, self.pos_y, self.pos_z,
                              self.el_size, self.periodicity)
         else:
-            return Cuboid(self.dim_x, self.dim_y, self.dim_z,
+            return Cuboid(geometry, self.dim_x, self.dim_y, self.dim_z,
                           self.pos_x, self.pos_y, self.pos_z,
                           self.el_size, self.periodicity)
 
 
 class Inclusion:
-    instances = []
-
     def __init__(self,
                  type,
                  pos_x,
                  pos_y,
-                 dim_z):
+                 dim_z,
+                 el_size,
+                 dim_x=None,
+                 dim_y=None):
         self.type = type
         self.pos_x = pos_x
         self.pos_y = pos_y
         self.dim_z = dim_z
-        Inclusion.instances.append(self)
+        self.el_size = el_size
+        # Own dimensions of this inclusion, those of its type by default
+        self.dim_x = type.dim_x if dim_x is None else dim_x
+        self.dim_y = type.dim_y if dim_y is None else dim_y
 
     def image(self):
         style_line = StyleBuilder()
-        style_line.setStrokeWidth(self.type.dim_x / 100)
+        style_line.setStrokeWidth(self.dim_x / 100)
         if self.type.shape == 'ellipse':
             return pysvg.shape.ellipse(self.pos_x,
                                        self.pos_y,
-                                       self.type.dim_x / 2,
-                                       self.type.dim_y / 2,
+                                       self.dim_x / 2,
+                                       self.dim_y / 2,
                                        stroke='black',
                                        fill=self.type.color,
                                        style=style_line.getStyle())
         elif self.type.shape == 'rectangle':
-            return pysvg.shape.rect(self.pos_x - self.type.dim_x / 2,
-                                    self.pos_y - self.type.dim_y / 2,
-                                    self.type.dim_x,
-                                    self.type.dim_y,
+            return pysvg.shape.rect(self.pos_x - self.dim_x / 2,
+                                    self.pos_y - self.dim_y / 2,
+                                    self.dim_x,
+                                    self.dim_y,
                                     stroke='black',
                                     fill=self.type.color,
                                     style=style_line.getStyle())
 
-    def mesh(self):
+    def mesh(self, geometry, quartered=False):
+        """
+        @param quartered: draw the circles with four arcs, like the
+            ellipses, since Gmsh merges the copies of the two half circles
+            of a FullCircle
+        """
         if self.dim_z == 0:
             if self.type.shape == 'ellipse':
-                if self.type.dim_x == self.type.dim_y:
-                    return FullCircle(self.type.dim_x / 2,
+                if self.dim_x == self.dim_y and not quartered:
+                    return FullCircle(geometry, self.dim_x / 2,
                                       self.pos_x, self.pos_y, 0,
-                                      self.type.el_size)
+                                      self.el_size)
                 else:
-                    return FullEllipse(self.type.dim_x, self.type.dim_y,
+                    return FullEllipse(geometry, self.dim_x, self.dim_y,
                                        self.pos_x, self.pos_y, 0,
-                                       self.type.el_size)
+                                       self.el_size)
             elif self.type.shape == 'rectangle':
-                    return Rectangle(self.type.dim_x, self.type.dim_y,
+                    return Rectangle(geometry, self.dim_x, self.dim_y,
                                      self.pos_x, self.pos_y, 0,
-                                     self.type.el_size, [None, None])
+                                     self.el_size, [None, None])
             else:
                 raise Exception('Wrong inclusion shape')
         else:
@@ -689,22 +1098,49 @@ class Inclusion:
             else:
                 dim_z = self.dim_z
             if self.type.shape == 'ellipse':
-                if self.type.dim_x == self.type.dim_y:
-                    return CircularCylinder(self.type.dim_x / 2,
+                if self.dim_x == self.dim_y and not quartered:
+                    return CircularCylinder(geometry, self.dim_x / 2,
                                             self.pos_x, self.pos_y, dim_z,
-                                            self.type.el_size)
+                                            self.el_size)
                 else:
-                    return EllipticCylinder(self.type.dim_x, self.type.dim_y,
+                    return EllipticCylinder(geometry, self.dim_x, self.dim_y,
                                             self.pos_x, self.pos_y, dim_z,
-                                            self.type.el_size)
+                                            self.el_size)
             elif self.type.shape == 'rectangle':
-                    return Cuboid(self.type.dim_x, self.type.dim_y, dim_z,
+                    return Cuboid(geometry, self.dim_x, self.dim_y, dim_z,
                                   self.pos_x, self.pos_y, 0,
-                                  self.type.el_size, [None, None, None])
+                                  self.el_size, [None, None, None])
             else:
                 raise Exception('Wrong inclusion shape')
 
 
+def unit_cell_crystal(dim_x, dim_y, periodicity, nb_x, nb_y, space_x,
+                      space_y, crystal_shape, inclusion_map):
+    """
+    Reduce a periodic crystal whose map repeats to its smallest periodic
+    cell, which is the same crystal up to a translation.  An axis is only
+    reduced when it is periodic and the matrix holds a whole number of
+    cells along it.
+
+    @return: (dim_x, dim_y, nb_x, nb_y, inclusion_map) of the cell
+    """
+    if isinstance(inclusion_map, SparseMap):
+        jj, ii = numpy.mgrid[0:nb_y, 0:nb_x]
+        inclusion_map = inclusion_map.lookup(ii.ravel(), jj.ravel(), nb_x,
+                                             nb_y).reshape(nb_y, nb_x)
+    period_x, period_y = map_periods(inclusion_map, nb_x, nb_y,
+                                     crystal_shape)
+    if (periodicity[0] and period_x < nb_x
+            and abs(dim_x - nb_x * space_x) <= TOLERANCE * dim_x):
+        dim_x, nb_x = period_x * space_x, period_x
+    if (periodicity[1] and period_y < nb_y
+            and abs(dim_y - nb_y * space_y) <= TOLERANCE * dim_y):
+        dim_y, nb_y = period_y * space_y, period_y
+    if inclusion_map is not None:
+        inclusion_map = numpy.asarray(inclusion_map)[:nb_y, :nb_x]
+    return dim_x, dim_y, nb_x, nb_y, inclusion_map
+
+
 class Crystal:
     def __init__(self,
                  name,
@@ -724,131 +1160,620 @@ class Crystal:
                  inclusion_map,
                  inclusion_types,
                  physical_point_map,
-                 physical_line_map):
+                 physical_line_map,
+                 storage='objects',  # objects, arrays or sections
+                 lattice_vectors=None,
+                 basis=None,
+                 rotation=0,
+                 sites=None,
+                 output_mode='explicit',  # explicit, instanced, scripted,
+                                          # extruded, occ or structured
+                 layers=None,
+                 merge_tolerance=None,
+                 size_fields=None,
+                 site_order=None,  # None, hilbert or morton
+                 tiles=None,
+                 symmetry=False,
+                 unit_cell=False):
+        """
+        Check and keep the description of a crystal, each argument being
+        kept as an attribute.  The crystal is only built by its first
+        output (mesh, image...), and its outputs are kept.  Assigning one
+        of these attributes changes the description, so that the crystal
+        is built again at its next output; the items of the description
+        changed in place (an inclusion type, the cells of a map...) are not
+        seen.
+        """
+        description = dict(locals())
+        del description['self']
+        check_description(**description)
+        self.__dict__.update(description)
+        # Built crystal, and the description it was built from
+        self.state = None
+        self.state_description = None
+
+    def description(self):
+        """Arguments of the crystal, with their current values."""
+        return dict([(name, getattr(self, name))
+                     for name in CRYSTAL_ARGUMENTS])
+
+    def built(self):
+        """
+        Return the BuiltCrystal of the description, built again when an
+        argument was assigned since the last build.
+        """
+        description = self.description()
+        if (self.state is None
+                or any([value is not self.state_description[name]
+                        for name, value in description.iteritems()])):
+            check_description(**description)
+            self.state = BuiltCrystal(**description)
+            self.state_description = description
+        return self.state
+
+    def validate(self, min_gap=0):
+        """See BuiltCrystal.validate."""
+        return self.built().validate(min_gap)
+
+    def estimate(self):
+        """See BuiltCrystal.estimate."""
+        return self.built().estimate()
+
+    def fit_sizes(self, max_elements):
+        """See BuiltCrystal.fit_sizes."""
+        return self.built().fit_sizes(max_elements)
+
+    def image(self):
+        return self.built().image()
 
-        # Reset the instances lists
-        Value.instances = {}
-        Point.instances = []
-        Line.instances = []
-        PhysicalEntity.instances = []
-        Inclusion.instances = []
+    def write_msh(self, fileobj, binary=False, simplices=False):
+        """See BuiltCrystal.write_msh."""
+        self.built().write_msh(fileobj, binary, simplices)
+
+    def write_mesh(self, fileobj):
+        """See BuiltCrystal.write_mesh."""
+        self.built().write_mesh(fileobj)
+
+    def write_sections(self, directory):
+        """See BuiltCrystal.write_sections."""
+        return self.built().write_sections(directory)
+
+    def mesh(self):
+        return self.built().mesh()
+
+
+def check_description(name, dim_x, dim_y, dim_z, periodicity, nb_x, nb_y,
+                      space_x, space_y, pos_x, pos_y, crystal_shape,
+                      el_size_bulk, bulk_tag, inclusion_map, inclusion_types,
+                      physical_point_map, physical_line_map, storage,
+                      lattice_vectors, basis, rotation, sites, output_mode,
+                      layers, merge_tolerance, size_fields, site_order, tiles,
+                      symmetry, unit_cell):
+    """Check the arguments of a crystal, those of Crystal.__init__."""
+    assert storage in ['objects', 'arrays', 'sections'], \
+        "Wrong storage type!"
+    assert output_mode in ['explicit', 'instanced', 'scripted',
+                           'extruded', 'occ', 'structured'], \
+        "Wrong output mode!"
+    assert (output_mode != 'structured'
+            or all([type is None or type.shape == 'rectangle'
+                    for type in inclusion_types])), \
+        "Structured output needs rectangular inclusions!"
+    assert output_mode != 'scripted' or dim_z == 0, \
+        "Scripted output is only available in 2D!"
+    assert output_mode != 'extruded' or dim_z != 0, \
+        "Extruded output is only available in 3D!"
+    # Gmsh can only match the meshes of the extruded lateral faces of
+    # the matrix when they are structured
+    assert (output_mode != 'extruded' or layers is not None
+            or not (periodicity[0] or periodicity[1])), \
+        "Periodic extruded crystals need layers!"
+    # The copies are referred to through Gmsh variables, which can not
+    # be stored in arrays
+    assert output_mode != 'instanced' or storage == 'objects', \
+        "Instanced output needs the objects storage!"
+    # The copies would refer to the shared lines, which may be reversed
+    assert output_mode != 'instanced' or merge_tolerance is None, \
+        "Instanced output can not share entities!"
+    # The ids of each site only depend on the site itself
+    assert (storage != 'sections' or output_mode == 'explicit'
+            and merge_tolerance is None), \
+        "Sections need the explicit output, without shared entities!"
+    assert (not size_fields
+            or output_mode in ['explicit', 'instanced']), \
+        "Size fields are only available in explicit or instanced output!"
+    assert tiles is None or output_mode in ['explicit', 'instanced'], \
+        "Tiles are only available in explicit or instanced output!"
+    # The inclusions on the symmetry planes are cut by OpenCASCADE
+    assert not symmetry or output_mode == 'occ', \
+        "Symmetry reduction needs the occ output!"
+    # The physical points and lines would not repeat with the cell
+    assert (not unit_cell or sites is None and lattice_vectors is None
+            and not rotation and not physical_point_map
+            and not physical_line_map), \
+        "Unit cells need a bare rectangular or hexagonal lattice!"
+    assert crystal_shape in ['square', 'hexa'], "Wrong crystal type!"
+
+
+# Names of the arguments of Crystal, in order
+CRYSTAL_ARGUMENTS = ['name', 'dim_x', 'dim_y', 'dim_z', 'periodicity', 'nb_x',
+                     'nb_y', 'space_x', 'space_y', 'pos_x', 'pos_y',
+                     'crystal_shape', 'el_size_bulk', 'bulk_tag',
+                     'inclusion_map', 'inclusion_types', 'physical_point_map',
+                     'physical_line_map', 'storage', 'lattice_vectors',
+                     'basis', 'rotation', 'sites', 'output_mode', 'layers',
+                     'merge_tolerance', 'size_fields', 'site_order', 'tiles',
+                     'symmetry', 'unit_cell']
+
+
+class BuiltCrystal:
+    def __init__(self, name, dim_x, dim_y, dim_z, periodicity, nb_x, nb_y,
+                 space_x, space_y, pos_x, pos_y, crystal_shape, el_size_bulk,
+                 bulk_tag, inclusion_map, inclusion_types,
+                 physical_point_map, physical_line_map, storage,
+                 lattice_vectors, basis, rotation, sites, output_mode,
+                 layers, merge_tolerance, size_fields, site_order, tiles,
+                 symmetry, unit_cell):
+        """
+        Build a crystal, the arguments being those of Crystal.  The
+        attributes named after them hold the crystal as built, which may
+        differ from its description (the unit cell, the symmetry axes...).
+        """
+        if unit_cell:
+            (dim_x, dim_y, nb_x, nb_y, inclusion_map) = unit_cell_crystal(
+                dim_x, dim_y, periodicity, nb_x, nb_y, space_x, space_y,
+                crystal_shape, inclusion_map)
+        if storage == 'arrays':
+            geometry = ArrayGeometry(merge_tolerance)
+        elif storage == 'sections':
+            if sites is None:
+                nb_basis = 1 if basis is None else len(basis)
+                geometry = SectionedGeometry(nb_x * nb_y * nb_basis)
+            else:
+                geometry = SectionedGeometry(len(sites))
+        else:
+            geometry = Geometry(merge_tolerance)
+        self.geometry = geometry
+        self.output_mode = output_mode
+        self.layers = layers
+        self.basis = basis
+        self.size_fields = size_fields
+        self.inclusions = []
 
         self.name = name
         self.dim_x = dim_x
         self.dim_y = dim_y
         self.dim_z = dim_z
-        el_size_bulk_value = Value('size_bulk', el_size_bulk)
+        self.periodicity = periodicity
+        self.inclusion_types = inclusion_types
+        el_size_bulk_value = Value(geometry, 'size_bulk', el_size_bulk)
         self.physical_lines = []
-
-        if inclusion_map is not None:
-            assert len(inclusion_map) == nb_y, "Wrong map size!"
-            assert len(inclusion_map[0]) == nb_x, "Wrong map size!"
-        assert crystal_shape in ['square', 'hexa'], "Wrong crystal type!"
+        self.line_centers = {}
+        self.plane_lines = set()
+        self.physical_point_groups = []
+        self.physical_line_groups = []
+        self.meshed = False
+        self.geo = None
+        self.svg = None
 
         self.matrix = Matrix(dim_x, dim_y, dim_z, 0, 0, 0,
                              el_size_bulk_value, periodicity, bulk_tag)
 
+        el_size_values = {}
         for type in inclusion_types:
-            if type is not None:
-                el_size_name = "size_%s" % len(Value.instances)
-                el_size_value = Value(el_size_name, type.el_size)
-                type.el_size = el_size_value
-
-        dim_crystal_x = (nb_x - 1) * space_x
-        dim_crystal_y = (nb_y - 1) * space_y
-        crystal_base_x = pos_x - dim_crystal_x / 2
-        crystal_base_y = pos_y - dim_crystal_y / 2
-
-        for i in range(nb_x):
-            for j in range(nb_y):
-                if crystal_shape == 'hexa' and j % 2 == 1:
-                    x = crystal_base_x + i * space_x + space_x / 2
-                    y = crystal_base_y + j * space_y
-                else:
-                    x = crystal_base_x + i * space_x
-                    y = crystal_base_y + j * space_y
-                type_id = 0 if inclusion_map is None else inclusion_map[j][i]
-                type = inclusion_types[type_id]
-                if type is not None:
-                    Inclusion(type, x, y, dim_z)
+            if type is not None and id(type) not in el_size_values:
+                el_size_name = "size_%s" % len(geometry.values)
+                el_size_value = Value(geometry, el_size_name, type.el_size)
+                el_size_values[id(type)] = el_size_value
+        self.el_size_values = el_size_values
+
+        # Explicit sites (disordered crystals...) replace the lattice
+        self.nb_x = nb_x
+        self.nb_y = nb_y
+        self.lattice_frame = None
+        if sites is None:
+            self.lattice_frame = lattice_frame(nb_x, nb_y, space_x, space_y,
+                                               pos_x, pos_y, crystal_shape,
+                                               lattice_vectors, basis,
+                                               rotation)
+            sites = lattice_sites(nb_x, nb_y, space_x, space_y, pos_x, pos_y,
+                                  crystal_shape, inclusion_map,
+                                  lattice_vectors, basis, rotation)
+        present = numpy.array([type is not None for type in inclusion_types])
+        self.sites = sites[present[sites['type']]]
+        # The ids of the entities of the inclusions follow their order
+        if site_order is not None:
+            self.sites = self.sites[curve_order(self.sites['x'],
+                                                self.sites['y'], site_order)]
+
+        for x, y, type_id, site_dim_x, site_dim_y in zip(
+                self.sites['x'].tolist(), self.sites['y'].tolist(),
+                self.sites['type'].tolist(),
+                self.sites['dim_x'].tolist(), self.sites['dim_y'].tolist()):
+            type = inclusion_types[type_id]
+            self.inclusions.append(
+                Inclusion(type, x, y, dim_z, el_size_values[id(type)],
+                          None if numpy.isnan(site_dim_x) else site_dim_x,
+                          None if numpy.isnan(site_dim_y) else site_dim_y))
+
+        # Only the part of the crystal on the positive side of its
+        # symmetry planes is meshed
+        self.symmetry = (False, False)
+        if symmetry:
+            self.symmetry = self.mirror_axes(physical_point_map,
+                                             physical_line_map)
 
         for physical_point_type in physical_point_map:
             point_type = physical_point_type[0]
             point_list = physical_point_type[1]
             points = []
             for point in point_list:
-                my_point = Point(point[0],
+                if (self.symmetry[0] and point[0] < 0
+                        or self.symmetry[1] and point[1] < 0):
+                    continue
+                my_point = Point(geometry, point[0],
                                  point[1],
                                  point[2],
                                  el_size_bulk)
                 points.append(my_point)
-            PhysicalPoint(points, point_type)
+            PhysicalPoint(geometry, points, point_type)
+            self.physical_point_groups.append((point_type, points))
 
+        line_boxes = []
         for physical_line_type in physical_line_map:
             line_type = physical_line_type[0]
-            point_list = physical_line_type[1]
+            # A copy, the description being reusable
+            point_list = list(physical_line_type[1])
 
             assert len(point_list) % 2 == 0, 'Need an even number of points!'
             lines = []
             while point_list:
                 point1 = point_list.pop()
                 point2 = point_list.pop()
-                pt1 = Point(point1[0],
+                for axis in range(2):
+                    if self.symmetry[axis] and point1 is not None:
+                        point1, point2 = clip_segment(point1, point2,
+                                                      axis) or (None, None)
+                if point1 is None:
+                    continue
+                on_plane = any([self.symmetry[axis]
+                                and 0 in (point1[axis], point2[axis])
+                                for axis in range(2)])
+                pt1 = Point(geometry, point1[0],
                             point1[1],
                             point1[2],
                             el_size_bulk)
-                pt2 = Point(point2[0],
+                pt2 = Point(geometry, point2[0],
                             point2[1],
                             point2[2],
                             el_size_bulk)
-                my_line = StraightLine(pt1, pt2)
+                my_line = StraightLine(geometry, pt1, pt2)
                 lines.append(my_line)
+                line_boxes.append((min(point1[0], point2[0]),
+                                   max(point1[0], point2[0]),
+                                   min(point1[1], point2[1]),
+                                   max(point1[1], point2[1])))
+                self.line_centers[abs(my_line.id)] = \
+                    ((point1[0] + point2[0]) / 2, (point1[1] + point2[1]) / 2)
                 if point1[2] == point2[2]:
                     self.physical_lines.append((my_line, point1[2]))
-            PhysicalLine(lines, line_type)
+                if on_plane:
+                    self.plane_lines.add(abs(my_line.id))
+            PhysicalLine(geometry, lines, line_type)
+            self.physical_line_groups.append((line_type, lines))
+        # The lines shared from now on also bound the matrix or a shape
+        if geometry.shared is not None:
+            geometry.shared.reused_lines.clear()
+
+        self.tile_bounds = None
+        if tiles is not None:
+            self.tile_bounds = self.tile_grid_bounds(tiles, line_boxes)
+
+    def validate(self, min_gap=0):
+        """
+        Check that the inclusions neither overlap nor leave the matrix.
+
+        In 3D, the plots (below the matrix) as well as the holes and
+        inclusions (inside it) cut its bottom face, so they are all checked
+        together in the (x, y) plane.
+
+        @param min_gap: minimal distance between two inclusions, and between
+            an inclusion and the boundary of the matrix
+        @return: ValidationReport, indexing the inclusions of self.inclusions
+        """
+        dim_x, dim_y, ellipse = self.inclusion_dimensions()
+        return find_conflicts(self.sites['x'], self.sites['y'],
+                              dim_x / 2, dim_y / 2, ellipse,
+                              self.dim_x / 2, self.dim_y / 2, min_gap)
+
+    def inclusion_dimensions(self):
+        """
+        @return: (dim_x, dim_y, ellipse) arrays of the inclusions, in the
+            order of self.inclusions
+        """
+        return site_dimensions(self.sites, self.inclusion_types)
+
+    def estimate(self):
+        """
+        Predict the size of the mesh, without running Gmsh.
+
+        The areas, or volumes in 3D, of the matrix and of the inclusions
+        are computed exactly.  Gmsh interpolates the element size between
+        the points, so the matrix is meshed with the mean size of the
+        inclusions over their bounding box, and with a size going linearly
+        from it to el_size_bulk outside.  The size fields are not taken
+        into account.
+
+        @return: MeshEstimate
+        """
+        dim = 2 if self.dim_z == 0 else 3
+        depth = self.dim_z or 1
+        result = MeshEstimate(dim)
+        matrix = result.region(self.matrix.tag)
+        types = self.sites['type']
+        dim_x, dim_y, ellipse = self.inclusion_dimensions()
+        nb_types = len(self.inclusion_types)
+        type_areas = numpy.bincount(types,
+                                    weights=shape_areas(dim_x, dim_y, ellipse),
+                                    minlength=nb_types)
+        type_counts = numpy.bincount(types, minlength=nb_types)
+
+        matrix_measure = self.dim_x * self.dim_y * depth
+        core_measure = 0
+        if len(types):
+            core_measure = (extent(self.sites['x'], dim_x, self.dim_x)
+                            * extent(self.sites['y'], dim_y, self.dim_y)
+                            * depth)
+        inclusions_density = 0
+        for type, area, count, value in zip(self.inclusion_types, type_areas,
+                                            type_counts,
+                                            self.type_size_values()):
+            if type is None or count == 0:
+                continue
+            density = size_density(value.value, dim)
+            inclusions_density += count * density / len(types)
+            if dim == 3 and type.type == 'plot':
+                measure = area * type.dim_z
+            else:
+                measure = area * depth
+                matrix_measure -= measure
+                core_measure -= measure
+            if type.type != 'hole':
+                result.region(type.tag).add(measure, density)
+
+        bulk_size = self.matrix.el_size.value
+        if len(types):
+            matrix.add(core_measure, inclusions_density)
+            matrix.add(matrix_measure - core_measure,
+                       ramp_density(bulk_size,
+                                    inclusions_density ** (-1 / dim), dim))
+        else:
+            matrix.add(matrix_measure, size_density(bulk_size, dim))
+        return result
+
+    def fit_sizes(self, max_elements):
+        """
+        Element sizes for a mesh of about max_elements elements, all the
+        sizes being scaled by the same factor.
+
+        @return: (el_size_bulk, el_sizes), el_sizes being the new sizes of
+            the inclusion types, None for the missing ones
+        """
+        scale = self.estimate().size_scale(max_elements)
+        el_sizes = [None if value is None else value.value * scale
+                    for value in self.type_size_values()]
+        return self.matrix.el_size.value * scale, el_sizes
+
+    def type_size_values(self):
+        """Values of the element sizes, in the order of the inclusion types."""
+        return [None if type is None else self.el_size_values[id(type)]
+                for type in self.inclusion_types]
+
+    def embedded_lines(self):
+        """
+        Physical lines to embed in the matrix, as (line, z), leaving out
+        the shared ones which bound the matrix or a shape.
+        """
+        if self.geometry.shared is None:
+            return self.physical_lines
+        reused_lines = self.geometry.shared.reused_lines
+        return [(line, line_z) for line, line_z in self.physical_lines
+                if abs(line.id) not in reused_lines]
+
+    def mirror_axes(self, physical_point_map, physical_line_map):
+        """
+        Tell along which axes the crystal is symmetric through the plane
+        at the center of the matrix: its sites, with their types and
+        dimensions, and its physical points and lines.  The periodic axes
+        are not reduced.
+
+        @return: (symmetric along x, symmetric along y)
+        """
+        tolerance = TOLERANCE * max(self.dim_x, self.dim_y)
+        dim_x, dim_y, _ = self.inclusion_dimensions()
+        sites = numpy.column_stack((self.sites['type'], self.sites['x'],
+                                    self.sites['y'], dim_x, dim_y))
+        points = numpy.array([[group] + list(point)
+                              for group, (_, point_list)
+                              in enumerate(physical_point_map)
+                              for point in point_list],
+                             dtype=float).reshape(-1, 4)
+        segments = []
+        for group, (_, point_list) in enumerate(physical_line_map):
+            segments.extend(segment_rows(group, zip(point_list[0::2],
+                                                    point_list[1::2])))
+        return tuple([not self.periodicity[axis]
+                      and mirror_invariant(sites, [1 + axis], tolerance)
+                      and mirror_invariant(points, [1 + axis], tolerance)
+                      and segments_invariant(segments, axis, tolerance)
+                      for axis in range(2)])
+
+    def tile_grid_bounds(self, tiles, line_boxes):
+        """
+        Bounds of the tiles of the matrix, whose sides go through the gaps
+        between the inclusions and the physical lines.
+
+        @param tiles: wanted number of tiles along x and y
+        @param line_boxes: (x_min, x_max, y_min, y_max) of the physical
+            lines
+        @return: (xs, ys)
+        """
+        dim_x, dim_y, _ = self.inclusion_dimensions()
+        boxes = numpy.array(line_boxes, dtype=float).reshape(-1, 4)
+        lows_x = numpy.concatenate([self.sites['x'] - dim_x / 2, boxes[:, 0]])
+        highs_x = numpy.concatenate([self.sites['x'] + dim_x / 2,
+                                     boxes[:, 1]])
+        lows_y = numpy.concatenate([self.sites['y'] - dim_y / 2, boxes[:, 2]])
+        highs_y = numpy.concatenate([self.sites['y'] + dim_y / 2,
+                                     boxes[:, 3]])
+        cuts_x = tile_cuts(lows_x, highs_x, -self.dim_x / 2, self.dim_x / 2,
+                           tiles[0])
+        cuts_y = tile_cuts(lows_y, highs_y, -self.dim_y / 2, self.dim_y / 2,
+                           tiles[1])
+        return ([-self.dim_x / 2] + cuts_x + [self.dim_x / 2],
+                [-self.dim_y / 2] + cuts_y + [self.dim_y / 2])
+
+    def tile_members(self):
+        """
+        Indices of the inclusions of each tile, tile_members[i][j] being
+        those of the tile (i, j).
+        """
+        xs, ys = self.tile_bounds
+        nb_y = len(ys) - 1
+        keys = (tile_indices(self.sites['x'], xs[1:-1]) * nb_y
+                + tile_indices(self.sites['y'], ys[1:-1]))
+        order = numpy.argsort(keys, kind='mergesort')
+        starts = numpy.searchsorted(keys[order],
+                                    numpy.arange((len(xs) - 1) * nb_y + 1))
+        members = [order[begin:end].tolist()
+                   for begin, end in zip(starts[:-1], starts[1:])]
+        return [members[i * nb_y:(i + 1) * nb_y]
+                for i in range(len(xs) - 1)]
+
+    def line_tile(self, line):
+        """Tile (i, j) of the center of a physical line."""
+        xs, ys = self.tile_bounds
+        x, y = self.line_centers[abs(line.id)]
+        return (int(tile_indices(x, xs[1:-1])),
+                int(tile_indices(y, ys[1:-1])))
 
     def image(self):
-        mysvg = pysvg.structure.svg(self.name)
-        mysvg.addElement(self.matrix.image())
-        for inclusion in Inclusion.instances:
-            mysvg.addElement(inclusion.image())
-        return mysvg
+        if self.svg is None:
+            self.svg = pysvg.structure.svg(self.name)
+            self.svg.addElement(self.matrix.image())
+            for inclusion in self.inclusions:
+                self.svg.addElement(inclusion.image())
+        return self.svg
+
+    def site_sections(self):
+        """
+        Return the (name, slot) of the section of each inclusion, in the
+        order of self.inclusions.  The slot of a lattice site is given by
+        its cell and its basis offset, and the one of an explicit site by
+        its index, so that it does not depend on the other sites.
+        """
+        sites = self.sites
+        nb_basis = 1 if self.basis is None else len(self.basis)
+        slots = numpy.where(
+            sites['i'] >= 0,
+            (sites['j'] * self.nb_x + sites['i']) * nb_basis + sites['basis'],
+            numpy.arange(len(sites))) + 1
+        return [('site_%d' % slot, slot) for slot in slots.tolist()]
+
+    def mesh_inclusions(self):
+        """
+        Return the shapes of the inclusions, in the order of self.inclusions.
+
+        In the instanced output mode, the first inclusion of each type (and
+        dimensions) is written once, and the other ones are translated
+        copies of it.  In the explicit one, each inclusion is put in the
+        section of its site.
+        """
+        geometry = self.geometry
+        if self.output_mode == 'explicit':
+            meshes = []
+            for inclusion, section in zip(self.inclusions,
+                                          self.site_sections()):
+                geometry.section(*section)
+                meshes.append(inclusion.mesh(geometry))
+                meshes[-1].section = section
+            geometry.section('matrix')
+            return meshes
+
+        # All the templates are written before the first Duplicata
+        templates = {}
+        for inclusion in self.inclusions:
+            key = (id(inclusion.type), inclusion.dim_x, inclusion.dim_y)
+            if key not in templates:
+                templates[key] = (inclusion,
+                                  inclusion.mesh(geometry, quartered=True))
+
+        meshes = []
+        for inclusion in self.inclusions:
+            key = (id(inclusion.type), inclusion.dim_x, inclusion.dim_y)
+            template, template_mesh = templates[key]
+            if inclusion is template:
+                meshes.append(template_mesh)
+            else:
+                meshes.append(TranslatedShape(geometry, template_mesh,
+                                              inclusion.pos_x - template.pos_x,
+                                              inclusion.pos_y - template.pos_y))
+        return meshes
 
     def mesh_2d(self):
+        geometry = self.geometry
         inclusions_lines_all = []
-        inclusions_lines_by_tag = {}
+        inclusions_by_tag = {}
 
-        for inclusion in Inclusion.instances:
-            inclusion_mesh = inclusion.mesh()
+        # No line may be defined after the copies of the instanced mode
+        if self.output_mode == 'instanced':
+            matrix_mesh = self.matrix.mesh(geometry, self.tile_bounds)
+        inclusion_meshes = self.mesh_inclusions()
+        for inclusion, inclusion_mesh in zip(self.inclusions,
+                                             inclusion_meshes):
             inclusions_lines_all.extend(inclusion_mesh.lines)
             if inclusion.type.type != 'hole':
-                if inclusion.type.tag not in inclusions_lines_by_tag.keys():
-                    inclusions_lines_by_tag[inclusion.type.tag] = []
-                inclusions_lines_by_tag[inclusion.type.tag].append(inclusion_mesh.lines)
-
-        loop = LineLoop(self.matrix.mesh().lines, inclusions_lines_all)
-        surface = PlaneSurface(loop)
-        PhysicalSurface([surface], self.matrix.tag)
-        for straight_line, line_z in self.physical_lines:
-            if line_z == 0:
-                LineInSurface(straight_line, surface.id)
+                if inclusion.type.tag not in inclusions_by_tag.keys():
+                    inclusions_by_tag[inclusion.type.tag] = []
+                inclusions_by_tag[inclusion.type.tag].append(inclusion_mesh)
 
-        for tag, inclusion_lines in inclusions_lines_by_tag.iteritems():
+        if self.output_mode == 'explicit':
+            matrix_mesh = self.matrix.mesh(geometry, self.tile_bounds)
+        if self.tile_bounds is None:
+            loop = LineLoop(geometry, matrix_mesh.lines, inclusions_lines_all)
+            surface = PlaneSurface(geometry, loop)
+            PhysicalSurface(geometry, [surface], self.matrix.tag)
+            for straight_line, line_z in self.embedded_lines():
+                if line_z == 0:
+                    LineInSurface(geometry, straight_line, surface.id)
+        else:
+            self.mesh_tiles_2d(matrix_mesh, inclusion_meshes)
+
+        for tag, inclusions in inclusions_by_tag.iteritems():
             inclusion_surfaces = []
-            for lines in inclusion_lines:
-                loop = LineLoop(lines)
-                inclusion_surfaces.append(PlaneSurface(loop))
-            PhysicalSurface(inclusion_surfaces, tag)
+            for inclusion in inclusions:
+                if self.output_mode == 'explicit':
+                    geometry.section(*inclusion.section)
+                loop = LineLoop(geometry, inclusion.lines)
+                inclusion_surfaces.append(PlaneSurface(geometry, loop))
+            PhysicalSurface(geometry, inclusion_surfaces, tag)
+        geometry.section('matrix')
+        self.mesh_fields(inclusion_meshes)
 
     def mesh_3d(self):
+        geometry = self.geometry
         inclusions_lines_all_top = []
         inclusions_lines_all_bottom = []
         inclusions_by_tag = {}
         inclusions_surfaces = []
         plot_surfaces_bottom = []
 
-        for inclusion in Inclusion.instances:
-            inclusion_mesh = inclusion.mesh()
+        # No line may be defined after the copies of the instanced mode
+        if self.output_mode == 'instanced':
+            matrix_mesh = self.matrix.mesh(geometry, self.tile_bounds)
+        inclusion_meshes = self.mesh_inclusions()
+        for inclusion, inclusion_mesh in zip(self.inclusions,
+                                             inclusion_meshes):
             inclusion_mesh.type = inclusion.type.type
             if inclusion.type.type != 'plot':
                 inclusions_lines_all_top.extend(inclusion_mesh.lines_top)
@@ -859,55 +1784,854 @@ class Crystal:
                 inclusions_by_tag[inclusion.type.tag].append(inclusion_mesh)
             if inclusion.type.type != 'plot':
                 inclusions_surfaces.extend(inclusion_mesh.surfaces)
+            inclusion_mesh.lateral_surfaces = list(inclusion_mesh.surfaces)
 
         for tag, inclusions in inclusions_by_tag.iteritems():
             inclusion_volumes = []
             for inclusion in inclusions:
+                if self.output_mode == 'explicit':
+                    geometry.section(*inclusion.section)
                 inclusion_surfaces = inclusion.surfaces
 
-                loop_top = LineLoop(inclusion.lines_top)
-                loop_bottom = LineLoop(inclusion.lines_bottom)
-                surface_top = PlaneSurface(loop_top)
-                surface_bottom = PlaneSurface(loop_bottom)
+                loop_top = LineLoop(geometry, inclusion.lines_top)
+                loop_bottom = LineLoop(geometry, inclusion.lines_bottom)
+                surface_top = PlaneSurface(geometry, loop_top)
+                surface_bottom = PlaneSurface(geometry, loop_bottom)
                 inclusion_surfaces.append(surface_top)
                 inclusion_surfaces.append(surface_bottom)
                 if inclusion.type == 'plot':
                     plot_surfaces_bottom.append(surface_bottom)
-
-                surface_loop = SurfaceLoop(inclusion_surfaces)
-                inclusion_volumes.append(Volume(surface_loop))
-            PhysicalVolume(inclusion_volumes, tag)
-
-        matrix_mesh = self.matrix.mesh()
-        loop_top = LineLoop(matrix_mesh.lines_top, inclusions_lines_all_top)
-        loop_bottom = LineLoop(matrix_mesh.lines_bottom, inclusions_lines_all_bottom)
-        surface_top = PlaneSurface(loop_top)
-        surface_bottom = PlaneSurface(loop_bottom)
-        for straight_line, line_z in self.physical_lines:
+                    inclusion.surface_bottom = surface_bottom
+
+                surface_loop = SurfaceLoop(geometry, inclusion_surfaces)
+                inclusion_volumes.append(Volume(geometry, surface_loop))
+            PhysicalVolume(geometry, inclusion_volumes, tag)
+        geometry.section('matrix')
+
+        if self.output_mode == 'explicit':
+            matrix_mesh = self.matrix.mesh(geometry, self.tile_bounds)
+        if self.tile_bounds is not None:
+            self.mesh_tiles_3d(matrix_mesh, inclusion_meshes)
+            self.mesh_fields(inclusion_meshes)
+            return
+        loop_top = LineLoop(geometry, matrix_mesh.lines_top,
+                            inclusions_lines_all_top)
+        loop_bottom = LineLoop(geometry, matrix_mesh.lines_bottom,
+                               inclusions_lines_all_bottom)
+        surface_top = PlaneSurface(geometry, loop_top)
+        surface_bottom = PlaneSurface(geometry, loop_bottom)
+        for straight_line, line_z in self.embedded_lines():
             if line_z == 0:
-                LineInSurface(straight_line, surface_bottom.id)
+                LineInSurface(geometry, straight_line, surface_bottom.id)
             if line_z == self.dim_z:
-                LineInSurface(straight_line, surface_top.id)
+                LineInSurface(geometry, straight_line, surface_top.id)
         matrix_mesh.surfaces.append(surface_top)
         matrix_mesh.surfaces.append(surface_bottom)
         matrix_mesh.surfaces.extend(plot_surfaces_bottom)
-        surface_loop = SurfaceLoop(matrix_mesh.surfaces, inclusions_surfaces)
-        matrix_volume = Volume(surface_loop)
-        PhysicalVolume([matrix_volume], self.matrix.tag)
+        surface_loop = SurfaceLoop(geometry, matrix_mesh.surfaces,
+                                   inclusions_surfaces)
+        matrix_volume = Volume(geometry, surface_loop)
+        PhysicalVolume(geometry, [matrix_volume], self.matrix.tag)
+        self.mesh_fields(inclusion_meshes)
+
+    def mesh_tiles_2d(self, matrix_mesh, inclusion_meshes):
+        """Surfaces of the tiles of the matrix, with their own holes."""
+        geometry = self.geometry
+        surfaces = []
+        for column, column_members in zip(matrix_mesh.tiles,
+                                          self.tile_members()):
+            column_surfaces = []
+            for (pos_lines, neg_lines), members in zip(column,
+                                                       column_members):
+                holes = [line for index in members
+                         for line in inclusion_meshes[index].lines]
+                loop = LineLoop(geometry, pos_lines, neg_lines + holes)
+                column_surfaces.append(PlaneSurface(geometry, loop))
+            surfaces.append(column_surfaces)
+        PhysicalSurface(geometry, [surface for column in surfaces
+                                   for surface in column], self.matrix.tag)
+        for straight_line, line_z in self.embedded_lines():
+            if line_z == 0:
+                i, j = self.line_tile(straight_line)
+                LineInSurface(geometry, straight_line, surfaces[i][j].id)
 
-    def mesh(self):
+    def mesh_tiles_3d(self, matrix_mesh, inclusion_meshes):
+        """
+        Volumes of the tiles of the matrix, each one going around its own
+        inclusions and standing on its own plots.
+        """
+        geometry = self.geometry
+        volumes = []
+        embedded = {}
+        for straight_line, line_z in self.embedded_lines():
+            embedded.setdefault(self.line_tile(straight_line),
+                                []).append((straight_line, line_z))
+        for i, column_members in enumerate(self.tile_members()):
+            for j, members in enumerate(column_members):
+                meshes = [inclusion_meshes[index] for index in members]
+                pos_lines, neg_lines = matrix_mesh.tiles_top[i][j]
+                holes = [line for mesh in meshes if mesh.type != 'plot'
+                         for line in mesh.lines_top]
+                surface_top = PlaneSurface(
+                    geometry, LineLoop(geometry, pos_lines, neg_lines + holes))
+                pos_lines, neg_lines = matrix_mesh.tiles_bottom[i][j]
+                holes = [line for mesh in meshes for line in mesh.lines_bottom]
+                surface_bottom = PlaneSurface(
+                    geometry, LineLoop(geometry, pos_lines, neg_lines + holes))
+                for straight_line, line_z in embedded.get((i, j), []):
+                    if line_z == 0:
+                        LineInSurface(geometry, straight_line,
+                                      surface_bottom.id)
+                    if line_z == self.dim_z:
+                        LineInSurface(geometry, straight_line,
+                                      surface_top.id)
+
+                surfaces = matrix_mesh.tile_surfaces[i][j] + [surface_top,
+                                                              surface_bottom]
+                surfaces.extend([mesh.surface_bottom for mesh in meshes
+                                 if mesh.type == 'plot'])
+                inclusions_surfaces = [surface for mesh in meshes
+                                       if mesh.type != 'plot'
+                                       for surface in mesh.lateral_surfaces]
+                surface_loop = SurfaceLoop(geometry, surfaces,
+                                           inclusions_surfaces)
+                volumes.append(Volume(geometry, surface_loop))
+        PhysicalVolume(geometry, volumes, self.matrix.tag)
+
+    def refined_entities(self, refinement, inclusion_meshes):
+        """
+        Entities near which a Refinement applies.
+
+        @return: (points, lines, surfaces), the inclusions being refined
+            near their boundary lines in 2D, and near their surfaces in 3D
+        """
+        only = refinement.only
+        if refinement.near == 'points':
+            return ([point for name, points in self.physical_point_groups
+                     if only is None or name in only
+                     for point in points], [], [])
+        elif refinement.near == 'lines':
+            return ([], [line for name, lines in self.physical_line_groups
+                         if only is None or name in only
+                         for line in lines], [])
+        selected = [inclusion_mesh for inclusion, inclusion_mesh
+                    in zip(self.inclusions, inclusion_meshes)
+                    if only is None or inclusion.type in only]
         if self.dim_z == 0:
+            return ([], [line for inclusion_mesh in selected
+                         for line in inclusion_mesh.lines], [])
+        return ([], [], [surface for inclusion_mesh in selected
+                         for surface in inclusion_mesh.surfaces])
+
+    def mesh_fields(self, inclusion_meshes):
+        """
+        Write the size fields, the size of the elements being the smallest
+        of the one of the fields and the one of the points.
+        """
+        if not self.size_fields:
+            return
+        geometry = self.geometry
+        fields = []
+        for refinement in self.size_fields:
+            if isinstance(refinement, BoxRefinement):
+                fields.append(refinement.mesh(geometry))
+            else:
+                fields.append(refinement.mesh(
+                    geometry, *self.refined_entities(refinement,
+                                                     inclusion_meshes)))
+        if len(fields) > 1:
+            BackgroundField(geometry, MinField(geometry, fields))
+        else:
+            BackgroundField(geometry, fields[0])
+
+    def lattice_blocks(self):
+        """
+        Split the inclusions into rectangular blocks of lattice cells of the
+        same type, and the remaining ones.
+
+        @return: (blocks, singles), blocks being a list of
+            (type_id, basis, i_begin, i_end, j_begin, j_end), and singles
+            the indices of the inclusions which belong to no block
+        """
+        sites = self.sites
+        on_lattice = ((sites['i'] >= 0) & numpy.isnan(sites['dim_x'])
+                      & numpy.isnan(sites['dim_y']))
+        if self.lattice_frame is None:
+            on_lattice[:] = False
+        singles = numpy.flatnonzero(~on_lattice).tolist()
+
+        blocks = []
+        indices = numpy.flatnonzero(on_lattice)
+        keys = sorted(set(zip(sites['type'][indices].tolist(),
+                              sites['basis'][indices].tolist())))
+        for type_id, basis in keys:
+            selected = indices[(sites['type'][indices] == type_id)
+                               & (sites['basis'][indices] == basis)]
+            grid = numpy.full((self.nb_y, self.nb_x), -1, dtype=int)
+            grid[sites['j'][selected], sites['i'][selected]] = selected
+            for i_begin, i_end, j_begin, j_end in rectangle_blocks(grid >= 0):
+                if (i_end - i_begin) * (j_end - j_begin) == 1:
+                    singles.append(grid[j_begin, i_begin])
+                else:
+                    blocks.append((type_id, basis,
+                                   i_begin, i_end, j_begin, j_end))
+        return blocks, sorted(singles)
+
+    def mesh_scripted(self):
+        """
+        Mesh a 2D crystal with Gmsh For loops calling one macro per type.
+
+        Only the inclusions which belong to no block of lattice cells are
+        written explicitly.  The entities created by the script are
+        numbered by Gmsh after all the explicit ones, so the matrix surface,
+        which depends on them, is also numbered by Gmsh.
+        """
+        geometry = self.geometry
+        matrix_mesh = self.matrix.mesh(geometry)
+        blocks, singles = self.lattice_blocks()
+
+        inclusions_lines_all = []
+        surfaces_by_tag = {}
+        for index in singles:
+            inclusion = self.inclusions[index]
+            inclusion_mesh = inclusion.mesh(geometry)
+            inclusions_lines_all.extend(inclusion_mesh.lines)
+            if inclusion.type.type != 'hole':
+                loop = LineLoop(geometry, inclusion_mesh.lines)
+                surfaces_by_tag.setdefault(inclusion.type.tag, []).append(
+                    PlaneSurface(geometry, loop))
+
+        lines_list = ScriptList(geometry, 'inclusion_lines')
+        macros = {}
+        for type_id, basis, i_begin, i_end, j_begin, j_end in blocks:
+            if type_id not in macros:
+                type = self.inclusion_types[type_id]
+                surfaces_list = None
+                if type.type != 'hole':
+                    surfaces_list = ScriptList(geometry,
+                                               'surfaces_%d' % type_id)
+                    surfaces_by_tag.setdefault(type.tag, []).append(
+                        surfaces_list)
+                macros[type_id] = InclusionMacro(
+                    geometry, 'inclusion_%d' % type_id, type.shape,
+                    type.dim_x, type.dim_y, self.el_size_values[id(type)],
+                    lines_list, surfaces_list)
+            origins, a1, a2, shift = self.lattice_frame
+            LatticeBlock(geometry, macros[type_id], i_begin, i_end,
+                         j_begin, j_end, origins[basis], a1, a2, shift)
+
+        loop = ScriptLineLoop(geometry, 'matrix_loop', matrix_mesh.lines,
+                              inclusions_lines_all, [lines_list])
+        surface = ScriptPlaneSurface(geometry, 'matrix_surface', loop)
+        PhysicalSurface(geometry, [surface], self.matrix.tag)
+        for straight_line, line_z in self.embedded_lines():
+            if line_z == 0:
+                LineInSurface(geometry, straight_line, surface.id)
+
+        for tag, inclusion_surfaces in surfaces_by_tag.iteritems():
+            PhysicalSurface(geometry, inclusion_surfaces, tag)
+
+    def mesh_extruded(self):
+        """
+        Mesh a 3D crystal by extruding its cross-section at z = 0.
+
+        The matrix, the inclusions and the top of the plots are extruded
+        up to dim_z, and the plots down to their depth.  The circles are
+        drawn with four arcs, since Gmsh merges the extrusions of the two
+        half circles of a FullCircle.  The physical lines of the top edges
+        of the matrix are not defined, as Gmsh numbers those edges.
+        """
+        geometry = self.geometry
+        matrix = self.matrix
+        matrix_mesh = Rectangle(geometry, matrix.dim_x, matrix.dim_y,
+                                matrix.pos_x, matrix.pos_y, matrix.pos_z,
+                                matrix.el_size, [None, None])
+        line_left, line_top, line_right, line_bottom = matrix_mesh.lines
+        if self.periodicity[0]:
+            PeriodicLine(geometry, line_left, line_right)
+            PhysicalLine(geometry, [line_left], 'minus_x_bottom')
+            PhysicalLine(geometry, [line_right], 'plus_x_bottom')
+        if self.periodicity[1]:
+            PeriodicLine(geometry, line_bottom, line_top)
+            PhysicalLine(geometry, [line_bottom], 'minus_y_bottom')
+            PhysicalLine(geometry, [line_top], 'plus_y_bottom')
+
+        inclusions_lines_all = []
+        sections = []
+        for inclusion in self.inclusions:
+            section = Inclusion(inclusion.type, inclusion.pos_x,
+                                inclusion.pos_y, 0, inclusion.el_size,
+                                inclusion.dim_x, inclusion.dim_y)
+            section_mesh = section.mesh(geometry, quartered=True)
+            inclusions_lines_all.extend(section_mesh.lines)
+            if inclusion.type.type != 'hole':
+                loop = LineLoop(geometry, section_mesh.lines)
+                sections.append((inclusion, PlaneSurface(geometry, loop)))
+
+        loop = LineLoop(geometry, matrix_mesh.lines, inclusions_lines_all)
+        surface_bottom = PlaneSurface(geometry, loop)
+
+        # No entity may be defined after the extrusions, numbered by Gmsh
+        matrix_extrusion = Extrusion(geometry, surface_bottom, self.dim_z,
+                                     self.layers)
+        matrix_volumes = [matrix_extrusion.volume]
+        volumes_by_tag = {}
+        for inclusion, surface in sections:
+            tag = inclusion.type.tag
+            extrusion = Extrusion(geometry, surface, self.dim_z, self.layers)
+            if inclusion.type.type == 'plot':
+                # The matrix above the plot
+                matrix_volumes.append(extrusion.volume)
+                depth = inclusion.type.dim_z
+                layers = self.layers
+                if layers is not None:
+                    layers = max(1, int(round(layers * depth / self.dim_z)))
+                extrusion = Extrusion(geometry, surface, -depth, layers)
+            volumes_by_tag.setdefault(tag, []).append(extrusion.volume)
+
+        for straight_line, line_z in self.embedded_lines():
+            if line_z == 0:
+                LineInSurface(geometry, straight_line, surface_bottom.id)
+            if line_z == self.dim_z:
+                LineInSurface(geometry, straight_line,
+                              matrix_extrusion.top.id)
+        if self.periodicity[0]:
+            PhysicalSurface(geometry, [matrix_extrusion.lateral(2)],
+                            'surface_right')
+            PhysicalSurface(geometry, [matrix_extrusion.lateral(0)],
+                            'surface_left')
+        if self.periodicity[1]:
+            PhysicalSurface(geometry, [matrix_extrusion.lateral(1)],
+                            'surface_top')
+            PhysicalSurface(geometry, [matrix_extrusion.lateral(3)],
+                            'surface_bottom')
+
+        for tag, inclusion_volumes in volumes_by_tag.iteritems():
+            PhysicalVolume(geometry, inclusion_volumes, tag)
+        PhysicalVolume(geometry, matrix_volumes, matrix.tag)
+
+    def occ_shape(self, inclusion):
+        """OpenCASCADE primitive of an inclusion."""
+        geometry = self.geometry
+        half_x = inclusion.dim_x / 2
+        half_y = inclusion.dim_y / 2
+        if self.dim_z == 0:
+            if inclusion.type.shape == 'ellipse':
+                return OccDisk(geometry, inclusion.pos_x, inclusion.pos_y, 0,
+                               half_x, half_y)
+            elif inclusion.type.shape == 'rectangle':
+                return OccRectangle(geometry, inclusion.pos_x - half_x,
+                                    inclusion.pos_y - half_y, 0,
+                                    inclusion.dim_x, inclusion.dim_y)
+            raise Exception('Wrong inclusion shape')
+
+        bottom, height = 0, inclusion.dim_z
+        if inclusion.type.type == 'plot':
+            bottom, height = -inclusion.type.dim_z, inclusion.type.dim_z
+        if inclusion.type.shape == 'ellipse':
+            return OccCylinder(geometry, inclusion.pos_x, inclusion.pos_y,
+                               bottom, height, half_x, half_y)
+        elif inclusion.type.shape == 'rectangle':
+            return OccBox(geometry, inclusion.pos_x - half_x,
+                          inclusion.pos_y - half_y, bottom,
+                          inclusion.dim_x, inclusion.dim_y, height)
+        raise Exception('Wrong inclusion shape')
+
+    def mesh_occ(self):
+        """
+        Mesh a crystal with the primitive shapes of OpenCASCADE.
+
+        The holes and the inclusions which cross the boundary of the matrix
+        are first cut by it, then the holes are removed from the matrix, and
+        the matrix and the inclusions are fragmented together, so that they
+        share their boundaries.  The unmodified inclusions keep their ids
+        (Geometry.OCCBooleanPreserveNumbering), and the matrix is all the
+        rest.  The boundary entities of the matrix are selected by bounding
+        boxes.  In 3D, the physical lines are not embedded in the faces of
+        the matrix, whose ids are unknown.
+
+        With a symmetry reduction, the matrix only goes from its symmetry
+        planes to its positive sides, and the inclusions on those planes
+        are cut like the ones on its boundary.  The plots, below the
+        matrix, are cut by another box, deleted afterwards.
+        """
+        geometry = self.geometry
+        matrix = self.matrix
+        x_min, x_max = matrix.pos_x - matrix.dim_x / 2, \
+            matrix.pos_x + matrix.dim_x / 2
+        y_min, y_max = matrix.pos_y - matrix.dim_y / 2, \
+            matrix.pos_y + matrix.dim_y / 2
+        size_x, size_y = matrix.dim_x, matrix.dim_y
+        if self.symmetry[0]:
+            x_min, size_x = matrix.pos_x, matrix.dim_x / 2
+        if self.symmetry[1]:
+            y_min, size_y = matrix.pos_y, matrix.dim_y / 2
+        z_max = matrix.pos_z + matrix.dim_z
+        margin = TOLERANCE * max(matrix.dim_x, matrix.dim_y, matrix.dim_z)
+        if self.dim_z == 0:
+            kind = 'Surface'
+            matrix_shape = OccRectangle(geometry, x_min, y_min, matrix.pos_z,
+                                        size_x, size_y)
+        else:
+            kind = 'Volume'
+            matrix_shape = OccBox(geometry, x_min, y_min, matrix.pos_z,
+                                  size_x, size_y, matrix.dim_z)
+
+        inclusions = [inclusion for inclusion in self.inclusions
+                      if not (self.symmetry[0] and inclusion.pos_x < x_min
+                              or self.symmetry[1] and inclusion.pos_y < y_min)]
+        shapes = [self.occ_shape(inclusion) for inclusion in inclusions]
+        CharacteristicLength(geometry, [matrix_shape], matrix.el_size)
+        shapes_by_size = {}
+        for inclusion, shape in zip(inclusions, shapes):
+            shapes_by_size.setdefault(id(inclusion.el_size), []).append(shape)
+        for inclusion in inclusions:
+            if id(inclusion.el_size) in shapes_by_size:
+                CharacteristicLength(
+                    geometry, shapes_by_size.pop(id(inclusion.el_size)),
+                    inclusion.el_size)
+
+        holes = []
+        shapes_by_tag = {}
+        plots_clip = None
+        for inclusion, shape in zip(inclusions, shapes):
+            if inclusion.type.type != 'plot':
+                if (inclusion.pos_x - inclusion.dim_x / 2 <= x_min
+                        or inclusion.pos_x + inclusion.dim_x / 2 >= x_max
+                        or inclusion.pos_y - inclusion.dim_y / 2 <= y_min
+                        or inclusion.pos_y + inclusion.dim_y / 2 >= y_max):
+                    shape = BooleanIntersection(geometry, shape, matrix_shape)
+            elif (self.symmetry[0]
+                  and inclusion.pos_x - inclusion.dim_x / 2 < x_min
+                  or self.symmetry[1]
+                  and inclusion.pos_y - inclusion.dim_y / 2 < y_min):
+                if self.dim_z == 0:
+                    shape = BooleanIntersection(geometry, shape, matrix_shape)
+                else:
+                    if plots_clip is None:
+                        depth = max([other.type.dim_z for other in inclusions
+                                     if other.type.type == 'plot'])
+                        plots_clip = OccBox(geometry, x_min, y_min, -depth,
+                                            size_x, size_y, depth)
+                    shape = BooleanIntersection(geometry, shape, plots_clip)
+            if inclusion.type.type == 'hole':
+                holes.append(shape)
+            else:
+                shapes_by_tag.setdefault(inclusion.type.tag, []).append(shape)
+        solids = sum(shapes_by_tag.values(), [])
+        if plots_clip is not None:
+            OccDelete(geometry, plots_clip)
+
+        # The lines ending on a symmetry plane split its boundary, which
+        # Gmsh cannot do when it embeds them: they are fragmented instead
+        plane_lines = [straight_line
+                       for straight_line, line_z in self.embedded_lines()
+                       if line_z == 0 and self.dim_z == 0
+                       and abs(straight_line.id) in self.plane_lines]
+        if holes:
+            matrix_shape = BooleanDifference(geometry, 'matrix',
+                                             matrix_shape, holes)
+        if solids or plane_lines:
+            BooleanFragments(geometry, matrix_shape, solids, plane_lines)
+        matrix_shape = RemainingEntities(geometry, 'matrix', kind, solids)
+
+        if self.dim_z == 0:
+            PhysicalSurface(geometry, [matrix_shape], matrix.tag)
+            # Gmsh only embeds lines in one surface
+            for straight_line, line_z in self.embedded_lines():
+                if line_z == 0 and straight_line not in plane_lines:
+                    LineInSurface(geometry, straight_line,
+                                  matrix_shape.item(0))
+            for tag, inclusion_shapes in shapes_by_tag.iteritems():
+                PhysicalSurface(geometry, inclusion_shapes, tag)
+        else:
+            for tag, inclusion_shapes in shapes_by_tag.iteritems():
+                PhysicalVolume(geometry, inclusion_shapes, tag)
+            PhysicalVolume(geometry, [matrix_shape], matrix.tag)
+
+        # Boundaries of the matrix: (name, kind, box, translation), the
+        # first entity of each pair being a copy of the second one
+        boundaries = []
+        if self.dim_z == 0:
+            if self.periodicity[0]:
+                boundaries.append(
+                    (('plus_x', 'Curve', (x_max, y_min, 0, x_max, y_max, 0)),
+                     ('minus_x', 'Curve', (x_min, y_min, 0, x_min, y_max, 0)),
+                     (matrix.dim_x, 0, 0)))
+            if self.periodicity[1]:
+                boundaries.append(
+                    (('plus_y', 'Curve', (x_min, y_max, 0, x_max, y_max, 0)),
+                     ('minus_y', 'Curve', (x_min, y_min, 0, x_max, y_min, 0)),
+                     (0, matrix.dim_y, 0)))
+        else:
+            if self.periodicity[0]:
+                boundaries.append(
+                    (('surface_right', 'Surface',
+                      (x_max, y_min, 0, x_max, y_max, z_max)),
+                     ('surface_left', 'Surface',
+                      (x_min, y_min, 0, x_min, y_max, z_max)),
+                     (matrix.dim_x, 0, 0)))
+            if self.periodicity[1]:
+                boundaries.append(
+                    (('surface_top', 'Surface',
+                      (x_min, y_max, 0, x_max, y_max, z_max)),
+                     ('surface_bottom', 'Surface',
+                      (x_min, y_min, 0, x_max, y_min, z_max)),
+                     (0, matrix.dim_y, 0)))
+        for boundary1, boundary2, translation in boundaries:
+            entities = [EntitiesInBox(geometry, name, kind, box, margin)
+                        for name, kind, box in (boundary1, boundary2)]
+            PeriodicTranslation(geometry, entities[0], entities[1],
+                                *(translation + (margin,)))
+            for entity in entities:
+                if entity.occ_kind == 'Curve':
+                    PhysicalLine(geometry, [entity], entity.name)
+                else:
+                    PhysicalSurface(geometry, [entity], entity.name)
+
+        # The symmetry planes, with the faces of the inclusions cut by them
+        z_min = min([0] + [-inclusion.type.dim_z for inclusion in inclusions
+                           if inclusion.type.type == 'plot'
+                           and self.dim_z != 0])
+        boundary_kind = 'Curve' if self.dim_z == 0 else 'Surface'
+        for axis, name in enumerate(['symmetry_x', 'symmetry_y']):
+            if self.symmetry[axis]:
+                box = [x_min, y_min, z_min, x_max, y_max, z_max]
+                box[3 + axis] = box[axis]
+                plane = EntitiesInBox(geometry, name, boundary_kind, box,
+                                      margin)
+                if self.dim_z == 0:
+                    PhysicalLine(geometry, [plane], name)
+                else:
+                    PhysicalSurface(geometry, [plane], name)
+
+        if self.dim_z != 0:
+            edges = []
+            if self.periodicity[0]:
+                edges.extend([('minus_x', x_min, y_min, x_min, y_max),
+                              ('plus_x', x_max, y_min, x_max, y_max)])
+            if self.periodicity[1]:
+                edges.extend([('minus_y', x_min, y_min, x_max, y_min),
+                              ('plus_y', x_min, y_max, x_max, y_max)])
+            for name, x1, y1, x2, y2 in edges:
+                for side, z in (('bottom', 0), ('top', z_max)):
+                    edge = EntitiesInBox(geometry, '%s_%s' % (name, side),
+                                         'Curve', (x1, y1, z, x2, y2, z),
+                                         margin)
+                    PhysicalLine(geometry, [edge], edge.name)
+
+    def block_structure(self):
+        """
+        Split the matrix of a crystal of rectangles into blocks along the
+        edges of the inclusions.
+
+        @return: (xs, ys, owners, sizes, nodes_x, nodes_y), owners being the
+            indices of the inclusions owning the blocks (-1 for the matrix),
+            sizes their element sizes (nan for the holes), and nodes_x and
+            nodes_y the numbers of nodes of the intervals along x and y
+        """
+        matrix = self.matrix
+        inclusions = self.inclusions
+        rectangles = [(inclusion.pos_x - inclusion.dim_x / 2,
+                       inclusion.pos_x + inclusion.dim_x / 2,
+                       inclusion.pos_y - inclusion.dim_y / 2,
+                       inclusion.pos_y + inclusion.dim_y / 2)
+                      for inclusion in inclusions]
+        xs, ys, owners = block_grid(matrix.pos_x - matrix.dim_x / 2,
+                                    matrix.pos_x + matrix.dim_x / 2,
+                                    matrix.pos_y - matrix.dim_y / 2,
+                                    matrix.pos_y + matrix.dim_y / 2,
+                                    rectangles)
+        # The matrix is the last owner, of index -1
+        holes = numpy.array([inclusion.type.type == 'hole'
+                             for inclusion in inclusions] + [False])[owners]
+        sizes = numpy.array([inclusion.el_size.value
+                             for inclusion in inclusions]
+                            + [matrix.el_size.value], dtype=float)[owners]
+        sizes[holes] = numpy.nan
+        nodes_x = nb_nodes(numpy.diff(xs), sizes).tolist()
+        nodes_y = nb_nodes(numpy.diff(ys), sizes.T).tolist()
+        return xs, ys, owners, sizes, nodes_x, nodes_y
+
+    def mesh_structured(self):
+        """
+        Mesh a crystal of rectangles by a block-structured grid of
+        quadrangles, or of hexahedra in 3D.
+
+        The matrix is split along the edges of the inclusions into
+        rectangular cells, whose lines have as many nodes as needed by the
+        smallest element size of their row or column of cells.  In 3D, the
+        cells are extruded like in the extruded output mode, with
+        recombined layers.  The physical lines are not embedded, since
+        they would break the structured grid.
+        """
+        geometry = self.geometry
+        matrix = self.matrix
+        inclusions = self.inclusions
+        xs, ys, owners, sizes, nodes_x, nodes_y = self.block_structure()
+        nb_x, nb_y = owners.shape
+        holes = numpy.isnan(sizes)
+        cells = ~holes
+
+        # The points and lines of the cells
+        used = numpy.zeros((nb_x + 1, nb_y + 1), dtype=bool)
+        used[:-1, :-1] |= cells
+        used[1:, :-1] |= cells
+        used[:-1, 1:] |= cells
+        used[1:, 1:] |= cells
+        used_x = numpy.zeros((nb_x, nb_y + 2), dtype=bool)
+        used_x[:, 1:-1] = cells
+        used_x = used_x[:, :-1] | used_x[:, 1:]
+        used_y = numpy.zeros((nb_x + 2, nb_y), dtype=bool)
+        used_y[1:-1] = cells
+        used_y = used_y[:-1] | used_y[1:]
+
+        xs = xs.tolist()
+        ys = ys.tolist()
+        points = {}
+        for i, j in zip(*[indices.tolist()
+                          for indices in numpy.nonzero(used)]):
+            points[i, j] = Point(geometry, xs[i], ys[j], 0, matrix.el_size)
+        lines_x = {}
+        lines_y = {}
+        lines_by_nodes = {}
+        for i, j in zip(*[indices.tolist()
+                          for indices in numpy.nonzero(used_x)]):
+            lines_x[i, j] = StraightLine(geometry, points[i, j],
+                                         points[i + 1, j])
+            lines_by_nodes.setdefault(nodes_x[i], []).append(lines_x[i, j])
+        for i, j in zip(*[indices.tolist()
+                          for indices in numpy.nonzero(used_y)]):
+            lines_y[i, j] = StraightLine(geometry, points[i, j],
+                                         points[i, j + 1])
+            lines_by_nodes.setdefault(nodes_y[j], []).append(lines_y[i, j])
+        for nodes in sorted(lines_by_nodes):
+            TransfiniteLine(geometry, lines_by_nodes[nodes], nodes)
+
+        surfaces = []
+        owned_surfaces = []
+        for i, j in zip(*[indices.tolist()
+                          for indices in numpy.nonzero(cells)]):
+            loop = LineLoop(geometry, [lines_x[i, j], lines_y[i + 1, j]],
+                            [lines_x[i, j + 1], lines_y[i, j]])
+            surface = PlaneSurface(geometry, loop)
+            surfaces.append(surface)
+            owned_surfaces.append((i, j, int(owners[i, j]), surface))
+        TransfiniteSurface(geometry, surfaces)
+        RecombineSurface(geometry, surfaces)
+
+        # The sides of the cells on the boundaries of the matrix
+        sides = {}
+        if self.periodicity[0]:
+            sides['x'] = [(lines_y[0, j], lines_y[nb_x, j])
+                          for j in range(nb_y)
+                          if (0, j) in lines_y and (nb_x, j) in lines_y]
+        if self.periodicity[1]:
+            sides['y'] = [(lines_x[i, 0], lines_x[i, nb_y])
+                          for i in range(nb_x)
+                          if (i, 0) in lines_x and (i, nb_y) in lines_x]
+        suffix = ''
+        if self.dim_z != 0:
+            suffix = '_bottom'
+        for axis, pairs in sorted(sides.iteritems()):
+            for line_minus, line_plus in pairs:
+                PeriodicLine(geometry, line_minus, line_plus, reverse=False)
+            PhysicalLine(geometry, [pair[0] for pair in pairs],
+                         'minus_%s%s' % (axis, suffix))
+            PhysicalLine(geometry, [pair[1] for pair in pairs],
+                         'plus_%s%s' % (axis, suffix))
+
+        if self.dim_z == 0:
+            surfaces_by_tag = {}
+            for i, j, owner, surface in owned_surfaces:
+                if owner >= 0:
+                    surfaces_by_tag.setdefault(inclusions[owner].type.tag,
+                                               []).append(surface)
+            PhysicalSurface(geometry, [surface for i, j, owner, surface
+                                       in owned_surfaces if owner < 0],
+                            matrix.tag)
+            for tag, tag_surfaces in surfaces_by_tag.iteritems():
+                PhysicalSurface(geometry, tag_surfaces, tag)
+            return
+
+        # No entity may be defined after the extrusions, numbered by Gmsh
+        layers = int(max(numpy.ceil(self.dim_z / numpy.nanmin(sizes)), 1))
+        matrix_volumes = []
+        volumes_by_tag = {}
+        # The lateral surfaces follow the sides of the loops: bottom, right,
+        # top then left
+        laterals = {'surface_right': [], 'surface_left': [],
+                    'surface_top': [], 'surface_bottom': []}
+        for i, j, owner, surface in owned_surfaces:
+            extrusion = Extrusion(geometry, surface, self.dim_z, layers,
+                                  recombine=True)
+            if i == nb_x - 1:
+                laterals['surface_right'].append(extrusion.lateral(1))
+            if i == 0:
+                laterals['surface_left'].append(extrusion.lateral(3))
+            if j == nb_y - 1:
+                laterals['surface_top'].append(extrusion.lateral(2))
+            if j == 0:
+                laterals['surface_bottom'].append(extrusion.lateral(0))
+            if owner < 0:
+                matrix_volumes.append(extrusion.volume)
+                continue
+            inclusion = inclusions[owner]
+            if inclusion.type.type == 'plot':
+                # The matrix above the plot
+                matrix_volumes.append(extrusion.volume)
+                depth = inclusion.type.dim_z
+                extrusion = Extrusion(
+                    geometry, surface, -depth,
+                    int(max(numpy.ceil(depth / sizes[i, j]), 1)),
+                    recombine=True)
+            volumes_by_tag.setdefault(inclusion.type.tag, []).append(
+                extrusion.volume)
+
+        names = []
+        if self.periodicity[0]:
+            names.extend(['surface_right', 'surface_left'])
+        if self.periodicity[1]:
+            names.extend(['surface_top', 'surface_bottom'])
+        for name in names:
+            PhysicalSurface(geometry, laterals[name], name)
+        for tag, inclusion_volumes in volumes_by_tag.iteritems():
+            PhysicalVolume(geometry, inclusion_volumes, tag)
+        PhysicalVolume(geometry, matrix_volumes, matrix.tag)
+
+    def write_msh(self, fileobj, binary=False, simplices=False):
+        """
+        Write the mesh of a crystal of rectangles to fileobj, in the Gmsh
+        MSH 2.2 format, without running Gmsh.
+
+        The blocks are the ones of the structured output mode, and the
+        plots go down to their depth in 3D.  The periodic sides are
+        written as physical lines (surfaces in 3D) whose nodes are paired.
+
+        @param fileobj: any file-like object with a write method, opened in
+            binary mode for the binary format
+        @param simplices: split the quadrangles into triangles, and the
+            hexahedra into tetrahedra
+        """
+        assert all([inclusion.type.shape == 'rectangle'
+                    for inclusion in self.inclusions]), \
+            "The MSH output needs rectangular inclusions!"
+        matrix = self.matrix
+        inclusions = self.inclusions
+        xs, ys, owners, sizes, nodes_x, nodes_y = self.block_structure()
+        dim = 2 if self.dim_z == 0 else 3
+
+        # Physical ids of the tags, the matrix being the last owner
+        tag_ids = {matrix.tag: 1}
+        for type in self.inclusion_types:
+            if (type is not None and type.type != 'hole'
+                    and type.tag not in tag_ids):
+                tag_ids[type.tag] = len(tag_ids) + 1
+        names = [(dim, tag_id, tag) for tag, tag_id
+                 in sorted(tag_ids.iteritems(), key=lambda item: item[1])]
+        ids = numpy.array([0 if inclusion.type.type == 'hole'
+                           else tag_ids[inclusion.type.tag]
+                           for inclusion in inclusions] + [1])
+
+        if dim == 2:
+            mesh = BlockMesh([xs, ys], [nodes_x, nodes_y], ids[owners],
+                             simplices)
+            sides = [('minus_x', 'plus_x'), ('minus_y', 'plus_y')]
+        else:
+            # The matrix is above the plots, which go down to their depth
+            plots = numpy.array([inclusion.type.type == 'plot'
+                                 for inclusion in inclusions] + [False])
+            depths = numpy.array([inclusion.type.dim_z
+                                  for inclusion in inclusions] + [0])
+            matrix_ids = numpy.where(plots, 1, ids)[owners]
+            zs = numpy.unique([0, self.dim_z]
+                              + [-depth for depth in depths[plots].tolist()])
+            labels = numpy.zeros(owners.shape + (len(zs) - 1,), dtype=int)
+            for index, z in enumerate(zs[:-1].tolist()):
+                if z >= 0:
+                    labels[:, :, index] = matrix_ids
+                else:
+                    labels[:, :, index] = numpy.where(
+                        plots[owners] & (depths[owners] >= -z),
+                        ids[owners], 0)
+            layer_sizes = numpy.where(labels != 0, sizes[:, :, None],
+                                      numpy.nan)
+            nodes_z = nb_nodes(numpy.diff(zs), layer_sizes.reshape(
+                -1, len(zs) - 1).T).tolist()
+            mesh = BlockMesh([xs, ys, zs], [nodes_x, nodes_y, nodes_z],
+                             labels, simplices)
+            sides = [('surface_left', 'surface_right'),
+                     ('surface_bottom', 'surface_top')]
+
+        boundaries = []
+        periodic = []
+        for axis, (name_minus, name_plus) in enumerate(sides):
+            if self.periodicity[axis]:
+                minus_id = len(names) + 1
+                plus_id = len(names) + 2
+                names.extend([(dim - 1, minus_id, name_minus),
+                              (dim - 1, plus_id, name_plus)])
+                boundaries.extend([(axis, 0, minus_id), (axis, 1, plus_id)])
+                periodic.append((axis, plus_id, minus_id))
+        write_msh(fileobj, mesh, names, boundaries, periodic, binary)
+
+    def write_mesh(self, fileobj):
+        """
+        Write the Gmsh geometry to fileobj.
+
+        @param fileobj: any file-like object with a write method
+            (plain file, gzip file, sys.stdout...)
+        """
+        self.mesh_entities()
+        fileobj.write(self.header())
+        self.geometry.write(fileobj)
+
+    def write_sections(self, directory):
+        """
+        Write the Gmsh geometry of a crystal with the sections storage to
+        directory, as a main file named after the crystal, which includes
+        the files of the values, of the physical maps, of the sites by
+        blocks, of the matrix and of the physical entities.  Only the files
+        whose text changed since the last call are written.
+
+        @return: names of the files written
+        """
+        assert isinstance(self.geometry, SectionedGeometry), \
+            "Writing sections needs the sections storage!"
+        self.mesh_entities()
+        return self.geometry.write_files(directory, self.name, self.header())
+
+    def mesh_entities(self):
+        """Create the entities of the output mode, only once."""
+        if self.meshed:
+            return
+        if self.output_mode == 'scripted':
+            self.mesh_scripted()
+        elif self.output_mode == 'extruded':
+            self.mesh_extruded()
+        elif self.output_mode == 'occ':
+            self.mesh_occ()
+        elif self.output_mode == 'structured':
+            self.mesh_structured()
+        elif self.dim_z == 0:
             self.mesh_2d()
         else:
             self.mesh_3d()
+        self.meshed = True
 
+    def header(self):
         result = "//%s, created with crystalpy\n" % self.name
-        result += Value.print_all() + '\n'
-        result += Point.print_all() + '\n'
-        result += Line.print_all() + '\n'
-        result += PhysicalEntity.print_all()
+        if self.output_mode == 'occ':
+            result += 'SetFactory("OpenCASCADE");\n'
         return result
 
+    def mesh(self):
+        if self.geo is None:
+            result = StringIO()
+            self.write_mesh(result)
+            self.geo = result.getvalue()
+        return self.geo
+
 
 class InclusionType:
     def __init__(self,
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Computation of the inclusion sites of a crystal lattice."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# One site per lattice cell and basis offset: its position, the indices of
+# its cell and of its offset in the basis (-1 out of any lattice), its
+# inclusion type, and its own dimensions (NaN for those of its type)
+SITE_DTYPE = [('x', 'f8'), ('y', 'f8'),
+              ('i', 'i4'), ('j', 'i4'), ('basis', 'i4'),
+              ('type', 'i4'),
+              ('dim_x', 'f8'), ('dim_y', 'f8')]
+
+
+def make_sites(x, y, type_ids, dim_x=numpy.nan, dim_y=numpy.nan):
+    """Return the array of SITE_DTYPE of sites out of any lattice."""
+    sites = numpy.empty(len(x), dtype=SITE_DTYPE)
+    sites['x'] = x
+    sites['y'] = y
+    sites['i'] = -1
+    sites['j'] = -1
+    sites['basis'] = -1
+    sites['type'] = type_ids
+    sites['dim_x'] = dim_x
+    sites['dim_y'] = dim_y
+    return sites
+
+
+def site_dimensions(sites, inclusion_types):
+    """
+    @return: (dim_x, dim_y, ellipse) arrays of the sites, their dimensions
+        being NaN for the sites without inclusion
+    """
+    types = sites['type']
+    types_dim_x = numpy.array([numpy.nan if type is None else type.dim_x
+                               for type in inclusion_types])
+    types_dim_y = numpy.array([numpy.nan if type is None else type.dim_y
+                               for type in inclusion_types])
+    types_ellipse = numpy.array([type is not None
+                                 and type.shape == 'ellipse'
+                                 for type in inclusion_types])
+    dim_x = numpy.where(numpy.isnan(sites['dim_x']),
+                        types_dim_x[types], sites['dim_x'])
+    dim_y = numpy.where(numpy.isnan(sites['dim_y']),
+                        types_dim_y[types], sites['dim_y'])
+    return dim_x, dim_y, types_ellipse[types]
+
+
+class SparseMap:
+    """
+    Inclusion map given by a default type id and a list of defects.
+
+    Its memory and its setup time only depend on the number of defects,
+    whatever the size of the crystal.
+    """
+
+    def __init__(self, default, i=(), j=(), types=()):
+        self.default = default
+        self.i = numpy.zeros(0, dtype=int)
+        self.j = numpy.zeros(0, dtype=int)
+        self.types = numpy.zeros(0, dtype=int)
+        self.add(i, j, types)
+
+    def add(self, i, j, types):
+        """
+        Set the type ids of cells, the last one given for a cell winning.
+
+        @param i, j: indices (or arrays of indices) of the cells
+        @param types: one type id for all the cells, or one per cell
+        """
+        i, j = numpy.broadcast_arrays(numpy.asarray(i, dtype=int),
+                                      numpy.asarray(j, dtype=int))
+        types = numpy.broadcast_to(numpy.asarray(types, dtype=int), i.shape)
+        self.i = numpy.concatenate((self.i, i.ravel()))
+        self.j = numpy.concatenate((self.j, j.ravel()))
+        self.types = numpy.concatenate((self.types, types.ravel()))
+
+    def add_mask(self, mask, type_id):
+        """Set the type id of the cells where the [j][i] mask is true."""
+        j, i = numpy.nonzero(mask)
+        self.add(i, j, type_id)
+
+    def load(path, default):
+        """Read the (i, j, type_id) rows of a .npy or CSV file."""
+        if path.endswith('.npy'):
+            rows = numpy.load(path)
+        else:
+            rows = numpy.loadtxt(path, delimiter=',', dtype=int, ndmin=2)
+        rows = numpy.asarray(rows, dtype=int).reshape(-1, 3)
+        return SparseMap(default, rows[:, 0], rows[:, 1], rows[:, 2])
+
+    load = staticmethod(load)
+
+    def lookup(self, ii, jj, nb_x, nb_y):
+        """Return the type ids of the cells (ii, jj)."""
+        assert numpy.all((self.i >= 0) & (self.i < nb_x)), "Wrong map size!"
+        assert numpy.all((self.j >= 0) & (self.j < nb_y)), "Wrong map size!"
+        # Keep the last type given for each defect cell
+        keys = (self.j * nb_x + self.i)[::-1]
+        keys, indices = numpy.unique(keys, return_index=True)
+        types = self.types[::-1][indices]
+
+        result = numpy.full(len(ii), self.default, dtype=int)
+        if len(keys):
+            site_keys = jj * nb_x + ii
+            positions = numpy.searchsorted(keys, site_keys)
+            positions[positions == len(keys)] = 0
+            found = keys[positions] == site_keys
+            result[found] = types[positions[found]]
+        return result
+
+
+def map_types(inclusion_map, nb_x, nb_y, ii, jj, bb, nb_basis):
+    """Look up the type ids of the sites (ii, jj, bb) in the map."""
+    if inclusion_map is None:
+        return numpy.zeros(len(ii), dtype=int)
+    if isinstance(inclusion_map, SparseMap):
+        return inclusion_map.lookup(ii, jj, nb_x, nb_y)
+    types = numpy.asarray(inclusion_map)
+    assert types.shape[:2] == (nb_y, nb_x), "Wrong map size!"
+    if types.ndim == 2:
+        return types[jj, ii]
+    assert types.shape == (nb_y, nb_x, nb_basis), "Wrong map size!"
+    return types[jj, ii, bb]
+
+
+def lattice_cell(nb_x, nb_y, space_x, space_y, pos_x, pos_y,
+                 lattice_vectors=None, basis=None):
+    """
+    Return the lattice vectors, the basis offsets and the position of the
+    cell (0, 0) of a crystal centered on (pos_x, pos_y), before rotation.
+    """
+    if lattice_vectors is None:
+        (a1_x, a1_y), (a2_x, a2_y) = (space_x, 0), (0, space_y)
+    else:
+        (a1_x, a1_y), (a2_x, a2_y) = lattice_vectors
+    if basis is None:
+        basis = [(0, 0)]
+    basis = numpy.asarray(basis, dtype=float).reshape(-1, 2)
+    crystal_base_x = pos_x - ((nb_x - 1) * a1_x + (nb_y - 1) * a2_x) / 2
+    crystal_base_y = pos_y - ((nb_x - 1) * a1_y + (nb_y - 1) * a2_y) / 2
+    return ((a1_x, a1_y), (a2_x, a2_y), basis,
+            (crystal_base_x, crystal_base_y))
+
+
+def lattice_frame(nb_x,
+                  nb_y,
+                  space_x,
+                  space_y,
+                  pos_x,
+                  pos_y,
+                  crystal_shape,
+                  lattice_vectors=None,
+                  basis=None,
+                  rotation=0):
+    """
+    Return the affine rule giving the position of any site of a crystal.
+
+    The site (i, j, b) is at origins[b] + i * a1 + j * a2 + (j % 2) * shift,
+    up to the rounding errors.  The arguments are those of lattice_sites.
+
+    @return: (origins, a1, a2, shift), origins being a list of (x, y)
+    """
+    a1, a2, basis, (crystal_base_x, crystal_base_y) = \
+        lattice_cell(nb_x, nb_y, space_x, space_y, pos_x, pos_y,
+                     lattice_vectors, basis)
+    shift = (0, 0)
+    if lattice_vectors is None and crystal_shape == 'hexa':
+        shift = (space_x / 2, 0)
+    origins = [(crystal_base_x + offset_x - pos_x,
+                crystal_base_y + offset_y - pos_y)
+               for offset_x, offset_y in basis.tolist()]
+
+    cos, sin = 1, 0
+    if rotation:
+        angle = numpy.radians(rotation)
+        cos, sin = numpy.cos(angle), numpy.sin(angle)
+
+    def rotate(x, y):
+        return (x * cos - y * sin, x * sin + y * cos)
+
+    origins = [(pos_x + x, pos_y + y)
+               for x, y in [rotate(*origin) for origin in origins]]
+    return origins, rotate(*a1), rotate(*a2), rotate(*shift)
+
+
+def rectangle_blocks(mask):
+    """
+    Cover the true cells of a [j][i] mask with disjoint rectangles.
+
+    Each row is split into runs of true cells, and a run is merged with the
+    identical runs of the next rows.
+
+    @return: list of (i_begin, i_end, j_begin, j_end), the ends excluded,
+        ordered by j_begin and i_begin
+    """
+    mask = numpy.asarray(mask, dtype=bool)
+    blocks = []
+    open_runs = {}
+    for j in range(len(mask) + 1):
+        runs = set()
+        if j < len(mask):
+            edges = numpy.diff(numpy.concatenate(([0], mask[j], [0]))
+                               .astype(int))
+            runs = set(zip(numpy.flatnonzero(edges == 1).tolist(),
+                           numpy.flatnonzero(edges == -1).tolist()))
+        for run, j_begin in open_runs.items():
+            if run not in runs:
+                blocks.append((run[0], run[1], j_begin, j))
+                del open_runs[run]
+        for run in runs:
+            if run not in open_runs:
+                open_runs[run] = j
+    return sorted(blocks, key=lambda block: (block[2], block[0]))
+
+
+def lattice_sites(nb_x,
+                  nb_y,
+                  space_x,
+                  space_y,
+                  pos_x,
+                  pos_y,
+                  crystal_shape,
+                  inclusion_map,
+                  lattice_vectors=None,
+                  basis=None,
+                  rotation=0):
+    """
+    Compute all the sites of a crystal at once.
+
+    @param crystal_shape: 'square' or 'hexa' (odd rows shifted by
+        space_x / 2), only used without lattice_vectors
+    @param inclusion_map: None (type 0 everywhere), a SparseMap, or the
+        type ids by [j][i] cell, or by [j][i][b] cell and basis offset
+    @param lattice_vectors: ((a1_x, a1_y), (a2_x, a2_y)), replacing
+        space_x and space_y
+    @param basis: offsets (x, y) of the sites in each cell, (0, 0) if None
+    @param rotation: angle of the crystal around (pos_x, pos_y), in degrees
+    @return: array of SITE_DTYPE, ordered by i, j and basis offset
+    """
+    (a1_x, a1_y), (a2_x, a2_y), basis, (crystal_base_x, crystal_base_y) = \
+        lattice_cell(nb_x, nb_y, space_x, space_y, pos_x, pos_y,
+                     lattice_vectors, basis)
+
+    ii, jj, bb = numpy.meshgrid(numpy.arange(nb_x),
+                                numpy.arange(nb_y),
+                                numpy.arange(len(basis)),
+                                indexing='ij')
+    ii, jj, bb = ii.ravel(), jj.ravel(), bb.ravel()
+
+    sites = numpy.empty(len(ii), dtype=SITE_DTYPE)
+    sites['x'] = crystal_base_x + ii * a1_x + jj * a2_x
+    sites['y'] = crystal_base_y + ii * a1_y + jj * a2_y
+    if lattice_vectors is None and crystal_shape == 'hexa':
+        sites['x'] += (jj % 2) * (space_x / 2)
+    sites['x'] += basis[bb, 0]
+    sites['y'] += basis[bb, 1]
+    if rotation:
+        angle = numpy.radians(rotation)
+        x = sites['x'] - pos_x
+        y = sites['y'] - pos_y
+        sites['x'] = pos_x + x * numpy.cos(angle) - y * numpy.sin(angle)
+        sites['y'] = pos_y + x * numpy.sin(angle) + y * numpy.cos(angle)
+    sites['i'] = ii
+    sites['j'] = jj
+    sites['basis'] = bb
+    sites['type'] = map_types(inclusion_map, nb_x, nb_y,
+                              ii, jj, bb, len(basis))
+    sites['dim_x'] = numpy.nan
+    sites['dim_y'] = numpy.nan
+    return sites
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Sharing of the coincident points, straight lines and plane surfaces of a
+geometry.
+"""
+
+from __future__ import division
+import math
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+class SharedEntities:
+    """
+    Ids of the points, straight lines, line loops and plane surfaces
+    already in a geometry.
+
+    The points are hashed on a grid whose cells are twice as large as the
+    tolerance, so that the points closer than the tolerance to a point lie
+    in the 8 cells around its nearest cell corner.
+    """
+
+    def __init__(self, tolerance):
+        """
+        @param tolerance: points closer than it along each axis are merged
+        """
+        assert tolerance > 0, "Wrong tolerance!"
+        self.tolerance = tolerance
+        self.cell_size = 2 * tolerance
+        self.cells = {}
+        self.lines = {}
+        self.loops = {}
+        self.surfaces = {}
+        # Ids of the lines which were found again
+        self.reused_lines = set()
+
+    def cell(self, x, y, z):
+        return (int(math.floor(x / self.cell_size)),
+                int(math.floor(y / self.cell_size)),
+                int(math.floor(z / self.cell_size)))
+
+    def neighbours(self, x, y, z):
+        """Cells which may hold points closer than the tolerance."""
+        result = [[]]
+        for value, index in zip((x, y, z), self.cell(x, y, z)):
+            if value / self.cell_size - index < 0.5:
+                indices = (index, index - 1)
+            else:
+                indices = (index, index + 1)
+            result = [cell + [other] for cell in result for other in indices]
+        return [tuple(cell) for cell in result]
+
+    def find_point(self, x, y, z):
+        """Id of a point closer than the tolerance, or None."""
+        for cell in self.neighbours(x, y, z):
+            for other_x, other_y, other_z, point_id in self.cells.get(cell,
+                                                                      ()):
+                if (abs(other_x - x) <= self.tolerance
+                        and abs(other_y - y) <= self.tolerance
+                        and abs(other_z - z) <= self.tolerance):
+                    return point_id
+        return None
+
+    def add_point(self, x, y, z, point_id):
+        self.cells.setdefault(self.cell(x, y, z), []).append((x, y, z,
+                                                              point_id))
+
+    def find_line(self, pt1_id, pt2_id):
+        """
+        Id of the straight line between the points, negative if it goes
+        from pt2 to pt1, or None.
+        """
+        if (pt1_id, pt2_id) in self.lines:
+            line_id = self.lines[(pt1_id, pt2_id)]
+        elif (pt2_id, pt1_id) in self.lines:
+            line_id = -self.lines[(pt2_id, pt1_id)]
+        else:
+            return None
+        self.reused_lines.add(abs(line_id))
+        return line_id
+
+    def add_line(self, pt1_id, pt2_id, line_id):
+        self.lines[(pt1_id, pt2_id)] = line_id
+
+    def find_loop(self, line_ids):
+        """Id of a line loop going through the same lines, or None."""
+        return self.loops.get(frozenset([abs(line_id)
+                                         for line_id in line_ids]))
+
+    def add_loop(self, line_ids, loop_id):
+        self.loops[frozenset([abs(line_id) for line_id in line_ids])] = \
+            loop_id
+
+    def find_surface(self, loop_id):
+        """Id of the plane surface bounded by the line loop, or None."""
+        return self.surfaces.get(loop_id)
+
+    def add_surface(self, loop_id, surface_id):
+        self.surfaces[loop_id] = surface_id
+
+
+def unpaired(entity_ids):
+    """
+    Remove the entities which appear twice in the boundary of a loop, in
+    either direction: they are shared by two touching shapes, so they lie
+    inside their union.
+    """
+    counts = {}
+    for entity_id in entity_ids:
+        counts[abs(entity_id)] = counts.get(abs(entity_id), 0) + 1
+    return [entity_id for entity_id in entity_ids
+            if counts[abs(entity_id)] == 1]
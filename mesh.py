@@ -64,9 +64,8 @@ simple_3d = \
      'physical_point_map': physical_point_map,
      'physical_line_map': physical_line_map}
 my_crystal = Crystal(**simple_3d)
-my_mesh = my_crystal.mesh()
 file = open('%s.geo' % name, 'w')
-file.write(my_mesh)
+my_crystal.write_mesh(file)
 file.close()
 print 'Geo saved'
 my_svg = my_crystal.image()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""Block-structured meshes written straight to the Gmsh MSH 2.2 format."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Gmsh element types
+LINE = 1
+TRIANGLE = 2
+QUADRANGLE = 3
+TETRAHEDRON = 4
+HEXAHEDRON = 5
+
+# Corners of the elements, as offsets along each axis, in the Gmsh order
+CORNERS = {1: [(0,), (1,)],
+           2: [(0, 0), (1, 0), (1, 1), (0, 1)],
+           3: [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+               (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]}
+CELL_TYPES = {1: LINE, 2: QUADRANGLE, 3: HEXAHEDRON}
+
+# Splits of the quadrangles and hexahedra into simplices, as indices of
+# their corners.  They all share the diagonal from the lowest corner to the
+# highest one, so that the splits of neighbouring cells match.
+SPLITS = {2: (TRIANGLE, [(0, 1, 2), (0, 2, 3)]),
+          3: (TETRAHEDRON, [(0, 1, 2, 6), (0, 5, 1, 6), (0, 2, 3, 6),
+                            (0, 3, 7, 6), (0, 4, 5, 6), (0, 7, 4, 6)])}
+
+NODE_DTYPE = numpy.dtype([('number', '<i4'), ('x', '<f8'), ('y', '<f8'),
+                          ('z', '<f8')])
+
+# Number of nodes written at once
+CHUNK_SIZE = 65536
+
+
+def axis_coordinates(bounds, nodes):
+    """
+    Coordinates of the nodes along an axis, the nodes[k] nodes of the
+    interval [bounds[k], bounds[k + 1]] being evenly spaced.
+    """
+    parts = [numpy.linspace(begin, end, count)[:-1]
+             for begin, end, count in zip(bounds[:-1], bounds[1:], nodes)]
+    return numpy.concatenate(parts + [[bounds[-1]]])
+
+
+class BlockMesh:
+    """
+    Mesh of a grid of blocks, each one being split into a regular grid of
+    quadrangles, or hexahedra in 3D.
+
+    The nodes are numbered along x first, then y, then z, the ones which
+    belong to no element being left out.
+    """
+
+    def __init__(self, bounds, nodes, labels, simplices=False):
+        """
+        @param bounds: bounds of the blocks, along each axis
+        @param nodes: number of nodes of the intervals, along each axis
+        @param labels: physical id of each block, 0 for the empty ones
+        @param simplices: split the elements into triangles, or
+            tetrahedra in 3D
+        """
+        self.dim = len(bounds)
+        self.simplices = simplices
+        self.coordinates = [axis_coordinates(axis_bounds, axis_nodes)
+                            for axis_bounds, axis_nodes in zip(bounds, nodes)]
+        self.shape = tuple([len(axis) for axis in self.coordinates])
+        self.strides = numpy.cumprod((1,) + self.shape[:-1])
+        blocks = [numpy.repeat(numpy.arange(len(axis_nodes)),
+                               numpy.array(axis_nodes) - 1)
+                  for axis_nodes in nodes]
+        self.labels = numpy.asarray(labels)[numpy.ix_(*blocks)]
+
+        kept = self.labels != 0
+        used = numpy.zeros(self.shape, dtype=bool)
+        for corner in CORNERS[self.dim]:
+            used[tuple([slice(offset, offset + size) for offset, size
+                        in zip(corner, kept.shape)])] |= kept
+        used = used.ravel(order='F')
+        self.numbers = numpy.where(used, numpy.cumsum(used), 0)
+        self.nb_nodes = int(used.sum())
+
+    def grid_base(self, shape, axes, fixed=None):
+        """
+        Old indices of the lowest corners of a grid of elements, given by
+        its shape along the axes, in the node order.
+
+        @param fixed: (axis, index) of the nodes of a boundary
+        """
+        base = numpy.zeros(shape, dtype=numpy.int64)
+        for position, (axis, size) in enumerate(zip(axes, shape)):
+            index = [numpy.newaxis] * len(shape)
+            index[position] = slice(None)
+            base += (numpy.arange(size) * self.strides[axis])[tuple(index)]
+        if fixed is not None:
+            base += fixed[1] * self.strides[fixed[0]]
+        return base.ravel(order='F')
+
+    def connectivity(self, base, labels, axes):
+        """
+        Nodes and labels of the kept elements along the axes, of lowest
+        corners base.
+        """
+        dim = len(axes)
+        kept = labels != 0
+        offsets = [sum([offset * self.strides[axis]
+                        for offset, axis in zip(corner, axes)])
+                   for corner in CORNERS[dim]]
+        nodes = self.numbers[base[kept][:, None] + numpy.array(offsets)]
+        labels = labels[kept]
+        if self.simplices and dim > 1:
+            element_type, split = SPLITS[dim]
+            nodes = nodes[:, split].reshape(-1, len(split[0]))
+            labels = numpy.repeat(labels, len(split))
+        else:
+            element_type = CELL_TYPES[dim]
+        return element_type, labels, nodes
+
+    def nb_elements(self):
+        count = int((self.labels != 0).sum())
+        if self.simplices:
+            count *= len(SPLITS[self.dim][1])
+        return count
+
+    def elements(self):
+        """
+        Elements, by slices along the last axis.
+
+        @return: iterator of (element type, labels, nodes)
+        """
+        axes = range(self.dim)
+        shape = self.labels.shape
+        for index in range(shape[-1]):
+            base = self.grid_base(shape[:-1], axes[:-1],
+                                  (self.dim - 1, index))
+            labels = self.labels[..., index].ravel(order='F')
+            yield self.connectivity(base, labels, axes)
+
+    def boundary(self, axis, side, label):
+        """
+        Lines, or faces in 3D, of the elements on a side of the grid.
+
+        @param side: 0 for the lowest side along the axis, 1 for the highest
+        @param label: physical id of those boundary elements
+        @return: (element type, labels, nodes)
+        """
+        axes = [other for other in range(self.dim) if other != axis]
+        layer = side * (self.labels.shape[axis] - 1)
+        labels = self.labels.take(layer, axis=axis)
+        base = self.grid_base(labels.shape, axes,
+                              (axis, side * (self.shape[axis] - 1)))
+        labels = numpy.where(labels.ravel(order='F') != 0, label, 0)
+        return self.connectivity(base, labels, axes)
+
+    def periodic_nodes(self, axis):
+        """
+        Numbers of the nodes of the highest side along the axis, and of
+        their copies on the lowest side.
+        """
+        numbers = self.numbers.reshape(self.shape, order='F')
+        slaves = numbers.take(self.shape[axis] - 1, axis=axis).ravel()
+        masters = numbers.take(0, axis=axis).ravel()
+        paired = (slaves > 0) & (masters > 0)
+        return slaves[paired], masters[paired]
+
+    def nodes(self):
+        """Numbers and coordinates of the nodes, by chunks."""
+        used = numpy.flatnonzero(self.numbers)
+        for start in range(0, len(used), CHUNK_SIZE):
+            chunk = used[start:start + CHUNK_SIZE]
+            indices = numpy.unravel_index(chunk, self.shape, order='F')
+            result = numpy.zeros(len(chunk), dtype=NODE_DTYPE)
+            result['number'] = self.numbers[chunk]
+            for name, axis, index in zip('xyz', self.coordinates, indices):
+                result[name] = axis[index]
+            yield result
+
+
+def write_elements(fileobj, groups, binary, number=1):
+    """
+    Write the elements, numbered from number on, with two tags.
+
+    @return: the number of the next element
+    """
+    for element_type, labels, nodes in groups:
+        count = len(labels)
+        if count == 0:
+            continue
+        table = numpy.empty((count, 3 + nodes.shape[1]), dtype='<i4')
+        table[:, 0] = numpy.arange(number, number + count)
+        table[:, 1] = labels
+        table[:, 2] = labels
+        table[:, 3:] = nodes
+        number += count
+        if binary:
+            fileobj.write(numpy.array([element_type, count, 2],
+                                      dtype='<i4').tostring())
+            fileobj.write(table.tostring())
+        else:
+            template = "%%d %d 2 %s\n" % (element_type,
+                                          ' '.join(['%d'] * (table.shape[1]
+                                                             - 1)))
+            fileobj.write((template * count) % tuple(table.ravel().tolist()))
+    return number
+
+
+def write_msh(fileobj, mesh, names, boundaries, periodic, binary=False):
+    """
+    Write a BlockMesh in the MSH 2.2 format, its labels being both the
+    physical and the elementary ids of the elements.
+
+    @param names: (dimension, id, name) of the physical groups
+    @param boundaries: (axis, side, id) of the sides to write
+    @param periodic: (axis, slave id, master id) of the periodic sides
+    """
+    fileobj.write("$MeshFormat\n2.2 %d 8\n" % int(binary))
+    if binary:
+        fileobj.write(numpy.array([1], dtype='<i4').tostring() + "\n")
+    fileobj.write("$EndMeshFormat\n")
+
+    fileobj.write("$PhysicalNames\n%d\n" % len(names))
+    for dimension, physical_id, name in names:
+        fileobj.write('%d %d "%s"\n' % (dimension, physical_id, name))
+    fileobj.write("$EndPhysicalNames\n")
+
+    fileobj.write("$Nodes\n%d\n" % mesh.nb_nodes)
+    for chunk in mesh.nodes():
+        if binary:
+            fileobj.write(chunk.tostring())
+        else:
+            fileobj.write(("%d %.16g %.16g %.16g\n" * len(chunk))
+                          % tuple([value for node in chunk.tolist()
+                                   for value in node]))
+    if binary:
+        fileobj.write("\n")
+    fileobj.write("$EndNodes\n")
+
+    sides = [mesh.boundary(axis, side, label)
+             for axis, side, label in boundaries]
+    nb_elements = mesh.nb_elements() + sum([len(labels)
+                                            for _, labels, _ in sides])
+    fileobj.write("$Elements\n%d\n" % nb_elements)
+    number = write_elements(fileobj, sides, binary)
+    write_elements(fileobj, mesh.elements(), binary, number)
+    if binary:
+        fileobj.write("\n")
+    fileobj.write("$EndElements\n")
+
+    if periodic:
+        fileobj.write("$Periodic\n%d\n" % len(periodic))
+        for axis, slave_id, master_id in periodic:
+            slaves, masters = mesh.periodic_nodes(axis)
+            fileobj.write("%d %d %d\n%d\n" % (mesh.dim - 1, slave_id,
+                                               master_id, len(slaves)))
+            fileobj.write(("%d %d\n" * len(slaves))
+                          % tuple(numpy.column_stack((slaves, masters))
+                                  .ravel().tolist()))
+        fileobj.write("$EndPeriodic\n")
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""Gmsh entities of the OpenCASCADE kernel: primitive shapes and booleans."""
+
+from __future__ import division
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Margin of the bounding boxes which select entities, relative to the size
+# of the matrix
+TOLERANCE = 1e-6
+
+# The dimension of the entities ('Curve', 'Surface' or 'Volume') is named
+# occ_kind, and not kind, so that columnar.ArrayGeometry keeps them as
+# objects instead of mistaking them for its own kinds
+
+
+def join_ids(entities):
+    return ', '.join([format(entity.id) for entity in entities])
+
+
+def element_size(el_size):
+    """Name of a Value, or the size itself."""
+    if hasattr(el_size, 'name'):
+        return el_size.name
+    return el_size
+
+
+class OccRectangle:
+    occ_kind = 'Surface'
+
+    def __init__(self, geometry, x, y, z, dx, dy):
+        """Rectangle whose lower left corner is (x, y, z)."""
+        self.x = x
+        self.y = y
+        self.z = z
+        self.dx = dx
+        self.dy = dy
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Rectangle(%d) = {%s, %s, %s, %s, %s};\n"
+                % (self.id, self.x, self.y, self.z, self.dx, self.dy))
+
+
+class OccDisk:
+    occ_kind = 'Surface'
+
+    def __init__(self, geometry, x, y, z, rx, ry):
+        """
+        Disk centered on (x, y, z).  OpenCASCADE needs rx >= ry, so the
+        other ellipses are drawn along x, then rotated.
+        """
+        self.x = x
+        self.y = y
+        self.z = z
+        self.rx = rx
+        self.ry = ry
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        if self.rx == self.ry:
+            return ("Disk(%d) = {%s, %s, %s, %s};\n"
+                    % (self.id, self.x, self.y, self.z, self.rx))
+        elif self.rx > self.ry:
+            return ("Disk(%d) = {%s, %s, %s, %s, %s};\n"
+                    % (self.id, self.x, self.y, self.z, self.rx, self.ry))
+        return ("Disk(%d) = {%s, %s, %s, %s, %s};\n"
+                "Rotate {{0, 0, 1}, {%s, %s, %s}, Pi / 2} { Surface{%d}; }\n"
+                % (self.id, self.x, self.y, self.z, self.ry, self.rx,
+                   self.x, self.y, self.z, self.id))
+
+
+class OccBox:
+    occ_kind = 'Volume'
+
+    def __init__(self, geometry, x, y, z, dx, dy, dz):
+        """Box whose lower corner is (x, y, z)."""
+        self.x = x
+        self.y = y
+        self.z = z
+        self.dx = dx
+        self.dy = dy
+        self.dz = dz
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Box(%d) = {%s, %s, %s, %s, %s, %s};\n"
+                % (self.id, self.x, self.y, self.z,
+                   self.dx, self.dy, self.dz))
+
+
+class OccCylinder:
+    occ_kind = 'Volume'
+
+    def __init__(self, geometry, x, y, z, dz, rx, ry):
+        """
+        Vertical cylinder whose bottom is centered on (x, y, z).  The
+        elliptic ones are circular cylinders, scaled along y.
+        """
+        self.x = x
+        self.y = y
+        self.z = z
+        self.dz = dz
+        self.rx = rx
+        self.ry = ry
+
+        self.id = geometry.add_line(self)
+
+    def __repr__(self):
+        result = ("Cylinder(%d) = {%s, %s, %s, 0, 0, %s, %s};\n"
+                  % (self.id, self.x, self.y, self.z, self.dz, self.rx))
+        if self.rx != self.ry:
+            result += ("Dilate {{%s, %s, %s}, {1, %s, 1}} { Volume{%d}; }\n"
+                       % (self.x, self.y, self.z, self.ry / self.rx,
+                          self.id))
+        return result
+
+
+class OccDelete:
+    def __init__(self, geometry, shape):
+        """Remove a shape and its boundary entities, once it is used."""
+        self.occ_kind = shape.occ_kind
+        self.shape_id = shape.id
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Recursive Delete{ %s{%s}; }\n"
+                % (self.occ_kind, self.shape_id))
+
+
+class CharacteristicLength:
+    def __init__(self, geometry, shapes, el_size):
+        """Element size at the points of the shapes."""
+        self.occ_kind = shapes[0].occ_kind
+        self.shapes = join_ids(shapes)
+        self.el_size = element_size(el_size)
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Characteristic Length{ PointsOf{ %s{%s}; } } = %s;\n"
+                % (self.occ_kind, self.shapes, self.el_size))
+
+
+class OccEntities:
+    def __init__(self, name, kind):
+        """
+        Gmsh list of entities numbered by OpenCASCADE, such as the results
+        of a boolean operation.
+        """
+        self.name = name
+        self.occ_kind = kind
+        self.id = "%s()" % name
+
+    def item(self, index):
+        return "%s(%d)" % (self.name, index)
+
+
+class BooleanIntersection(OccEntities):
+    def __init__(self, geometry, shape, tool):
+        """Part of the shape inside the tool, which is kept."""
+        self.shape_id = shape.id
+        self.tool_id = tool.id
+
+        line_id = geometry.add_line(self)
+        OccEntities.__init__(self, "clip_%d" % line_id, shape.occ_kind)
+
+    def __repr__(self):
+        return ("%s = BooleanIntersection{ %s{%s}; Delete; }{ %s{%s}; };\n"
+                % (self.id, self.occ_kind, self.shape_id, self.occ_kind,
+                   self.tool_id))
+
+
+class BooleanDifference(OccEntities):
+    def __init__(self, geometry, name, shape, tools):
+        """Shape minus the tools, which are deleted."""
+        self.shape_id = shape.id
+        self.tools = join_ids(tools)
+
+        geometry.add_line(self)
+        OccEntities.__init__(self, name, shape.occ_kind)
+
+    def __repr__(self):
+        return ("%s = BooleanDifference{ %s{%s}; Delete; }"
+                "{ %s{%s}; Delete; };\n"
+                % (self.id, self.occ_kind, self.shape_id, self.occ_kind, self.tools))
+
+
+class BooleanFragments:
+    def __init__(self, geometry, shape, tools, curves=()):
+        """
+        Cut the shape by the tools, so that they share their boundaries.
+        The tools which are not modified keep their ids.
+
+        @param curves: lines cutting the shape too
+        """
+        self.occ_kind = shape.occ_kind
+        self.shape_id = shape.id
+        self.tools = join_ids(tools)
+        self.curves = join_ids(curves)
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        tools = ""
+        if self.tools:
+            tools += " %s{%s};" % (self.occ_kind, self.tools)
+        if self.curves:
+            tools += " Curve{%s};" % self.curves
+        return ("BooleanFragments{ %s{%s}; Delete; }{%s Delete; }\n"
+                % (self.occ_kind, self.shape_id, tools))
+
+
+class RemainingEntities(OccEntities):
+    def __init__(self, geometry, name, kind, excluded):
+        """All the entities of a kind, but the excluded ones."""
+        self.excluded = join_ids(excluded)
+
+        geometry.add_line(self)
+        OccEntities.__init__(self, name, kind)
+
+    def __repr__(self):
+        result = "%s = %s{:};\n" % (self.id, self.occ_kind)
+        if self.excluded:
+            result += "%s -= {%s};\n" % (self.id, self.excluded)
+        return result
+
+
+class EntitiesInBox(OccEntities):
+    def __init__(self, geometry, name, kind, box, margin):
+        """
+        Entities of a kind which lie inside a box.
+
+        @param box: (x_min, y_min, z_min, x_max, y_max, z_max)
+        @param margin: added to the box on each side
+        """
+        self.box = ([value - margin for value in box[:3]]
+                    + [value + margin for value in box[3:]])
+
+        geometry.add_line(self)
+        OccEntities.__init__(self, name, kind)
+
+    def __repr__(self):
+        return ("%s = %s In BoundingBox{%s};\n"
+                % (self.id, self.occ_kind,
+                   ', '.join(["%s" % value for value in self.box])))
+
+
+class PeriodicTranslation:
+    def __init__(self, geometry, entities1, entities2, dx, dy, dz, margin):
+        """
+        Mesh of entities1 copied from the one of entities2.
+
+        The boolean operations may split the boundaries of the matrix into
+        several entities, numbered in any order, so each entity of
+        entities2 is paired with the entity of entities1 whose bounding box
+        is its own one, translated.
+        """
+        self.occ_kind = entities1.occ_kind
+        self.entities1 = entities1.name
+        self.entities2 = entities2.name
+        self.translation = (dx, dy, dz)
+        self.margin = margin
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        dx, dy, dz = self.translation
+        values = {'kind': self.occ_kind,
+                  'entities1': self.entities1,
+                  'entities2': self.entities2,
+                  'dx': dx, 'dy': dy, 'dz': dz,
+                  'margin': self.margin}
+        return ("For index In {0:#%(entities2)s() - 1}\n"
+                "  box() = BoundingBox %(kind)s{%(entities2)s(index)};\n"
+                "  copies() = %(kind)s In BoundingBox{"
+                "box(0) + %(dx)s - %(margin)s, box(1) + %(dy)s - %(margin)s, "
+                "box(2) + %(dz)s - %(margin)s, box(3) + %(dx)s + %(margin)s, "
+                "box(4) + %(dy)s + %(margin)s, box(5) + %(dz)s + %(margin)s};\n"
+                "  For copy In {0:#copies() - 1}\n"
+                "    copy_box() = BoundingBox %(kind)s{copies(copy)};\n"
+                "    If (Fabs(copy_box(0) - box(0) - %(dx)s) < %(margin)s && "
+                "Fabs(copy_box(1) - box(1) - %(dy)s) < %(margin)s && "
+                "Fabs(copy_box(3) - box(3) - %(dx)s) < %(margin)s && "
+                "Fabs(copy_box(4) - box(4) - %(dy)s) < %(margin)s)\n"
+                "      Periodic %(kind)s{copies(copy)} = {%(entities2)s(index)} "
+                "Translate {%(dx)s, %(dy)s, %(dz)s};\n"
+                "    EndIf\n"
+                "  EndFor\n"
+                "EndFor\n" % values)
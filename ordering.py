@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Ordering of the sites along space-filling curves."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Resolution of the curves: the sites are placed on a grid of
+# 2 ** CURVE_BITS cells along each axis
+CURVE_BITS = 16
+
+# Masks spreading the bits of a 32 bits integer over the even bits of a
+# 64 bits one, along with the shifts between them
+SPREAD_STEPS = [(16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333),
+                (1, 0x5555555555555555)]
+
+
+def grid_coordinates(x, y, bits=CURVE_BITS):
+    """
+    Integer coordinates of points on a square grid of 2 ** bits cells
+    along each axis, covering their bounding box.
+    """
+    size = max(x.max() - x.min(), y.max() - y.min())
+    last = 2 ** bits - 1
+    if size == 0:
+        size = 1
+    ix = numpy.floor((x - x.min()) / size * last).astype(numpy.uint64)
+    iy = numpy.floor((y - y.min()) / size * last).astype(numpy.uint64)
+    return ix, iy
+
+
+def spread_bits(values):
+    """Insert a zero bit before each bit of values."""
+    values = values.astype(numpy.uint64)
+    for shift, mask in SPREAD_STEPS:
+        values = (values | (values << numpy.uint64(shift))) \
+            & numpy.uint64(mask)
+    return values
+
+
+def morton_keys(ix, iy):
+    """Positions of grid cells along the Morton (Z-order) curve."""
+    return spread_bits(ix) | (spread_bits(iy) << numpy.uint64(1))
+
+
+def hilbert_keys(ix, iy, bits=CURVE_BITS):
+    """Positions of grid cells along the Hilbert curve."""
+    x = ix.astype(numpy.int64)
+    y = iy.astype(numpy.int64)
+    last = 2 ** bits - 1
+    keys = numpy.zeros(len(x), dtype=numpy.int64)
+    s = 2 ** (bits - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant, so that the curve is continuous
+        flipped = ~ry & rx
+        x = numpy.where(flipped, last - x, x)
+        y = numpy.where(flipped, last - y, y)
+        x, y = numpy.where(ry, x, y), numpy.where(ry, y, x)
+        s //= 2
+    return keys
+
+
+def curve_order(x, y, curve):
+    """
+    Permutation sorting points along a space-filling curve, so that the
+    points close in space are close in the order.
+
+    @param curve: 'hilbert' or 'morton'
+    """
+    assert curve in ['hilbert', 'morton'], "Wrong curve type!"
+    if len(x) == 0:
+        return numpy.zeros(0, dtype=int)
+    ix, iy = grid_coordinates(x, y)
+    if curve == 'hilbert':
+        keys = hilbert_keys(ix, iy)
+    else:
+        keys = morton_keys(ix, iy)
+    return numpy.argsort(keys, kind='mergesort')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Detection of the periods of the inclusion maps."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+def smallest_period(types, axis, step=1):
+    """
+    Smallest period of an array along an axis, dividing its length, so
+    that the array is made of copies of its first period.
+
+    @param step: the period is a multiple of it (2 for the rows of the
+        hexagonal crystals, shifted every other row)
+    """
+    types = numpy.asarray(types)
+    length = types.shape[axis]
+    for period in range(step, length, step):
+        if length % period == 0 and numpy.array_equal(
+                types, numpy.roll(types, period, axis=axis)):
+            return period
+    return length
+
+
+def map_periods(inclusion_map, nb_x, nb_y, crystal_shape):
+    """
+    Smallest periods of an inclusion map given by [j][i] cell, along x and
+    y, None meaning the same type everywhere.
+
+    @return: (period_x, period_y), in cells
+    """
+    step_y = 1
+    if crystal_shape == 'hexa':
+        # An odd number of rows does not repeat the shifts of the rows
+        step_y = 2 if nb_y % 2 == 0 else max(nb_y, 1)
+    if inclusion_map is None:
+        return min(1, nb_x), min(step_y, nb_y)
+    types = numpy.asarray(inclusion_map)
+    assert types.shape[:2] == (nb_y, nb_x), "Wrong map size!"
+    return smallest_period(types, 1), smallest_period(types, 0, step_y)
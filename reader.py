@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""Reading and comparison of the Gmsh geometries written by crystalpy.
+
+Usage: python reader.py first.geo second.geo
+"""
+
+from __future__ import division
+import sys
+import numpy
+from columnar import KIND_CODES, KINDS
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Kinds whose references are points, the other ones referring to lines,
+# loops or surfaces
+POINT_KINDS = set([KIND_CODES['Line'], KIND_CODES['Circle'],
+                   KIND_CODES['Ellipse']])
+
+# Kinds whose references are a set, in any order
+UNORDERED_KINDS = set([KIND_CODES['Line Loop'], KIND_CODES['Surface Loop']])
+
+# Odd constant of the hashes of the keys
+GOLDEN = numpy.uint64(0x9E3779B97F4A7C15)
+
+# Characters of the lists of ids, and of the lists of coordinates
+INTEGER_CHARACTERS = '0123456789-, '
+FLOAT_CHARACTERS = INTEGER_CHARACTERS + '+.eE'
+
+
+def join_numbers(texts, dtype):
+    """Array of the comma-separated numbers of a list of texts."""
+    if not texts:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.fromstring(', '.join(texts), dtype=dtype, sep=',')
+
+
+class GeoFile:
+    """
+    Entities of a .geo file, stored in arrays.
+
+    The points are given by point_ids, points (x, y, z) and sizes.  The
+    other entities (lines, loops, surfaces and volumes) are given by
+    entity_ids, their kind codes (columnar.KINDS) and their signed
+    references, refs[offsets[k]:offsets[k + 1]] for the entity k.
+    """
+
+    def __init__(self, values, point_ids, points, sizes, entity_ids, kinds,
+                 offsets, refs, periodic, physical, embedded, others):
+        """
+        @param values: {name: value} of the variables
+        @param periodic: list of (kind, id1, id2), the mesh of id1 being
+            copied from the one of id2
+        @param physical: list of (kind, name, ids) of the physical groups
+        @param embedded: list of (line id, surface id)
+        @param others: the statements which are not read, as text
+        """
+        self.values = values
+        self.point_ids = point_ids
+        self.points = points
+        self.sizes = sizes
+        self.entity_ids = entity_ids
+        self.kinds = kinds
+        self.offsets = offsets
+        self.refs = refs
+        self.periodic = periodic
+        self.physical = physical
+        self.embedded = embedded
+        self.others = others
+
+    def nb_entities(self, kind):
+        """Number of entities of a kind ('Point', 'Line Loop'...)."""
+        if kind == 'Point':
+            return len(self.point_ids)
+        return int(numpy.count_nonzero(self.kinds == KIND_CODES[kind]))
+
+
+def is_numeric(text, characters=INTEGER_CHARACTERS):
+    """Tell if a text is a list of numbers, and not an expression."""
+    return not text.translate(None, characters)
+
+
+def body_of(line):
+    """Text between the first braces of a statement."""
+    return line[line.index('{') + 1:line.index('}')]
+
+
+def id_of(line, start):
+    """Id between the parentheses which follow line[:start]."""
+    return int(line[start + 1:line.index(')', start)])
+
+
+def read_geo(fileobj):
+    """
+    Read a .geo file written by crystalpy, one statement per line.
+
+    The points and the other entities, most of the file, are kept as text
+    and their numbers are parsed at once at the end.  The statements
+    which are not made of numbers only, such as the ones of the other
+    output modes (instanced copies, loops of the scripted mode,
+    OpenCASCADE...), are kept as text.
+
+    @param fileobj: any iterable of lines (plain file, gzip file...)
+    @return: a GeoFile
+    """
+    values = {}
+    point_ids = []
+    point_texts = []
+    size_texts = []
+    entity_ids = []
+    kinds = []
+    commas = []
+    ref_texts = []
+    periodic = []
+    physical = []
+    embedded = []
+    others = []
+    for line in fileobj:
+        kind, _, rest = line.partition('(')
+        if kind == 'Point':
+            point_id, _, rest = rest.partition(')')
+            coordinates, _, size = \
+                rest[rest.find('{') + 1:rest.rfind('}')].rpartition(',')
+            # The sizes may be given by the names of values
+            size = values.get(size.strip(), size)
+            if (point_id.isdigit()
+                    and not coordinates.translate(None, FLOAT_CHARACTERS)
+                    and not size.translate(None, FLOAT_CHARACTERS)):
+                point_ids.append(point_id)
+                point_texts.append(coordinates)
+                size_texts.append(size)
+                continue
+        code = KIND_CODES.get(kind)
+        if code is not None:
+            entity_id, _, rest = rest.partition(')')
+            body = rest[rest.find('{') + 1:rest.rfind('}')]
+            if (entity_id.isdigit()
+                    and not body.translate(None, INTEGER_CHARACTERS)):
+                entity_ids.append(entity_id)
+                kinds.append(code)
+                commas.append(body.count(','))
+                ref_texts.append(body)
+                continue
+
+        # The statements of macros and loops are indented
+        indented = line[:1] in (' ', '\t')
+        line = line.strip()
+        start = line.find('(')
+        kind = line[:start]
+        if not line or line.startswith('//'):
+            continue
+        elif indented:
+            others.append(line)
+        elif kind.startswith('Physical ') and is_numeric(body_of(line)):
+            name = line[start + 2:line.index('"', start + 2)]
+            physical.append((kind[len('Physical '):], name,
+                             join_numbers([body_of(line)], numpy.int64)))
+        elif kind == 'Periodic Line' and is_numeric(body_of(line)):
+            periodic.append(('Line', id_of(line, start),
+                             int(body_of(line))))
+        elif (kind == 'Periodic Surface'
+              and is_numeric(line[start:].translate(None, '(){}=; '))):
+            second = line.index('=')
+            periodic.append(('Surface', id_of(line, start),
+                             id_of(line, line.index('(', second))))
+        elif (line.startswith('Line{') and ' In Surface ' in line
+              and is_numeric(line.replace(' In Surface ', '')
+                             .translate(None, 'Line{};'))):
+            line_id, surface_id = [int(body_of(part)) for part
+                                   in line.split(' In Surface ')]
+            embedded.append((line_id, surface_id))
+        elif start == -1 and line.count('=') == 1 and '{' not in line:
+            name, _, value = line.rstrip(';').partition('=')
+            values[name.strip()] = value.strip()
+        else:
+            others.append(line)
+
+    offsets = numpy.zeros(len(commas) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.array(commas, dtype=numpy.int64) + 1,
+                 out=offsets[1:])
+    refs = join_numbers(ref_texts, numpy.int64)
+    assert len(refs) == offsets[-1], "Wrong references!"
+    points = join_numbers(point_texts, float)
+    assert len(points) == 3 * len(point_texts), "Wrong coordinates!"
+    return GeoFile(values, join_numbers(point_ids, numpy.int64),
+                   points.reshape(-1, 3),
+                   join_numbers(size_texts, float),
+                   join_numbers(entity_ids, numpy.int64),
+                   numpy.array(kinds, dtype=numpy.int8), offsets, refs,
+                   periodic, physical, embedded, others)
+
+
+def mix(values):
+    """Scrambled copy of an array of uint64 (splitmix64)."""
+    values = values + GOLDEN
+    values = (values ^ (values >> numpy.uint64(30))) \
+        * numpy.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> numpy.uint64(27))) \
+        * numpy.uint64(0x94D049BB133111EB)
+    return values ^ (values >> numpy.uint64(31))
+
+
+class Keys:
+    def __init__(self, ids):
+        """
+        Keys of entities which do not depend on their ids, from the ids.
+        The key of a reversed entity, of id -i, is the opposite of the
+        key of i.
+        """
+        self.order = numpy.argsort(ids, kind='mergesort')
+        self.sorted_ids = ids[self.order]
+        self.keys = numpy.zeros(len(ids), dtype=numpy.uint64)
+
+    def __getitem__(self, ids):
+        """
+        Keys of entities, from their signed ids.  The entities which are
+        not read, being kept as text, are known by their ids.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+        absolute = numpy.abs(ids)
+        keys = mix(absolute.astype(numpy.uint64) ^ GOLDEN)
+        if len(self.sorted_ids):
+            positions = numpy.searchsorted(self.sorted_ids, absolute)
+            positions[positions == len(self.sorted_ids)] = 0
+            found = self.sorted_ids[positions] == absolute
+            keys[found] = self.keys[self.order[positions[found]]]
+        return numpy.where(ids < 0, -keys, keys)
+
+
+def point_keys(geo, digits=9):
+    """Keys of the points: their coordinates, rounded to digits, and size."""
+    keys = Keys(geo.point_ids)
+    # Adding 0 turns -0 into 0
+    columns = numpy.column_stack([numpy.round(geo.points, digits),
+                                  geo.sizes]) + 0.
+    bits = columns.view(numpy.uint64)
+    keys.keys = mix(mix(bits[:, 0]) + mix(bits[:, 1] ^ GOLDEN)
+                    + mix(bits[:, 2] + GOLDEN) + mix(bits[:, 3] * GOLDEN))
+    return keys
+
+
+def entity_keys(geo, points):
+    """
+    Keys of the entities which are not points: their kind and the keys of
+    the entities they refer to, in order or not.  Each kind refers only to
+    the points or the kinds before it in columnar.KINDS.
+
+    @param points: the keys of the points
+    """
+    keys = Keys(geo.entity_ids)
+    starts = geo.offsets[:-1]
+    counts = numpy.diff(geo.offsets)
+    for code in range(len(KINDS)):
+        indices = numpy.flatnonzero(geo.kinds == code)
+        if not len(indices):
+            continue
+        kind_counts = counts[indices]
+        # Positions of the references of the entities of this kind
+        firsts = numpy.zeros(len(indices), dtype=numpy.int64)
+        numpy.cumsum(kind_counts[:-1], out=firsts[1:])
+        ranks = (numpy.arange(kind_counts.sum())
+                 - numpy.repeat(firsts, kind_counts))
+        refs = geo.refs[numpy.repeat(starts[indices], kind_counts) + ranks]
+        if code in POINT_KINDS:
+            ref_keys = points[refs]
+        else:
+            ref_keys = keys[refs]
+        if code in UNORDERED_KINDS:
+            ranks = numpy.zeros_like(ranks)
+        terms = mix(ref_keys + mix(ranks.astype(numpy.uint64)))
+        keys.keys[indices] = mix(numpy.add.reduceat(terms, firsts)
+                                 + mix(numpy.array([code],
+                                                   dtype=numpy.uint64)))
+    return keys
+
+
+def unmatched(keys1, keys2):
+    """
+    Indices of keys1 which are not matched by keys2, each key of keys2
+    matching only one of keys1.
+    """
+    order = numpy.argsort(keys1, kind='mergesort')
+    sorted1 = keys1[order]
+    sorted2 = numpy.sort(keys2)
+    ranks = (numpy.arange(len(sorted1))
+             - numpy.searchsorted(sorted1, sorted1, 'left'))
+    matches = (numpy.searchsorted(sorted2, sorted1, 'right')
+               - numpy.searchsorted(sorted2, sorted1, 'left'))
+    return order[ranks >= matches]
+
+
+class GeoDiff:
+    def __init__(self, geo1, geo2, digits=9):
+        """
+        Differences between two geometries, whatever the ids of their
+        entities.
+
+        removed[kind] holds the ids, in geo1, of the entities of a kind
+        which are not in geo2, and added[kind] the ids, in geo2, of the
+        ones which are not in geo1.  values and physical list the names of
+        the changed variables and physical groups, periodic and embedded
+        the keys of the changed constraints, and others the changed
+        statements which are not read.
+        """
+        points1 = point_keys(geo1, digits)
+        points2 = point_keys(geo2, digits)
+        keys1 = entity_keys(geo1, points1)
+        keys2 = entity_keys(geo2, points2)
+        self.removed = {}
+        self.added = {}
+        kinds = [('Point', geo1.point_ids, geo2.point_ids,
+                  points1.keys, points2.keys)]
+        for code, kind in enumerate(KINDS):
+            kind1 = geo1.kinds == code
+            kind2 = geo2.kinds == code
+            kinds.append((kind, geo1.entity_ids[kind1],
+                          geo2.entity_ids[kind2], keys1.keys[kind1],
+                          keys2.keys[kind2]))
+        for kind, ids1, ids2, kind_keys1, kind_keys2 in kinds:
+            removed = ids1[unmatched(kind_keys1, kind_keys2)]
+            added = ids2[unmatched(kind_keys2, kind_keys1)]
+            if len(removed):
+                self.removed[kind] = sorted(removed.tolist())
+            if len(added):
+                self.added[kind] = sorted(added.tolist())
+
+        names = set(geo1.values) | set(geo2.values)
+        self.values = sorted([name for name in names
+                              if geo1.values.get(name)
+                              != geo2.values.get(name)])
+        groups1 = self.physical_groups(geo1, points1, keys1)
+        groups2 = self.physical_groups(geo2, points2, keys2)
+        self.physical = sorted([group for group in set(groups1)
+                                | set(groups2)
+                                if groups1.get(group) != groups2.get(group)])
+        self.periodic = sorted(self.constraints(geo1.periodic, keys1)
+                               ^ self.constraints(geo2.periodic, keys2))
+        self.embedded = sorted(self.constraints(geo1.embedded, keys1)
+                               ^ self.constraints(geo2.embedded, keys2))
+        self.others = sorted(set(geo1.others) ^ set(geo2.others))
+
+    def physical_groups(self, geo, points, keys):
+        """{(kind, name): sorted keys of the members} of the groups."""
+        result = {}
+        for kind, name, ids in geo.physical:
+            members = points[ids] if kind == 'Point' else keys[ids]
+            result[(kind, name)] = sorted(members.tolist())
+        return result
+
+    def constraints(self, constraints, keys):
+        """Set of the constraints, their ids being replaced by keys."""
+        result = set()
+        for constraint in constraints:
+            result.add(tuple([item if isinstance(item, str)
+                              else int(keys[[item]][0])
+                              for item in constraint]))
+        return result
+
+    def same(self):
+        return not (self.removed or self.added or self.values
+                    or self.physical or self.periodic or self.embedded
+                    or self.others)
+
+    def summary(self):
+        """Lines of text telling what changed."""
+        lines = []
+        for kind in ['Point'] + KINDS:
+            if kind in self.removed or kind in self.added:
+                lines.append("%s: %d removed, %d added"
+                             % (kind, len(self.removed.get(kind, [])),
+                                len(self.added.get(kind, []))))
+        for name in self.values:
+            lines.append("Value %s changed" % name)
+        for kind, name in self.physical:
+            lines.append('Physical %s("%s") changed' % (kind, name))
+        if self.periodic:
+            lines.append("%d periodic constraints changed"
+                         % len(self.periodic))
+        if self.embedded:
+            lines.append("%d embedded lines changed" % len(self.embedded))
+        if self.others:
+            lines.append("%d other statements changed" % len(self.others))
+        return lines
+
+
+if __name__ == '__main__':
+    diff = GeoDiff(read_geo(open(sys.argv[1])), read_geo(open(sys.argv[2])))
+    print '\n'.join(diff.summary()) or 'Same geometry'
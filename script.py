@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Gmsh scripting (For loops and macros) of the regular parts of a crystal."""
+
+from __future__ import division
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Points of each shape, in units of its half dimensions, the first one
+# being the center for the curved shapes, and its lines, as indices of
+# those points.  They follow FullCircle, FullEllipse and Rectangle.
+SHAPE_POINTS = {'circle': [(0, 0), (-1, 0), (1, 0)],
+                'ellipse': [(0, 0), (-1, 0), (1, 0), (0, 1), (0, -1)],
+                'rectangle': [(-1, 1), (-1, -1), (1, 1), (1, -1)]}
+SHAPE_LINES = {'circle': ('Circle', [(1, 0, 2), (2, 0, 1)]),
+               'ellipse': ('Ellipse', [(1, 0, 2, 3), (3, 0, 4, 2),
+                                       (2, 0, 1, 4), (4, 0, 3, 1)]),
+               'rectangle': ('Line', [(1, 0), (0, 2), (2, 3), (3, 1)])}
+
+
+def affine(constant, terms):
+    """
+    Gmsh expression of constant + the sum of coefficient * expression.
+
+    @param terms: (coefficient, expression) pairs, the null ones being
+        left out
+    """
+    result = ["%s" % constant]
+    for coefficient, expression in terms:
+        if coefficient:
+            result.append("%s * %s" % (coefficient, expression))
+    return ' + '.join(result)
+
+
+def offset(variable, value):
+    """Gmsh expression of variable + value."""
+    if value > 0:
+        return "%s + %s" % (variable, value)
+    elif value < 0:
+        return "%s - %s" % (variable, -value)
+    return variable
+
+
+class ScriptList:
+    def __init__(self, geometry, name):
+        """Gmsh list, filled by the macros with the ids of their entities."""
+        self.name = name
+        self.id = "%s[]" % name
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return "%s[] = {};\n" % self.name
+
+
+class InclusionMacro:
+    def __init__(self, geometry, name, shape, dim_x, dim_y, el_size,
+                 lines_list, surfaces_list=None):
+        """
+        Gmsh macro drawing one inclusion centered on (x, y).
+
+        The ids of its lines are appended to lines_list and, if it is not
+        a hole, the id of its surface to surfaces_list.
+        """
+        self.name = name
+        self.shape = shape
+        if shape == 'ellipse' and dim_x == dim_y:
+            self.shape = 'circle'
+        self.half_x = dim_x / 2
+        self.half_y = dim_y / 2
+        if hasattr(el_size, 'name'):
+            self.el_size = el_size.name
+        else:
+            self.el_size = el_size
+        self.lines_list = lines_list
+        self.surfaces_list = surfaces_list
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        result = ["Macro %s\n" % self.name, "  p = newp;\n"]
+        for index, (x, y) in enumerate(SHAPE_POINTS[self.shape]):
+            result.append("  Point(%s) = {%s, %s, 0, %s};\n"
+                          % (offset('p', index),
+                             offset('x', x * self.half_x),
+                             offset('y', y * self.half_y), self.el_size))
+        kind, lines = SHAPE_LINES[self.shape]
+        line_ids = [offset('l', index) for index in range(len(lines))]
+        result.append("  l = newl;\n")
+        for line_id, points in zip(line_ids, lines):
+            result.append("  %s(%s) = {%s};\n"
+                          % (kind, line_id,
+                             ', '.join([offset('p', point)
+                                        for point in points])))
+        result.append("  %s[] += {%s};\n"
+                      % (self.lines_list.name, ', '.join(line_ids)))
+        if self.surfaces_list is not None:
+            result.append("  ll = newll;\n")
+            result.append("  Line Loop(ll) = {%s};\n" % ', '.join(line_ids))
+            result.append("  s = news;\n")
+            result.append("  Plane Surface(s) = {ll};\n")
+            result.append("  %s[] += {s};\n" % self.surfaces_list.name)
+        result.append("Return\n")
+        return ''.join(result)
+
+
+class LatticeBlock:
+    def __init__(self, geometry, macro, i_begin, i_end, j_begin, j_end,
+                 origin, a1, a2, shift):
+        """
+        For loops calling a macro on the cells [i_begin, i_end[ x
+        [j_begin, j_end[ of a lattice, whose sites are at
+        origin + i * a1 + j * a2 + (j % 2) * shift.
+        """
+        self.macro = macro
+        self.i_begin = i_begin
+        self.i_end = i_end
+        self.j_begin = j_begin
+        self.j_end = j_end
+        self.origin = origin
+        self.a1 = a1
+        self.a2 = a2
+        self.shift = shift
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("For i In {%d:%d}\n"
+                "  For j In {%d:%d}\n"
+                "    x = %s;\n"
+                "    y = %s;\n"
+                "    Call %s;\n"
+                "  EndFor\n"
+                "EndFor\n"
+                % (self.i_begin, self.i_end - 1,
+                   self.j_begin, self.j_end - 1,
+                   affine(self.origin[0], [(self.a1[0], 'i'),
+                                           (self.a2[0], 'j'),
+                                           (self.shift[0], '(j % 2)')]),
+                   affine(self.origin[1], [(self.a1[1], 'i'),
+                                           (self.a2[1], 'j'),
+                                           (self.shift[1], '(j % 2)')]),
+                   self.macro.name))
+
+
+class ScriptLineLoop:
+    def __init__(self, geometry, name, pos_lines, neg_lines=[],
+                 neg_lists=[]):
+        """Line loop numbered by Gmsh, whose id is the variable name."""
+        line_ids = [format(line.id) for line in pos_lines]
+        line_ids.extend([format(-line.id) for line in neg_lines])
+        line_ids.extend(["-%s" % line_list.id for line_list in neg_lists])
+        self.lines = ', '.join(line_ids)
+        self.id = name
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("%s = newll;\nLine Loop(%s) = {%s};\n"
+                % (self.id, self.id, self.lines))
+
+
+class ScriptPlaneSurface:
+    def __init__(self, geometry, name, loop):
+        """Plane surface numbered by Gmsh, whose id is the variable name."""
+        self.loop = loop
+        self.id = name
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("%s = news;\nPlane Surface(%s) = {%s};\n"
+                % (self.id, self.id, self.loop.id))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Gmsh geometry split into sections with stable ids, one file each."""
+
+from __future__ import division
+import os
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Number of point ids, and of other ids, kept for each site
+SITE_STRIDE = 1000
+
+# Number of consecutive sites written to the same file
+SITES_PER_FILE = 256
+
+
+class Section:
+    def __init__(self, name, first_id, slot):
+        """Entities of a site, or of another part of the crystal."""
+        self.name = name
+        self.slot = slot
+        self.first_id = first_id
+        self.points = []
+        self.lines = []
+
+
+class SectionedGeometry:
+    """
+    Geometry whose points and lines are grouped into sections: one per
+    site of the crystal, then the physical maps, then the matrix.
+
+    It has the same interface as generator.Geometry, plus section().
+    Each site has its own range of SITE_STRIDE ids, given by its slot, so
+    that the ids of a site do not depend on the other sites: after the
+    change of an inclusion, only its own entities and the ones which
+    refer to them change.  The other sections share the ids after the
+    last slot.
+    """
+
+    def __init__(self, nb_slots, stride=SITE_STRIDE):
+        """
+        @param nb_slots: number of sites the crystal may have
+        """
+        self.values = []
+        self.physical_entities = []
+        self.shared = None
+        self.stride = stride
+        self.sections = []
+        self.section_names = {}
+        # Ids of the sections without slot, in the order of their entities
+        self.free_points = (nb_slots + 1) * stride
+        self.free_lines = (nb_slots + 1) * stride
+        self.current = None
+        self.section('maps')
+
+    def section(self, name, slot=None):
+        """
+        Put the next entities in a section, created at its first use.
+
+        @param slot: the number of a site, from 1
+        """
+        if name not in self.section_names:
+            first_id = None
+            if slot is not None:
+                first_id = slot * self.stride
+            self.section_names[name] = len(self.sections)
+            self.sections.append(Section(name, first_id, slot))
+        self.current = self.sections[self.section_names[name]]
+
+    def add_value(self, value):
+        assert value.name not in [other.name for other in self.values]
+        self.values.append(value)
+
+    def add_point(self, point):
+        section = self.current
+        section.points.append(point)
+        if section.slot is None:
+            self.free_points += 1
+            return self.free_points
+        assert len(section.points) < self.stride, \
+            "Too many points in a site!"
+        return section.first_id + len(section.points)
+
+    def add_line(self, line):
+        section = self.current
+        section.lines.append(line)
+        if section.slot is None:
+            self.free_lines += 1
+            return self.free_lines
+        assert len(section.lines) < self.stride, "Too many lines in a site!"
+        return section.first_id + len(section.lines)
+
+    def add_physical_entity(self, entity):
+        self.physical_entities.append(entity)
+
+    def parts(self):
+        """
+        Text of the parts of the geometry, which refer only to the ones
+        before them: the values, the physical maps, the sites by blocks of
+        SITES_PER_FILE, the matrix and the physical entities.
+
+        @return: list of (part name, text)
+        """
+        blocks = {}
+        others = []
+        for section in self.sections:
+            text = (''.join([repr(point) for point in section.points])
+                    + ''.join([repr(line) for line in section.lines]))
+            if section.slot is None:
+                others.append((section.name, text))
+            else:
+                block = section.slot // SITES_PER_FILE
+                blocks.setdefault(block, []).append((section.slot, text))
+        parts = [('values', ''.join([repr(value) for value in self.values]))]
+        parts.extend([part for part in others if part[0] == 'maps'])
+        for block in sorted(blocks):
+            parts.append(('sites_%d' % block,
+                          ''.join([text for _, text
+                                   in sorted(blocks[block])])))
+        parts.extend([part for part in others if part[0] != 'maps'])
+        parts.append(('physical', ''.join([repr(entity) for entity
+                                           in self.physical_entities])))
+        return parts
+
+    def write(self, fileobj):
+        for _, text in self.parts():
+            fileobj.write(text)
+            fileobj.write('\n')
+
+    def write_files(self, directory, name, header):
+        """
+        Write the geometry as a main file including one file per part.
+        The files whose text is unchanged are not written again, so that
+        an edited crystal only rewrites the parts it changes.
+
+        @return: names of the files written
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        files = [("%s_%s.geo" % (name, part), text)
+                 for part, text in self.parts()]
+        main = header + ''.join(['Include "%s";\n' % file_name
+                                 for file_name, _ in files])
+        written = []
+        for file_name, text in files + [(name + '.geo', main)]:
+            path = os.path.join(directory, file_name)
+            if os.path.exists(path) and open(path).read() == text:
+                continue
+            fileobj = open(path, 'w')
+            fileobj.write(text)
+            fileobj.close()
+            written.append(file_name)
+        return written
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Block-structured meshing of crystals made of rectangles."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+def block_grid(x_min, x_max, y_min, y_max, rectangles):
+    """
+    Split a domain into the cells of the grid made of its edges and of the
+    edges of the rectangles, clipped to it.
+
+    @param rectangles: (x_min, x_max, y_min, y_max) of each rectangle
+    @return: (xs, ys, owners), xs and ys being the sorted coordinates of
+        the grid lines, and owners[i, j] the index of the last rectangle
+        covering the cell [xs[i], xs[i + 1]] x [ys[j], ys[j + 1]], or -1
+    """
+    xs = [x_min, x_max]
+    ys = [y_min, y_max]
+    for rect_x_min, rect_x_max, rect_y_min, rect_y_max in rectangles:
+        xs.extend([rect_x_min, rect_x_max])
+        ys.extend([rect_y_min, rect_y_max])
+    xs = numpy.unique(numpy.clip(xs, x_min, x_max))
+    ys = numpy.unique(numpy.clip(ys, y_min, y_max))
+
+    owners = -numpy.ones((len(xs) - 1, len(ys) - 1), dtype=int)
+    for index, (rect_x_min, rect_x_max, rect_y_min, rect_y_max) in \
+            enumerate(rectangles):
+        i_begin, i_end = numpy.searchsorted(xs, numpy.clip(
+            [rect_x_min, rect_x_max], x_min, x_max))
+        j_begin, j_end = numpy.searchsorted(ys, numpy.clip(
+            [rect_y_min, rect_y_max], y_min, y_max))
+        owners[i_begin:i_end, j_begin:j_end] = index
+    return xs, ys, owners
+
+
+def nb_nodes(widths, sizes):
+    """
+    Number of nodes of the lines of each interval, so that no element is
+    larger than the smallest size along it.
+
+    @param sizes: element sizes of the cells, of shape (intervals, cells),
+        nan for the cells which are not meshed
+    """
+    smallest = numpy.where(numpy.isnan(sizes), numpy.inf, sizes).min(axis=1)
+    return numpy.maximum(numpy.ceil(widths / smallest), 1).astype(int) + 1
+
+
+class TransfiniteLine:
+    def __init__(self, geometry, lines, nb_points):
+        """Lines meshed with nb_points regularly spaced nodes."""
+        self.lines = ', '.join([format(line.id) for line in lines])
+        self.nb_points = nb_points
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return ("Transfinite Line{%s} = %d;\n"
+                % (self.lines, self.nb_points))
+
+
+class TransfiniteSurface:
+    def __init__(self, geometry, surfaces):
+        """Surfaces of four sides meshed by a structured grid."""
+        self.surfaces = ', '.join([format(surface.id)
+                                   for surface in surfaces])
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return "Transfinite Surface{%s};\n" % self.surfaces
+
+
+class RecombineSurface:
+    def __init__(self, geometry, surfaces):
+        """Surfaces meshed by quadrangles instead of triangles."""
+        self.surfaces = ', '.join([format(surface.id)
+                                   for surface in surfaces])
+
+        geometry.add_line(self)
+
+    def __repr__(self):
+        return "Recombine Surface{%s};\n" % self.surfaces
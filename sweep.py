@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Generation of the variants of a crystal over parameter grids."""
+
+from __future__ import division
+import copy
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from generator import Crystal
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+MANIFEST = 'manifest.jsonl'
+
+
+def parameter_grid(grids):
+    """
+    All the combinations of the values of the parameters, the last
+    parameter varying the fastest.
+
+    @param grids: list of (path, values), see set_parameter for the paths
+    @return: list of {path: value}
+    """
+    paths = [path for path, _ in grids]
+    return [dict(zip(paths, values))
+            for values in itertools.product(*[values
+                                              for _, values in grids])]
+
+
+def set_parameter(description, path, value):
+    """
+    Set a parameter of a crystal description, given by its dotted path:
+    a key of the description ('space_x'), or an item or an attribute
+    under it ('inclusion_types.1.el_size', 'physical_point_map.0').
+    """
+    parts = path.split('.')
+    container = description
+    for part in parts[:-1]:
+        container = path_item(container, part)
+    if isinstance(container, dict):
+        container[parts[-1]] = value
+    elif isinstance(container, list):
+        container[int(parts[-1])] = value
+    else:
+        setattr(container, parts[-1], value)
+
+
+def path_item(container, part):
+    """Item of a dict or a list, or attribute of an object, by name."""
+    if isinstance(container, dict):
+        return container[part]
+    elif isinstance(container, list):
+        return container[int(part)]
+    return getattr(container, part)
+
+
+def with_parameters(description, parameters):
+    """A copy of a crystal description, with some parameters changed."""
+    result = copy.deepcopy(description)
+    for path in sorted(parameters):
+        set_parameter(result, path, parameters[path])
+    return result
+
+
+def read_manifest(path):
+    """
+    Rows of a manifest, by variant index.  A row cut by a crash is
+    skipped, so that its variant is built again.
+    """
+    rows = {}
+    if not os.path.exists(path):
+        return rows
+    for line in open(path):
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        rows[row['index']] = row
+    return rows
+
+
+def save_atomically(save, path):
+    """Write a file through save(filename), never leaving half of it."""
+    temporary = path + '.tmp'
+    try:
+        save(temporary)
+    except Exception:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    os.rename(temporary, path)
+
+
+def write_geo(crystal, filename):
+    fileobj = open(filename, 'w')
+    crystal.write_mesh(fileobj)
+    fileobj.close()
+
+
+def build_variant(description, index, parameters, directory, image):
+    """
+    Build a variant and write its files, in a worker process.
+
+    Any error of the variant is recorded in its row, so that a single bad
+    combination of parameters does not stop the sweep.
+
+    @return: its row of the manifest, with the type and the message of the
+        error which stopped it, if any
+    """
+    variant = with_parameters(description, parameters)
+    name = "%s_%05d" % (variant['name'], index)
+    variant['name'] = name
+    row = {'index': index, 'name': name, 'parameters': parameters}
+    try:
+        crystal = Crystal(**variant)
+        geo_path = os.path.join(directory, name + '.geo')
+        save_atomically(lambda filename: write_geo(crystal, filename),
+                        geo_path)
+        row['geo'] = name + '.geo'
+        if image:
+            save_atomically(crystal.image().save,
+                            os.path.join(directory, name + '.svg'))
+            row['svg'] = name + '.svg'
+    except Exception, error:
+        row['error_type'] = type(error).__name__
+        row['error'] = str(error)
+    return row
+
+
+def build_variants(description, chunk, directory, image):
+    """Build a chunk of (index, parameters) variants, in a worker process."""
+    return [build_variant(description, index, parameters, directory, image)
+            for index, parameters in chunk]
+
+
+def sweep(description, grids, directory, image=False, max_workers=None,
+          chunk_size=16):
+    """
+    Build the crystals of all the combinations of parameter values over a
+    pool of processes, and write their .geo files, and their .svg images
+    if asked, to directory.
+
+    Each finished variant gets a JSON row in the manifest of the
+    directory, which gives its parameters, its files or its error.  The
+    variants of the manifest are not built again, so that a sweep stopped
+    by a crash resumes where it was.  The description is left unchanged,
+    each variant being built from a copy of it.
+
+    @param grids: list of (path, values), see set_parameter for the paths
+    @param chunk_size: number of variants sent to a process at once
+    @return: rows of the manifest, in the order of the variants
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest_path = os.path.join(directory, MANIFEST)
+    rows = read_manifest(manifest_path)
+
+    variants = parameter_grid(grids)
+    todo = []
+    for index, parameters in enumerate(variants):
+        # Built, unless the row was written for other grids
+        if (index in rows and rows[index]['parameters']
+                == json.loads(json.dumps(parameters))):
+            continue
+        todo.append((index, parameters))
+    chunks = [todo[start:start + chunk_size]
+              for start in range(0, len(todo), chunk_size)]
+
+    manifest = open(manifest_path, 'a')
+    # A row cut by a crash is ended, rather than continued by the next one
+    if open(manifest_path).read()[-1:] not in ['', '\n']:
+        manifest.write('\n')
+    executor = ProcessPoolExecutor(max_workers)
+    try:
+        futures = [executor.submit(build_variants, description, chunk,
+                                   directory, image)
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            for row in future.result():
+                manifest.write(json.dumps(row, sort_keys=True) + '\n')
+                rows[row['index']] = row
+            manifest.flush()
+            os.fsync(manifest.fileno())
+    finally:
+        executor.shutdown()
+        manifest.close()
+    return [rows[index] for index in range(len(variants))]
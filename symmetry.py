@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Detection of the mirror symmetries of a crystal."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+def sorted_rows(rows):
+    """Rows of a 2D array, in lexicographic order."""
+    if len(rows) == 0:
+        return rows
+    return rows[numpy.lexsort(rows.T[::-1])]
+
+
+def mirror_invariant(rows, columns, tolerance):
+    """
+    Tell whether a set of rows is unchanged when the sign of some columns
+    is flipped, the values being equal within the tolerance.
+
+    @param rows: 2D array, one row per object
+    @param columns: indices of the columns to flip
+    """
+    rows = numpy.asarray(rows, dtype=float)
+    mirrored = rows.copy()
+    mirrored[:, columns] *= -1
+    keys = numpy.round(rows / tolerance).astype(numpy.int64)
+    mirrored_keys = numpy.round(mirrored / tolerance).astype(numpy.int64)
+    return numpy.array_equal(sorted_rows(keys), sorted_rows(mirrored_keys))
+
+
+def segment_rows(group, segments):
+    """
+    Rows (group, x1, y1, z1, x2, y2, z2) of segments, each one going from
+    its lowest end to its highest one, so that a segment and its mirror
+    image are written the same way.
+    """
+    rows = []
+    for point1, point2 in segments:
+        rows.append([group] + list(min(point1, point2))
+                    + list(max(point1, point2)))
+    return rows
+
+
+def mirror_segments(rows, axis):
+    """Rows of the mirror images of segments, through the plane of an axis."""
+    rows = numpy.array(rows, dtype=float).reshape(-1, 7)
+    rows[:, [1 + axis, 4 + axis]] *= -1
+    return [segment_rows(row[0], [(tuple(row[1:4]), tuple(row[4:]))])[0]
+            for row in rows]
+
+
+def segments_invariant(rows, axis, tolerance):
+    """Tell whether a set of segment_rows is symmetric through a plane."""
+    if len(rows) == 0:
+        return True
+    keys = numpy.round(numpy.array(rows, dtype=float)
+                       / tolerance).astype(numpy.int64)
+    mirrored = numpy.round(numpy.array(mirror_segments(rows, axis))
+                           / tolerance).astype(numpy.int64)
+    return numpy.array_equal(sorted_rows(keys), sorted_rows(mirrored))
+
+
+def clip_segment(point1, point2, axis):
+    """
+    Part of a segment on the positive side of the plane of an axis, None
+    if it is entirely on the negative side.
+    """
+    if point1[axis] < 0 and point2[axis] < 0:
+        return None
+    if point1[axis] >= 0 and point2[axis] >= 0:
+        return point1, point2
+    ratio = point1[axis] / (point1[axis] - point2[axis])
+    crossing = tuple([value1 + ratio * (value2 - value1)
+                      for value1, value2 in zip(point1, point2)])
+    crossing = crossing[:axis] + (0,) + crossing[axis + 1:]
+    if point1[axis] < 0:
+        return crossing, point2
+    return point1, crossing
@@ -1,6 +1,54 @@
 # -*- coding: utf-8 -*-
 from unittest import TestCase
-from generator import Crystal
+from generator import Crystal, InclusionType
+
+
+def inclusion_type(**changes):
+    """
+    Return an inclusion type for the tests: elliptic holes by default.
+
+    @param changes: arguments of InclusionType replacing the defaults
+    """
+
+    arguments = {'type': 'hole',
+                 'shape': 'ellipse',
+                 'dim_x': 100,
+                 'dim_y': 100,
+                 'dim_z': 0,
+                 'el_size': 20}
+    arguments.update(changes)
+    return InclusionType(**arguments)
+
+
+def base_description(**changes):
+    """
+    Return the description of a crystal for the tests: one hole next to
+    an empty site, in a 2D square crystal.
+
+    @param changes: arguments of Crystal replacing the defaults
+    """
+
+    result = {'name': 'Crystal',
+              'dim_x': 400,
+              'dim_y': 200,
+              'dim_z': 0,
+              'periodicity': (False, False, False),
+              'nb_x': 2,
+              'nb_y': 1,
+              'space_x': 200,
+              'space_y': 200,
+              'pos_x': 0,
+              'pos_y': 0,
+              'crystal_shape': 'square',
+              'el_size_bulk': 25,
+              'bulk_tag': 'mat1',
+              'inclusion_map': [[0, 1]],
+              'inclusion_types': [None, inclusion_type()],
+              'physical_point_map': [],
+              'physical_line_map': []}
+    result.update(changes)
+    return result
+
 
 class GeneratorTestCase(TestCase):
     def mesh_equal_string(self, description, result):
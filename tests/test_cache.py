@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+from multiprocessing import Pool
+import glob
+import os
+import shutil
+import tempfile
+import numpy
+from cache import GeometryCache, description_key
+from generator import Crystal
+from tests.test_write_mesh import description
+
+
+def store(arguments):
+    directory, index = arguments
+    cache = GeometryCache(directory)
+    cache.put('ab' * 32, 'geo', str(index % 2) * 100000)
+    return cache.get('ab' * 32, 'geo')
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_description_key(self):
+        key = description_key(description())
+        self.assertEquals(description_key(description()), key)
+        larger = description()
+        larger['inclusion_types'][0].dim_x = 110
+        self.assertNotEquals(description_key(larger), key)
+        mapped = description()
+        mapped['inclusion_map'] = numpy.zeros((4, 5), dtype=int)
+        mapped_key = description_key(mapped)
+        self.assertNotEquals(mapped_key, key)
+        mapped['inclusion_map'][0, 0] = 1
+        self.assertNotEquals(description_key(mapped), mapped_key)
+
+    def test_mesh(self):
+        cache = GeometryCache(self.directory)
+        geo = cache.mesh(description())
+        self.assertEquals(geo, Crystal(**description()).mesh())
+        # A hit is read from the disk, without building the crystal
+        cache.put(description_key(description()), 'geo', 'cached')
+        self.assertEquals(cache.mesh(description()), 'cached')
+        self.assertTrue(cache.image(description()).startswith('<?xml'))
+        self.assertEquals(len(cache.entries()), 2)
+
+    def test_eviction(self):
+        cache = GeometryCache(self.directory, max_size=250)
+        for index, key in enumerate(['aa', 'bb', 'cc']):
+            cache.put(key * 32, 'geo', 'x' * 100)
+            os.utime(cache.path(key * 32, 'geo'), (index, index))
+        self.assertEquals(cache.get('aa' * 32, 'geo'), None)
+        # The use of an entry makes it the most recent one
+        self.assertEquals(cache.get('bb' * 32, 'geo'), 'x' * 100)
+        cache.put('dd' * 32, 'geo', 'x' * 100)
+        self.assertEquals(cache.get('cc' * 32, 'geo'), None)
+        self.assertEquals(cache.size(), 200)
+
+    def test_scans(self):
+        cache = GeometryCache(self.directory, max_size=1000)
+        scans = []
+        entries = cache.entries
+        cache.entries = lambda: scans.append(None) or entries()
+        for index in range(50):
+            cache.put('%02x' % index * 32, 'geo', 'x' * 100)
+        # The first put, then one eviction each time 200 bytes are added
+        # over the cap, down to 900 bytes
+        self.assertEquals(len(scans), 1 + 40 // 2)
+        self.assertTrue(cache.size() <= 1000)
+        # Storing the same entry again does not change the size
+        cache.put('%02x' % 49 * 32, 'geo', 'x' * 100)
+        self.assertEquals(cache.known_size, cache.size())
+
+    def test_concurrent_writers(self):
+        pool = Pool(4)
+        contents = pool.map(store, [(self.directory, index)
+                                    for index in range(16)])
+        pool.close()
+        pool.join()
+        for content in contents:
+            self.assertTrue(content in ['0' * 100000, '1' * 100000])
+        self.assertEquals(glob.glob(os.path.join(self.directory, '*',
+                                                 '*.tmp')), [])
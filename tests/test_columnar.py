@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import re
+from unittest import TestCase
+from generator import Crystal
+from tests.test_write_mesh import description
+
+
+def normalize(mesh):
+    return re.sub(r'-?\d+(\.\d*)?',
+                  lambda match: repr(float(match.group())), mesh)
+
+
+class ArrayGeometryTests(TestCase):
+    def check_storage(self, description_2, description_1):
+        description_2['storage'] = 'arrays'
+        mesh_objects = Crystal(**description_1).mesh()
+        mesh_arrays = Crystal(**description_2).mesh()
+        self.assertNotEquals(mesh_arrays, mesh_objects)
+        self.assertEquals(normalize(mesh_arrays), normalize(mesh_objects))
+        return mesh_arrays
+
+    def test_arrays_2d(self):
+        mesh = self.check_storage(description(), description())
+        self.assertTrue('Point(2) = {-360, -300, 0, size_1};\n' in mesh)
+        self.assertTrue('Periodic Line(' in mesh)
+
+    def test_arrays_3d(self):
+        description_1 = description()
+        description_1['dim_z'] = 300
+        description_2 = description()
+        description_2['dim_z'] = 300
+        mesh = self.check_storage(description_2, description_1)
+        self.assertTrue('Surface Loop(' in mesh)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from disorder import jitter, random_dims, random_packing
+from generator import Crystal
+from tests.test_write_mesh import description
+
+
+class DisorderTests(TestCase):
+    def test_random_packing(self):
+        sites = random_packing(1000, 800, 0, 60, 0.3, spread=0.2,
+                               min_gap=5, seed=4)
+        same_sites = random_packing(1000, 800, 0, 60, 0.3, spread=0.2,
+                                    min_gap=5, seed=4)
+        self.assertEquals(sites.tolist(), same_sites.tolist())
+        area = (numpy.pi * sites['dim_x'] ** 2 / 4).sum()
+        self.assertTrue(0.3 <= area / (1000 * 800) < 0.31)
+        distances = numpy.hypot(sites['x'][:, None] - sites['x'],
+                                sites['y'][:, None] - sites['y'])
+        gaps = distances - (sites['dim_x'][:, None] + sites['dim_x']) / 2
+        numpy.fill_diagonal(gaps, numpy.inf)
+        self.assertTrue(gaps.min() >= 5)
+        self.assertTrue(numpy.all(abs(sites['x']) + sites['dim_x'] / 2
+                                  <= 500))
+
+    def test_disordered_crystal(self):
+        disordered = description()
+        sites = Crystal(**description()).built().sites
+        sites = jitter(sites, 5, disordered['inclusion_types'], seed=1)
+        sites = random_dims(sites, disordered['inclusion_types'], 0.1,
+                            seed=2)
+        disordered['sites'] = sites
+        crystal = Crystal(**disordered).built()
+        self.assertEquals(len(crystal.inclusions), 20)
+        self.assertEquals(crystal.inclusions[3].pos_x, sites['x'][3])
+        self.assertEquals(crystal.inclusions[3].dim_x, sites['dim_x'][3])
+        self.assertNotEquals(crystal.mesh(), Crystal(**description()).mesh())
+
+    def test_no_overlaps(self):
+        disordered = description()
+        types = disordered['inclusion_types']
+        sites = Crystal(**description()).built().sites
+        # Such a noise, or such dimensions, make many inclusions overlap
+        for sites in [jitter(sites, 60, types, min_gap=5, seed=3),
+                      random_dims(sites, types, 0.9, min_gap=5, seed=3)]:
+            disordered['sites'] = sites
+            report = Crystal(**disordered).validate(min_gap=5)
+            self.assertEquals(report.overlaps, [])
+            self.assertEquals(report.too_close, [])
+        self.assertRaises(Exception, jitter, sites, 60, types, min_gap=500,
+                          max_attempts=5)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from generator import Crystal, InclusionType
+from tests.test_write_mesh import description
+
+
+def description_3d():
+    plots = InclusionType(type='plot', shape='rectangle', tag='mat2',
+                          dim_x=80, dim_y=60, dim_z=50, el_size=10)
+    result = description()
+    result['dim_z'] = 200
+    result['inclusion_types'].append(plots)
+    result['inclusion_map'] = [[0, 1, 0, 1, 0]] * 4
+    return result
+
+
+class EstimateTests(TestCase):
+    def test_matrix_only(self):
+        empty = description()
+        empty['nb_x'] = empty['nb_y'] = 0
+        estimate = Crystal(**empty).estimate()
+        self.assertEquals(len(estimate.regions), 1)
+        self.assertEquals(estimate.regions[0].measure, 1e6)
+        self.assertEquals(estimate.nb_elements(),
+                          round(1e6 / (numpy.sqrt(3) / 4 * 25 ** 2)))
+        self.assertEquals(estimate.nb_nodes(),
+                          round(estimate.regions[0].nb_elements / 2))
+
+    def test_estimate_2d(self):
+        estimate = Crystal(**description()).estimate()
+        self.assertEquals([region.tag for region in estimate.regions],
+                          ['mat1'])
+        self.assertAlmostEquals(estimate.regions[0].measure,
+                                1e6 - 20 * numpy.pi * 50 ** 2)
+        # Meshed with the size of the holes around them
+        self.assertTrue(1e6 / (numpy.sqrt(3) / 4 * 25 ** 2)
+                        < estimate.nb_elements()
+                        < 1e6 / (numpy.sqrt(3) / 4 * 20 ** 2))
+
+    def test_estimate_3d(self):
+        estimate = Crystal(**description_3d()).estimate()
+        matrix, plots = estimate.regions
+        self.assertEquals(plots.tag, 'mat2')
+        self.assertAlmostEquals(matrix.measure,
+                                200 * (1e6 - 12 * numpy.pi * 50 ** 2))
+        self.assertAlmostEquals(plots.measure, 8 * 80 * 60 * 50)
+        self.assertAlmostEquals(plots.nb_elements,
+                                plots.measure / 0.223 / 10 ** 3)
+
+    def test_fit_sizes(self):
+        crystal = Crystal(**description_3d())
+        el_size_bulk, el_sizes = crystal.fit_sizes(100000)
+        self.assertEquals(el_sizes[0] / el_size_bulk, 0.8)
+        self.assertEquals(el_sizes[1] / el_size_bulk, 0.4)
+        fitted = description_3d()
+        fitted['el_size_bulk'] = el_size_bulk
+        for type, el_size in zip(fitted['inclusion_types'], el_sizes):
+            type.el_size = el_size
+        self.assertEquals(Crystal(**fitted).estimate().nb_elements(), 100000)
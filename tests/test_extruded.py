@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+
+
+def description():
+    type1 = inclusion_type(type = 'inclusion',
+                           tag = 'mat2',
+                           dim_z = 300)
+    type2 = inclusion_type(type = 'plot',
+                           shape = 'rectangle',
+                           tag = 'mat3',
+                           dim_y = 60,
+                           dim_z = 150,
+                           el_size = 25)
+    return base_description(name = 'Extruded',
+                            dim_x = 500,
+                            dim_y = 300,
+                            dim_z = 300,
+                            periodicity = (True, False, False),
+                            space_x = 250,
+                            space_y = 250,
+                            inclusion_types = [type1, type2],
+                            output_mode = 'extruded',
+                            layers = 6)
+
+
+class ExtrudedTests(GeneratorTestCase):
+    def test_extruded_mesh_3d(self):
+        expected = """//Extruded, created with crystalpy
+size_bulk = 25;
+size_1 = 20;
+size_2 = 25;
+
+Point(1) = {-250.0, 150.0, 0, size_bulk};
+Point(2) = {-250.0, -150.0, 0, size_bulk};
+Point(3) = {250.0, 150.0, 0, size_bulk};
+Point(4) = {250.0, -150.0, 0, size_bulk};
+Point(5) = {-125.0, 0.0, 0, size_1};
+Point(6) = {-175.0, 0.0, 0, size_1};
+Point(7) = {-75.0, 0.0, 0, size_1};
+Point(8) = {-125.0, 50.0, 0, size_1};
+Point(9) = {-125.0, -50.0, 0, size_1};
+Point(10) = {75.0, 30.0, 0, size_2};
+Point(11) = {75.0, -30.0, 0, size_2};
+Point(12) = {175.0, 30.0, 0, size_2};
+Point(13) = {175.0, -30.0, 0, size_2};
+
+Line(1) = {2, 1};
+Line(2) = {1, 3};
+Line(3) = {3, 4};
+Line(4) = {4, 2};
+Periodic Line(1) = {-3};
+Ellipse(6) = {6, 5, 7, 8};
+Ellipse(7) = {8, 5, 9, 7};
+Ellipse(8) = {7, 5, 6, 9};
+Ellipse(9) = {9, 5, 8, 6};
+Line Loop(10) = {6, 7, 8, 9};
+Plane Surface(11) = {10};
+Line(12) = {11, 10};
+Line(13) = {10, 12};
+Line(14) = {12, 13};
+Line(15) = {13, 11};
+Line Loop(16) = {12, 13, 14, 15};
+Plane Surface(17) = {16};
+Line Loop(18) = {1, 2, 3, 4, -6, -7, -8, -9, -12, -13, -14, -15};
+Plane Surface(19) = {18};
+extrusion_20[] = Extrude {0, 0, 300} { Surface{19}; Layers{6}; };
+extrusion_21[] = Extrude {0, 0, 300} { Surface{11}; Layers{6}; };
+extrusion_22[] = Extrude {0, 0, 300} { Surface{17}; Layers{6}; };
+extrusion_23[] = Extrude {0, 0, -150} { Surface{17}; Layers{3}; };
+
+Physical Line("minus_x_bottom") = {1};
+Physical Line("plus_x_bottom") = {3};
+Physical Surface("surface_right") = {extrusion_20[4]};
+Physical Surface("surface_left") = {extrusion_20[2]};
+Physical Volume("mat2") = {extrusion_21[1]};
+Physical Volume("mat3") = {extrusion_23[1]};
+Physical Volume("mat1") = {extrusion_20[1], extrusion_22[1]};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_periodic_extruded_layers(self):
+        arguments = description()
+        arguments['layers'] = None
+        self.assertRaises(AssertionError, Crystal, **arguments)
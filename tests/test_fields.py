@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from fields import BoxRefinement, Refinement
+from generator import Crystal
+
+
+def description(dim_z=0):
+    holes = inclusion_type(dim_z = dim_z, el_size = 50)
+    return base_description(name = 'Fields',
+                            dim_z = dim_z,
+                            el_size_bulk = 50,
+                            inclusion_types = [None, holes],
+                            physical_point_map = [['source',
+                                                   [(-150, 0, 0)]]],
+                            size_fields = [Refinement(5, 50, 10, 60),
+                                           Refinement(2, 50, 5, 40,
+                                                      near='points'),
+                                           BoxRefinement(20, 50, -200, 0,
+                                                         -100, 100)])
+
+
+class FieldsTests(GeneratorTestCase):
+    def test_fields_mesh_2d(self):
+        expected = """\
+//Fields, created with crystalpy
+size_bulk = 50;
+size_1 = 50;
+
+Point(1) = {-150, 0, 0, 50};
+Point(2) = {100.0, 0.0, 0, size_1};
+Point(3) = {50.0, 0.0, 0, size_1};
+Point(4) = {150.0, 0.0, 0, size_1};
+Point(5) = {-200.0, 100.0, 0, size_bulk};
+Point(6) = {-200.0, -100.0, 0, size_bulk};
+Point(7) = {200.0, 100.0, 0, size_bulk};
+Point(8) = {200.0, -100.0, 0, size_bulk};
+
+Circle(1) = {3, 2, 4};
+Circle(2) = {4, 2, 3};
+Line(3) = {6, 5};
+Line(4) = {5, 7};
+Line(5) = {7, 8};
+Line(6) = {8, 6};
+Line Loop(7) = {3, 4, 5, 6, -1, -2};
+Plane Surface(8) = {7};
+Field[9] = Distance;
+Field[9].EdgesList = {1, 2};
+Field[9].NNodesByEdge = 100;
+Field[10] = Threshold;
+Field[10].IField = 9;
+Field[10].LcMin = 5;
+Field[10].LcMax = 50;
+Field[10].DistMin = 10;
+Field[10].DistMax = 60;
+Field[11] = Distance;
+Field[11].NodesList = {1};
+Field[12] = Threshold;
+Field[12].IField = 11;
+Field[12].LcMin = 2;
+Field[12].LcMax = 50;
+Field[12].DistMin = 5;
+Field[12].DistMax = 40;
+Field[13] = Box;
+Field[13].VIn = 20;
+Field[13].VOut = 50;
+Field[13].XMin = -200;
+Field[13].XMax = 0;
+Field[13].YMin = -100;
+Field[13].YMax = 100;
+Field[13].ZMin = 0;
+Field[13].ZMax = 0;
+Field[14] = Min;
+Field[14].FieldsList = {10, 12, 13};
+Background Field = 14;
+
+Physical Point("source") = {1};
+Physical Surface("mat1") = {8};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_fields_mesh_3d(self):
+        mesh = Crystal(**description(100)).mesh()
+        self.assertTrue('Field[37].FacesList = {9, 10};\n' in mesh)
+        self.assertTrue('Background Field = 42;\n' in mesh)
+
+    def test_fields_output_mode(self):
+        scripted = description()
+        scripted['output_mode'] = 'scripted'
+        self.assertRaises(AssertionError, Crystal, **scripted)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from threading import Thread
+from unittest import TestCase
+from generator import Crystal
+from tests.test_write_mesh import description
+
+
+class GeometryTests(TestCase):
+    def test_independent_crystals(self):
+        expected = Crystal(**description()).mesh()
+        shared = description()
+        crystal_1 = Crystal(**shared)
+        crystal_2 = Crystal(**shared)
+        self.assertEquals(crystal_2.mesh(), expected)
+        self.assertEquals(crystal_1.mesh(), expected)
+        self.assertEquals(shared['inclusion_types'][0].el_size, 20)
+
+    def test_concurrent_crystals(self):
+        expected = Crystal(**description()).mesh()
+        results = []
+
+        def build():
+            results.append(Crystal(**description()).mesh())
+
+        threads = [Thread(target=build) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(results, [expected] * 4)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+
+
+def description():
+    holes = inclusion_type()
+    type1 = inclusion_type(type = 'inclusion',
+                           shape = 'rectangle',
+                           tag = 'mat2',
+                           dim_x = 80,
+                           dim_y = 60,
+                           el_size = 15)
+    return base_description(name = 'Instanced',
+                            dim_x = 600,
+                            dim_y = 400,
+                            nb_x = 3,
+                            nb_y = 2,
+                            space_x = 180,
+                            inclusion_map = [[0, 1, 0],
+                                             [1, 0, 1]],
+                            inclusion_types = [holes, type1],
+                            output_mode = 'instanced')
+
+
+class InstancedTests(GeneratorTestCase):
+    def test_instanced_mesh_2d(self):
+        expected = """//Instanced, created with crystalpy
+size_bulk = 25;
+size_1 = 20;
+size_2 = 15;
+
+Point(1) = {-300.0, 200.0, 0, size_bulk};
+Point(2) = {-300.0, -200.0, 0, size_bulk};
+Point(3) = {300.0, 200.0, 0, size_bulk};
+Point(4) = {300.0, -200.0, 0, size_bulk};
+Point(5) = {-180.0, -100.0, 0, size_1};
+Point(6) = {-230.0, -100.0, 0, size_1};
+Point(7) = {-130.0, -100.0, 0, size_1};
+Point(8) = {-180.0, -50.0, 0, size_1};
+Point(9) = {-180.0, -150.0, 0, size_1};
+Point(10) = {-220.0, 130.0, 0, size_2};
+Point(11) = {-220.0, 70.0, 0, size_2};
+Point(12) = {-140.0, 130.0, 0, size_2};
+Point(13) = {-140.0, 70.0, 0, size_2};
+
+Line(1) = {2, 1};
+Line(2) = {1, 3};
+Line(3) = {3, 4};
+Line(4) = {4, 2};
+Ellipse(5) = {6, 5, 7, 8};
+Ellipse(6) = {8, 5, 9, 7};
+Ellipse(7) = {7, 5, 6, 9};
+Ellipse(8) = {9, 5, 8, 6};
+Line(9) = {11, 10};
+Line(10) = {10, 12};
+Line(11) = {12, 13};
+Line(12) = {13, 11};
+copy_13[] = Translate {180.0, -200.0, 0} { Duplicata { Line{9, 10, 11, 12}; } };
+copy_14[] = Translate {180.0, 200.0, 0} { Duplicata { Line{5, 6, 7, 8}; } };
+copy_15[] = Translate {360.0, 0.0, 0} { Duplicata { Line{5, 6, 7, 8}; } };
+copy_16[] = Translate {360.0, 0.0, 0} { Duplicata { Line{9, 10, 11, 12}; } };
+Line Loop(17) = {1, 2, 3, 4, -5, -6, -7, -8, -9, -10, -11, -12, -copy_13[0], -copy_13[1], -copy_13[2], -copy_13[3], -copy_14[0], -copy_14[1], -copy_14[2], -copy_14[3], -copy_15[0], -copy_15[1], -copy_15[2], -copy_15[3], -copy_16[0], -copy_16[1], -copy_16[2], -copy_16[3]};
+Plane Surface(18) = {17};
+Line Loop(19) = {9, 10, 11, 12};
+Plane Surface(20) = {19};
+Line Loop(21) = {copy_13[0], copy_13[1], copy_13[2], copy_13[3]};
+Plane Surface(22) = {21};
+Line Loop(23) = {copy_16[0], copy_16[1], copy_16[2], copy_16[3]};
+Plane Surface(24) = {23};
+
+Physical Surface("mat1") = {18};
+Physical Surface("mat2") = {20, 22, 24};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_instanced_arrays(self):
+        arguments = description()
+        arguments['storage'] = 'arrays'
+        self.assertRaises(AssertionError, Crystal, **arguments)
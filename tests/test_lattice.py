@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from generator import Crystal
+from lattice import lattice_frame, lattice_sites, rectangle_blocks
+from tests.test_write_mesh import description
+
+
+class LatticeTests(TestCase):
+    def test_hexa_sites(self):
+        sites = lattice_sites(3, 2, 100, 80, 0, 0, 'hexa', None)
+        self.assertEquals(sites['x'].tolist(),
+                          [-100.0, -50.0, 0.0, 50.0, 100.0, 150.0])
+        self.assertEquals(sites['y'].tolist(),
+                          [-40.0, 40.0, -40.0, 40.0, -40.0, 40.0])
+
+    def test_honeycomb_sites(self):
+        a = 100
+        vectors = ((a * 3 ** 0.5, 0), (a * 3 ** 0.5 / 2, a * 1.5))
+        basis = [(0, -a / 2), (0, a / 2)]
+        inclusion_map = [[[0, 1], [1, 0]]]
+        sites = lattice_sites(2, 1, None, None, 0, 0, None, inclusion_map,
+                              vectors, basis)
+        self.assertEquals(sites['type'].tolist(), [0, 1, 1, 0])
+        self.assertEquals(sites['basis'].tolist(), [0, 1, 0, 1])
+        distances = numpy.hypot(sites['x'][:, None] - sites['x'],
+                                sites['y'][:, None] - sites['y'])
+        numpy.testing.assert_allclose(distances[[0, 1, 2], [1, 2, 3]],
+                                      [a, 2 * a, a])
+
+    def test_rotation(self):
+        sites = lattice_sites(2, 3, 100, 50, 10, 20, 'square', None,
+                              rotation=90)
+        numpy.testing.assert_allclose(sites['x'], [60, 10, -40,
+                                                   60, 10, -40])
+        numpy.testing.assert_allclose(sites['y'], [-30, -30, -30,
+                                                   70, 70, 70])
+
+    def test_lattice_vectors_mesh(self):
+        oblique = description()
+        oblique['lattice_vectors'] = ((180, 0), (90, 200))
+        crystal = Crystal(**oblique).built()
+        self.assertEquals(len(crystal.inclusions), 20)
+        self.assertEquals(crystal.inclusions[1].pos_x - 90,
+                          crystal.inclusions[0].pos_x)
+        self.assertTrue('Ellipse' not in crystal.mesh())
+
+    def test_lattice_frame(self):
+        arguments = (3, 4, 100, 80, 10, 20, 'hexa', None,
+                     [(0, 0), (30, 10)], 30)
+        sites = lattice_sites(*(arguments[:7] + (None,) + arguments[7:]))
+        origins, a1, a2, shift = lattice_frame(*arguments)
+        origins = numpy.array(origins)[sites['basis']]
+        numpy.testing.assert_allclose(
+            sites['x'], origins[:, 0] + sites['i'] * a1[0]
+            + sites['j'] * a2[0] + (sites['j'] % 2) * shift[0])
+        numpy.testing.assert_allclose(
+            sites['y'], origins[:, 1] + sites['i'] * a1[1]
+            + sites['j'] * a2[1] + (sites['j'] % 2) * shift[1])
+
+    def test_rectangle_blocks(self):
+        mask = [[1, 1, 1, 0],
+                [1, 1, 0, 1],
+                [1, 1, 0, 1]]
+        self.assertEquals(rectangle_blocks(mask),
+                          [(0, 3, 0, 1), (0, 2, 1, 3), (3, 4, 1, 3)])
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+from cStringIO import StringIO
+from generator import Crystal
+from tests.test_write_mesh import description
+
+
+class LazyTests(TestCase):
+    def test_lazy(self):
+        crystal = Crystal(**description())
+        self.assertEquals(crystal.state, None)
+        # Neither a missing attribute nor a description one builds it
+        self.assertFalse(hasattr(crystal, 'inclusions'))
+        self.assertEquals(crystal.nb_x, 5)
+        self.assertEquals(crystal.state, None)
+        self.assertEquals(len(crystal.built().inclusions), 20)
+        self.assertTrue(crystal.built() is crystal.state)
+
+    def test_idempotent(self):
+        crystal = Crystal(**description())
+        geo = crystal.mesh()
+        self.assertTrue(crystal.mesh() is geo)
+        for _ in range(2):
+            result = StringIO()
+            crystal.write_mesh(result)
+            self.assertEquals(result.getvalue(), geo)
+        self.assertTrue(crystal.image() is crystal.image())
+
+    def test_invalidation(self):
+        crystal = Crystal(**description())
+        crystal.mesh()
+        crystal.nb_x = 3
+        self.assertEquals(len(crystal.built().inclusions), 12)
+        smaller = description()
+        smaller['nb_x'] = 3
+        self.assertEquals(crystal.mesh(), Crystal(**smaller).mesh())
+
+    def test_wrong_change(self):
+        crystal = Crystal(**description())
+        geo = crystal.mesh()
+        crystal.output_mode = 'extruded'
+        self.assertRaises(AssertionError, crystal.mesh)
+        # The crystal built before is kept, for the description it had
+        crystal.output_mode = 'explicit'
+        self.assertTrue(crystal.mesh() is geo)
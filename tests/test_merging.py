@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+from merging import SharedEntities, unpaired
+
+
+def description():
+    type1 = inclusion_type(type = 'inclusion',
+                           shape = 'rectangle',
+                           tag = 'mat2',
+                           el_size = 15)
+    return base_description(name = 'Merged',
+                            inclusion_map = [[1, 1]],
+                            inclusion_types = [None, type1],
+                            physical_point_map = [['corners',
+                                                   [(-200, 100, 0),
+                                                    (-50, 50, 0)]]],
+                            physical_line_map = [['edge',
+                                                  [(-150, 50, 0),
+                                                   (-150, -50, 0)]],
+                                                 ['side',
+                                                  [(-200, -100, 0),
+                                                   (-200, 100, 0)]]],
+                            merge_tolerance = 1e-6)
+
+
+class MergingTests(GeneratorTestCase):
+    def test_merged_mesh_2d(self):
+        expected = """\
+//Merged, created with crystalpy
+size_bulk = 25;
+size_1 = 15;
+
+Point(1) = {-200, 100, 0, 25};
+Point(2) = {-50, 50, 0, 25};
+Point(3) = {-150, -50, 0, 25};
+Point(4) = {-150, 50, 0, 25};
+Point(5) = {-200, -100, 0, 25};
+Point(6) = {-50.0, -50.0, 0, size_1};
+Point(7) = {50.0, 50.0, 0, size_1};
+Point(8) = {50.0, -50.0, 0, size_1};
+Point(9) = {150.0, 50.0, 0, size_1};
+Point(10) = {150.0, -50.0, 0, size_1};
+Point(11) = {200.0, 100.0, 0, size_bulk};
+Point(12) = {200.0, -100.0, 0, size_bulk};
+
+Line(1) = {3, 4};
+Line(2) = {1, 5};
+Line(3) = {4, 2};
+Line(4) = {2, 6};
+Line(5) = {6, 3};
+Line(6) = {8, 7};
+Line(7) = {7, 9};
+Line(8) = {9, 10};
+Line(9) = {10, 8};
+Line(10) = {1, 11};
+Line(11) = {11, 12};
+Line(12) = {12, 5};
+Line Loop(13) = {-2, 10, 11, 12, -1, -3, -4, -5, -6, -7, -8, -9};
+Plane Surface(14) = {13};
+Line Loop(15) = {1, 3, 4, 5};
+Plane Surface(16) = {15};
+Line Loop(17) = {6, 7, 8, 9};
+Plane Surface(18) = {17};
+
+Physical Point("corners") = {1, 2};
+Physical Line("edge") = {1};
+Physical Line("side") = {2};
+Physical Surface("mat1") = {14};
+Physical Surface("mat2") = {16, 18};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_merged_count(self):
+        merged = Crystal(**description()).mesh()
+        separate = description()
+        separate['merge_tolerance'] = None
+        separate = Crystal(**separate).mesh()
+        self.assertEquals(separate.count('\nPoint('), 18)
+        self.assertEquals(merged.count('\nPoint('), 12)
+        self.assertEquals(merged.count('\nLine('), 12)
+        self.assertEquals(separate.count('In Surface'), 2)
+        self.assertEquals(merged.count('In Surface'), 0)
+
+    def test_shared_entities(self):
+        shared = SharedEntities(0.1)
+        shared.add_point(0.19, 0, 0, 1)
+        self.assertEquals(shared.find_point(0.21, -0.05, 0.05), 1)
+        self.assertEquals(shared.find_point(0.3, 0, 0), None)
+        shared.add_line(1, 2, 3)
+        self.assertEquals(shared.find_line(1, 2), 3)
+        self.assertEquals(shared.find_line(2, 1), -3)
+        self.assertEquals(shared.find_line(1, 3), None)
+        self.assertEquals(unpaired([1, 2, -1, 3, 2]), [3])
+
+    def test_touching_3d(self):
+        # The holes have no top and bottom faces
+        for type, nb_surfaces in [('inclusion', 22), ('hole', 16)]:
+            rectangles = inclusion_type(type = type,
+                                        shape = 'rectangle',
+                                        tag = 'mat2',
+                                        dim_z = 100)
+            touching = base_description(name = 'Touching',
+                                        dim_x = 500,
+                                        dim_z = 100,
+                                        nb_x = 3,
+                                        space_x = 100,
+                                        inclusion_map = None,
+                                        inclusion_types = [rectangles],
+                                        merge_tolerance = 1e-6)
+            mesh = Crystal(**touching).mesh()
+            # The two sides between the rectangles are only written once
+            self.assertEquals(mesh.count('\nPlane Surface('), nb_surfaces)
+            for line in mesh.splitlines():
+                if 'Loop(' in line:
+                    ids = [abs(int(entity_id)) for entity_id
+                           in line.split('{')[1].rstrip('};').split(',')]
+                    self.assertEquals(len(ids), len(set(ids)))
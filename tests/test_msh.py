@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+from cStringIO import StringIO
+import numpy
+from tests import base_description, inclusion_type
+from generator import Crystal
+from msh import BlockMesh
+
+
+def description(dim_z=0):
+    type1 = inclusion_type(type = 'inclusion',
+                           shape = 'rectangle',
+                           tag = 'mat2',
+                           dim_x = 10,
+                           dim_y = 10,
+                           dim_z = dim_z,
+                           el_size = 10)
+    return base_description(name = 'Native',
+                            dim_x = 30,
+                            dim_y = 10,
+                            dim_z = dim_z,
+                            periodicity = (True, False, False),
+                            nb_x = 1,
+                            space_x = 10,
+                            space_y = 10,
+                            el_size_bulk = 10,
+                            inclusion_map = [[1]],
+                            inclusion_types = [None, type1])
+
+
+class MshTests(TestCase):
+    def test_msh_2d(self):
+        expected = """\
+$MeshFormat
+2.2 0 8
+$EndMeshFormat
+$PhysicalNames
+4
+2 1 "mat1"
+2 2 "mat2"
+1 3 "minus_x"
+1 4 "plus_x"
+$EndPhysicalNames
+$Nodes
+8
+1 -15 -5 0
+2 -5 -5 0
+3 5 -5 0
+4 15 -5 0
+5 -15 5 0
+6 -5 5 0
+7 5 5 0
+8 15 5 0
+$EndNodes
+$Elements
+5
+1 1 2 3 3 1 5
+2 1 2 4 4 4 8
+3 3 2 1 1 1 2 6 5
+4 3 2 2 2 2 3 7 6
+5 3 2 1 1 3 4 8 7
+$EndElements
+$Periodic
+1
+1 4 3
+2
+4 1
+8 5
+$EndPeriodic
+"""
+        result = StringIO()
+        Crystal(**description()).write_msh(result)
+        self.assertEquals(result.getvalue(), expected)
+
+    def test_msh_binary(self):
+        result = StringIO()
+        Crystal(**description()).write_msh(result, binary=True)
+        self.assertTrue(result.getvalue().startswith(
+            "$MeshFormat\n2.2 1 8\n\x01\x00\x00\x00\n$EndMeshFormat\n"))
+        self.assertTrue("$Nodes\n8\n" in result.getvalue())
+
+    def test_msh_3d(self):
+        result = StringIO()
+        Crystal(**description(10)).write_msh(result, simplices=True)
+        self.assertTrue('3 1 "mat1"\n' in result.getvalue())
+        self.assertTrue('2 3 "surface_left"\n' in result.getvalue())
+        self.assertTrue("$Elements\n22\n" in result.getvalue())
+
+    def test_tetrahedra(self):
+        mesh = BlockMesh([[0, 1, 3], [0, 1, 2], [0, 1]], [[2, 3], [2, 2], [2]],
+                         [[[1], [0]], [[2], [2]]], simplices=True)
+        coordinates = numpy.zeros((mesh.nb_nodes + 1, 3))
+        for chunk in mesh.nodes():
+            for index, name in enumerate('xyz'):
+                coordinates[chunk['number'], index] = chunk[name]
+        volume = 0
+        for element_type, labels, nodes in mesh.elements():
+            corners = coordinates[nodes]
+            volumes = numpy.einsum('ij,ij->i',
+                                   numpy.cross(corners[:, 1] - corners[:, 0],
+                                               corners[:, 2] - corners[:, 0]),
+                                   corners[:, 3] - corners[:, 0]) / 6
+            self.assertTrue((volumes > 0).all())
+            volume += volumes.sum()
+        # The block [0, 1] x [1, 2] x [0, 1] is empty
+        self.assertAlmostEquals(volume, 5)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+
+
+def description(dim_z=0, dim_z_inclusions=0):
+    holes = inclusion_type(dim_z = dim_z_inclusions)
+    type1 = inclusion_type(type = 'inclusion',
+                           tag = 'mat2',
+                           dim_x = 60,
+                           dim_z = dim_z_inclusions,
+                           el_size = 15)
+    return base_description(name = 'Occ',
+                            dim_x = 500,
+                            dim_y = 300,
+                            dim_z = dim_z,
+                            periodicity = (True, False, False),
+                            space_x = 250,
+                            space_y = 250,
+                            inclusion_map = [[1, 0]],
+                            inclusion_types = [holes, type1],
+                            basis = [(0, 0), (125, 0)],
+                            output_mode = 'occ')
+
+
+class OccTests(GeneratorTestCase):
+    def test_occ_mesh_2d(self):
+        expected = """\
+//Occ, created with crystalpy
+SetFactory("OpenCASCADE");
+size_bulk = 25;
+size_1 = 20;
+size_2 = 15;
+
+
+Rectangle(1) = {-250.0, -150.0, 0, 500, 300};
+Disk(2) = {-125.0, 0.0, 0, 50.0, 30.0};
+Rotate {{0, 0, 1}, {-125.0, 0.0, 0}, Pi / 2} { Surface{2}; }
+Disk(3) = {0.0, 0.0, 0, 50.0, 30.0};
+Rotate {{0, 0, 1}, {0.0, 0.0, 0}, Pi / 2} { Surface{3}; }
+Disk(4) = {125.0, 0.0, 0, 50.0};
+Disk(5) = {250.0, 0.0, 0, 50.0};
+Characteristic Length{ PointsOf{ Surface{1}; } } = size_bulk;
+Characteristic Length{ PointsOf{ Surface{2, 3}; } } = size_2;
+Characteristic Length{ PointsOf{ Surface{4, 5}; } } = size_1;
+clip_9() = BooleanIntersection{ Surface{5}; Delete; }{ Surface{1}; };
+matrix() = BooleanDifference{ Surface{1}; Delete; }{ Surface{4, clip_9()}; Delete; };
+BooleanFragments{ Surface{matrix()}; Delete; }{ Surface{2, 3}; Delete; }
+matrix() = Surface{:};
+matrix() -= {2, 3};
+plus_x() = Curve In BoundingBox{249.9995, -150.0005, -0.0005, 250.0005, 150.0005, 0.0005};
+minus_x() = Curve In BoundingBox{-250.0005, -150.0005, -0.0005, -249.9995, 150.0005, 0.0005};
+For index In {0:#minus_x() - 1}
+  box() = BoundingBox Curve{minus_x(index)};
+  copies() = Curve In BoundingBox{box(0) + 500 - 0.0005, box(1) + 0 - 0.0005, box(2) + 0 - 0.0005, box(3) + 500 + 0.0005, box(4) + 0 + 0.0005, box(5) + 0 + 0.0005};
+  For copy In {0:#copies() - 1}
+    copy_box() = BoundingBox Curve{copies(copy)};
+    If (Fabs(copy_box(0) - box(0) - 500) < 0.0005 && Fabs(copy_box(1) - box(1) - 0) < 0.0005 && Fabs(copy_box(3) - box(3) - 500) < 0.0005 && Fabs(copy_box(4) - box(4) - 0) < 0.0005)
+      Periodic Curve{copies(copy)} = {minus_x(index)} Translate {500, 0, 0};
+    EndIf
+  EndFor
+EndFor
+
+Physical Surface("mat1") = {matrix()};
+Physical Surface("mat2") = {2, 3};
+Physical Line("plus_x") = {plus_x()};
+Physical Line("minus_x") = {minus_x()};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_occ_mesh_3d(self):
+        geo = Crystal(**description(200, 100)).mesh()
+        self.assertEquals(geo.count('Cylinder('), 4)
+        self.assertEquals(geo.count('Dilate'), 2)
+        self.assertTrue('Box(1) = {-250.0, -150.0, 0, 500, 300, 200};'
+                        in geo)
+        self.assertTrue('Physical Volume("mat2") = {2, 3};' in geo)
+
+    def test_occ_arrays(self):
+        for dim_z, dim_z_inclusions in [(0, 0), (200, 100)]:
+            arrays = description(dim_z, dim_z_inclusions)
+            arrays['storage'] = 'arrays'
+            self.assertEquals(
+                Crystal(**arrays).mesh(),
+                Crystal(**description(dim_z, dim_z_inclusions)).mesh())
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from generator import Crystal
+from ordering import curve_order, hilbert_keys, morton_keys
+from tests.test_write_mesh import description
+
+
+def grid_cells(size):
+    ix, iy = numpy.meshgrid(numpy.arange(size), numpy.arange(size))
+    return ix.ravel().astype(numpy.uint64), iy.ravel().astype(numpy.uint64)
+
+
+class OrderingTests(TestCase):
+    def test_hilbert_keys(self):
+        ix, iy = grid_cells(8)
+        keys = hilbert_keys(ix, iy, 3)
+        self.assertEquals(sorted(keys.tolist()), range(64))
+        # Each cell is a neighbour of the previous one along the curve
+        order = numpy.argsort(keys)
+        steps = (abs(numpy.diff(ix[order].astype(int)))
+                 + abs(numpy.diff(iy[order].astype(int))))
+        self.assertEquals(steps.tolist(), [1] * 63)
+
+    def test_morton_keys(self):
+        ix, iy = grid_cells(4)
+        self.assertEquals(morton_keys(ix, iy).reshape(4, 4).tolist(),
+                          [[0, 1, 4, 5], [2, 3, 6, 7],
+                           [8, 9, 12, 13], [10, 11, 14, 15]])
+
+    def test_curve_order(self):
+        x = numpy.array([3., 0., 3., 0.])
+        y = numpy.array([3., 0., 0., 3.])
+        self.assertEquals(curve_order(x, y, 'hilbert').tolist(), [1, 3, 0, 2])
+        self.assertEquals(curve_order(x, y, 'morton').tolist(), [1, 2, 3, 0])
+
+    def test_site_order(self):
+        square = description()
+        square['crystal_shape'] = 'square'
+        square['nb_x'] = square['nb_y'] = 4
+        ordered = square.copy()
+        ordered['site_order'] = 'hilbert'
+        crystal = Crystal(**ordered).built()
+        x = numpy.array([inclusion.pos_x for inclusion in crystal.inclusions])
+        y = numpy.array([inclusion.pos_y for inclusion in crystal.inclusions])
+        steps = numpy.hypot(numpy.diff(x) / 180, numpy.diff(y) / 200)
+        numpy.testing.assert_allclose(steps, 1)
+        self.assertEquals(len(crystal.mesh()), len(Crystal(**square).mesh()))
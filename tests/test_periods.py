@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from generator import Crystal
+from lattice import SparseMap
+from periods import map_periods, smallest_period
+from tests.test_write_mesh import description
+
+
+def tiled_description():
+    result = description()
+    result['crystal_shape'] = 'square'
+    result['nb_x'] = result['nb_y'] = 6
+    result['space_x'] = result['space_y'] = 150
+    result['dim_x'] = result['dim_y'] = 900
+    result['inclusion_types'] = [None] + result['inclusion_types']
+    result['inclusion_map'] = numpy.tile([[1, 0, 1], [1, 1, 1]], (3, 2))
+    result['physical_point_map'] = []
+    result['unit_cell'] = True
+    return result
+
+
+class PeriodsTests(TestCase):
+    def test_smallest_period(self):
+        self.assertEquals(smallest_period([1, 2, 1, 2, 1, 2], 0), 2)
+        self.assertEquals(smallest_period([1, 2, 1, 2, 1], 0), 5)
+        self.assertEquals(smallest_period([[1, 1], [2, 2]] * 2, 0, 2), 2)
+        self.assertEquals(smallest_period([[3, 3]] * 4, 0, 2), 2)
+
+    def test_map_periods(self):
+        types = numpy.tile([[1, 0, 1], [1, 1, 1]], (3, 2))
+        self.assertEquals(map_periods(types, 6, 6, 'square'), (3, 2))
+        self.assertEquals(map_periods(None, 6, 6, 'square'), (1, 1))
+        # The rows of hexagonal crystals only repeat every other row
+        self.assertEquals(map_periods(None, 6, 6, 'hexa'), (1, 2))
+        self.assertEquals(map_periods(None, 6, 5, 'hexa'), (1, 5))
+
+    def test_unit_cell(self):
+        crystal = Crystal(**tiled_description())
+        built = crystal.built()
+        self.assertEquals((built.nb_x, built.nb_y), (3, 2))
+        self.assertEquals((built.dim_x, built.dim_y), (450, 300))
+        self.assertEquals(len(built.inclusions), 5)
+        self.assertTrue('Periodic Line' in crystal.mesh())
+        # The description is left as given
+        self.assertEquals((crystal.nb_x, crystal.dim_x), (6, 900))
+
+    def test_sparse_map(self):
+        sparse = tiled_description()
+        sparse['inclusion_map'] = SparseMap(1)
+        crystal = Crystal(**sparse).built()
+        self.assertEquals((crystal.nb_x, crystal.nb_y), (1, 1))
+        self.assertEquals(crystal.dim_x, 150)
+
+    def test_unreduced_axes(self):
+        bordered = tiled_description()
+        bordered['periodicity'] = (False, True, False)
+        bordered['dim_y'] = 1000
+        crystal = Crystal(**bordered).built()
+        self.assertEquals((crystal.nb_x, crystal.nb_y), (6, 6))
+        self.assertEquals((crystal.dim_x, crystal.dim_y), (900, 1000))
+
+    def test_physical_points(self):
+        points = tiled_description()
+        points['physical_point_map'] = [('PointSource', [(0, 0, 0)])]
+        self.assertRaises(AssertionError, Crystal, **points)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+from cStringIO import StringIO
+from generator import Crystal
+from reader import GeoDiff, read_geo
+from tests.test_sections import sectioned_description
+from tests.test_write_mesh import description
+
+
+def read_crystal(description):
+    return read_geo(StringIO(Crystal(**description).mesh()))
+
+
+class ReaderTests(TestCase):
+    def test_read(self):
+        text = Crystal(**description()).mesh()
+        geo = read_geo(StringIO(text))
+        self.assertEquals(geo.nb_entities('Point'), 65)
+        self.assertEquals(geo.nb_entities('Circle'), 40)
+        self.assertEquals(geo.nb_entities('Plane Surface'), 1)
+        self.assertEquals(geo.values['size_1'], '20')
+        # The sizes given by name are resolved
+        self.assertEquals(sorted(set(geo.sizes.tolist())), [20, 25])
+        self.assertEquals(len(geo.periodic), 2)
+        self.assertEquals(geo.others, [])
+        loop = geo.kinds.tolist().index(3)
+        refs = geo.refs[geo.offsets[loop]:geo.offsets[loop + 1]]
+        self.assertTrue('Line Loop(%d) = {%s};'
+                        % (geo.entity_ids[loop],
+                           ', '.join(map(str, refs.tolist()))) in text)
+
+    def test_renumbered(self):
+        sectioned = sectioned_description()
+        plain = sectioned_description()
+        plain['storage'] = 'objects'
+        diff = GeoDiff(read_crystal(sectioned), read_crystal(plain))
+        self.assertTrue(diff.same())
+        self.assertEquals(diff.summary(), [])
+
+    def test_changed_inclusion(self):
+        edited = sectioned_description()
+        edited['inclusion_map'] = [[0, 0, 0, 1, 0]] + [[0, 1, 0, 1, 0]] * 3
+        diff = GeoDiff(read_crystal(sectioned_description()),
+                       read_crystal(edited))
+        self.assertFalse(diff.same())
+        self.assertEquals(len(diff.removed['Volume']), 2)
+        self.assertEquals(len(diff.added['Volume']), 1)
+        self.assertTrue(('Volume', 'mat2') in diff.physical)
+        self.assertEquals(diff.values, [])
+
+    def test_other_modes(self):
+        for output_mode, dim_z in [('instanced', 0), ('instanced', 300),
+                                   ('scripted', 0)]:
+            other = description()
+            other['output_mode'] = output_mode
+            other['dim_z'] = dim_z
+            geo = read_crystal(other)
+            self.assertEquals(len(geo.refs), geo.offsets[-1])
+            self.assertTrue(GeoDiff(geo, geo).same())
+            # The statements referring to copies or variables are kept
+            self.assertTrue([line for line in geo.others
+                             if line.startswith('Line Loop(')])
+        self.assertTrue('Physical Surface("mat1") = {matrix_surface};'
+                        in geo.others)
+        self.assertEquals(geo.nb_entities('Circle'), 0)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+
+
+def description():
+    holes = inclusion_type(dim_y = 60)
+    type1 = inclusion_type(type = 'inclusion',
+                           tag = 'mat2',
+                           dim_x = 80,
+                           dim_y = 80,
+                           el_size = 15)
+    return base_description(name = 'Scripted',
+                            dim_x = 800,
+                            dim_y = 600,
+                            nb_x = 3,
+                            nb_y = 2,
+                            crystal_shape = 'hexa',
+                            inclusion_map = [[0, 0, 0],
+                                             [0, 1, 0]],
+                            inclusion_types = [holes, type1],
+                            output_mode = 'scripted')
+
+
+class ScriptedTests(GeneratorTestCase):
+    def test_scripted_mesh_2d(self):
+        expected = """//Scripted, created with crystalpy
+size_bulk = 25;
+size_1 = 20;
+size_2 = 15;
+
+Point(1) = {-400.0, 300.0, 0, size_bulk};
+Point(2) = {-400.0, -300.0, 0, size_bulk};
+Point(3) = {400.0, 300.0, 0, size_bulk};
+Point(4) = {400.0, -300.0, 0, size_bulk};
+Point(5) = {-100.0, 100.0, 0, size_1};
+Point(6) = {-150.0, 100.0, 0, size_1};
+Point(7) = {-50.0, 100.0, 0, size_1};
+Point(8) = {-100.0, 130.0, 0, size_1};
+Point(9) = {-100.0, 70.0, 0, size_1};
+Point(10) = {100.0, 100.0, 0, size_2};
+Point(11) = {60.0, 100.0, 0, size_2};
+Point(12) = {140.0, 100.0, 0, size_2};
+Point(13) = {300.0, 100.0, 0, size_1};
+Point(14) = {250.0, 100.0, 0, size_1};
+Point(15) = {350.0, 100.0, 0, size_1};
+Point(16) = {300.0, 130.0, 0, size_1};
+Point(17) = {300.0, 70.0, 0, size_1};
+
+Line(1) = {2, 1};
+Line(2) = {1, 3};
+Line(3) = {3, 4};
+Line(4) = {4, 2};
+Ellipse(5) = {6, 5, 7, 8};
+Ellipse(6) = {8, 5, 9, 7};
+Ellipse(7) = {7, 5, 6, 9};
+Ellipse(8) = {9, 5, 8, 6};
+Circle(9) = {11, 10, 12};
+Circle(10) = {12, 10, 11};
+Line Loop(11) = {9, 10};
+Plane Surface(12) = {11};
+Ellipse(13) = {14, 13, 15, 16};
+Ellipse(14) = {16, 13, 17, 15};
+Ellipse(15) = {15, 13, 14, 17};
+Ellipse(16) = {17, 13, 16, 14};
+inclusion_lines[] = {};
+Macro inclusion_0
+  p = newp;
+  Point(p) = {x, y, 0, size_1};
+  Point(p + 1) = {x - 50.0, y, 0, size_1};
+  Point(p + 2) = {x + 50.0, y, 0, size_1};
+  Point(p + 3) = {x, y + 30.0, 0, size_1};
+  Point(p + 4) = {x, y - 30.0, 0, size_1};
+  l = newl;
+  Ellipse(l) = {p + 1, p, p + 2, p + 3};
+  Ellipse(l + 1) = {p + 3, p, p + 4, p + 2};
+  Ellipse(l + 2) = {p + 2, p, p + 1, p + 4};
+  Ellipse(l + 3) = {p + 4, p, p + 3, p + 1};
+  inclusion_lines[] += {l, l + 1, l + 2, l + 3};
+Return
+For i In {0:2}
+  For j In {0:0}
+    x = -200.0 + 200 * i + 100.0 * (j % 2);
+    y = -100.0 + 200 * j;
+    Call inclusion_0;
+  EndFor
+EndFor
+matrix_loop = newll;
+Line Loop(matrix_loop) = {1, 2, 3, 4, -5, -6, -7, -8, -9, -10, -13, -14, -15, -16, -inclusion_lines[]};
+matrix_surface = news;
+Plane Surface(matrix_surface) = {matrix_loop};
+
+Physical Surface("mat1") = {matrix_surface};
+Physical Surface("mat2") = {12};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_scripted_size(self):
+        small = description()
+        small['inclusion_map'] = None
+        large = description()
+        large.update(nb_x=30, nb_y=20, dim_x=8000, dim_y=6000,
+                     inclusion_map=None)
+        self.assertEquals(Crystal(**large).mesh().count('\n'),
+                          Crystal(**small).mesh().count('\n'))
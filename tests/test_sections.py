@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import os
+import re
+import shutil
+import tempfile
+from generator import Crystal
+from tests.test_estimate import description_3d
+from watch import regenerate
+
+
+def sectioned_description():
+    result = description_3d()
+    result['crystal_shape'] = 'square'
+    result['storage'] = 'sections'
+    return result
+
+
+def site_points(geo, slot):
+    """The lines defining the points of the section of a site."""
+    return re.findall(r'Point\(%d\d{3}\) = .*' % slot, geo)
+
+
+class SectionsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stable_ids(self):
+        crystal = Crystal(**sectioned_description())
+        geo = crystal.mesh()
+        # The site (1, 0) holds a plot
+        self.assertEquals(len(site_points(geo, 2)), 8)
+        crystal.inclusion_map = [[0, 0, 0, 1, 0]] + [[0, 1, 0, 1, 0]] * 3
+        edited = crystal.mesh()
+        self.assertEquals(len(site_points(edited, 2)), 6)
+        for slot in [1] + range(3, 21):
+            self.assertEquals(site_points(edited, slot),
+                              site_points(geo, slot))
+
+    def test_write_sections(self):
+        crystal = Crystal(**sectioned_description())
+        written = crystal.write_sections(self.directory)
+        self.assertEquals(written,
+                          ['WriteMesh_values.geo', 'WriteMesh_maps.geo',
+                           'WriteMesh_sites_0.geo', 'WriteMesh_matrix.geo',
+                           'WriteMesh_physical.geo', 'WriteMesh.geo'])
+        main = open(os.path.join(self.directory, 'WriteMesh.geo')).read()
+        self.assertTrue('Include "WriteMesh_matrix.geo";' in main)
+        self.assertEquals(crystal.write_sections(self.directory), [])
+        # The points refer to the sizes by their names
+        finer = sectioned_description()
+        finer['inclusion_types'][1].el_size = 8
+        self.assertEquals(Crystal(**finer).write_sections(self.directory),
+                          ['WriteMesh_values.geo'])
+
+    def test_explicit_only(self):
+        instanced = sectioned_description()
+        instanced['output_mode'] = 'instanced'
+        self.assertRaises(AssertionError, Crystal, **instanced)
+
+    def test_regenerate(self):
+        path = os.path.join(self.directory, 'crystal.py')
+        description_file = open(path, 'w')
+        description_file.write(
+            "from tests.test_write_mesh import description as base\n"
+            "description = base()\n")
+        description_file.close()
+        written = regenerate(path, self.directory)
+        self.assertTrue('WriteMesh.geo' in written)
+        self.assertEquals(regenerate(path, self.directory), [])
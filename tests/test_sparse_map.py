@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+import numpy
+from generator import Crystal
+from lattice import SparseMap
+from tests.test_write_mesh import description
+
+
+class SparseMapTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lookup(self):
+        sparse = SparseMap(1)
+        mask = numpy.zeros((4, 5), dtype=bool)
+        mask[2, :] = True
+        sparse.add_mask(mask, 0)
+        sparse.add([1, 3], 2, 2)
+        sparse.add(4, 0, 3)
+        dense = numpy.ones((4, 5), dtype=int)
+        dense[2, :] = 0
+        dense[2, [1, 3]] = 2
+        dense[0, 4] = 3
+        ii, jj = numpy.meshgrid(numpy.arange(5), numpy.arange(4))
+        self.assertEquals(
+            sparse.lookup(ii.ravel(), jj.ravel(), 5, 4).tolist(),
+            dense.ravel().tolist())
+
+    def test_load(self):
+        rows = numpy.array([[0, 1, 0], [3, 2, 0]])
+        path_npy = os.path.join(self.directory, 'defects.npy')
+        path_csv = os.path.join(self.directory, 'defects.csv')
+        numpy.save(path_npy, rows)
+        numpy.savetxt(path_csv, rows, fmt='%d', delimiter=',')
+        for path in [path_npy, path_csv]:
+            sparse = SparseMap.load(path, 1)
+            self.assertEquals(
+                sparse.lookup(numpy.array([0, 1, 3]), numpy.array([1, 1, 2]),
+                              5, 4).tolist(),
+                [0, 1, 0])
+
+    def test_sparse_mesh(self):
+        dense = description()
+        dense['inclusion_types'] = [None] + dense['inclusion_types']
+        dense['inclusion_map'] = [[1, 1, 1, 1, 1],
+                                  [0, 0, 0, 0, 0],
+                                  [1, 1, 0, 1, 1],
+                                  [1, 1, 1, 1, 1]]
+        sparse = description()
+        sparse['inclusion_types'] = dense['inclusion_types']
+        sparse['inclusion_map'] = SparseMap(1, range(5) + [2],
+                                            [1] * 5 + [2], 0)
+        self.assertEquals(Crystal(**sparse).mesh(), Crystal(**dense).mesh())
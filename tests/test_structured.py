@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+import numpy
+from generator import Crystal
+from structured import block_grid, nb_nodes
+
+
+def description(dim_z=0):
+    holes = inclusion_type(shape = 'rectangle', dim_z = dim_z)
+    type1 = inclusion_type(type = 'inclusion',
+                           shape = 'rectangle',
+                           tag = 'mat2',
+                           dim_y = 50,
+                           dim_z = dim_z,
+                           el_size = 25)
+    return base_description(name = 'Structured',
+                            dim_z = dim_z,
+                            periodicity = (True, False, False),
+                            el_size_bulk = 50,
+                            inclusion_types = [holes, type1],
+                            output_mode = 'structured')
+
+
+class StructuredTests(GeneratorTestCase):
+    def test_structured_mesh_2d(self):
+        expected = """\
+//Structured, created with crystalpy
+size_bulk = 50;
+size_1 = 20;
+size_2 = 25;
+
+Point(1) = {-200.0, -100.0, 0, size_bulk};
+Point(2) = {-200.0, -50.0, 0, size_bulk};
+Point(3) = {-200.0, -25.0, 0, size_bulk};
+Point(4) = {-200.0, 25.0, 0, size_bulk};
+Point(5) = {-200.0, 50.0, 0, size_bulk};
+Point(6) = {-200.0, 100.0, 0, size_bulk};
+Point(7) = {-150.0, -100.0, 0, size_bulk};
+Point(8) = {-150.0, -50.0, 0, size_bulk};
+Point(9) = {-150.0, -25.0, 0, size_bulk};
+Point(10) = {-150.0, 25.0, 0, size_bulk};
+Point(11) = {-150.0, 50.0, 0, size_bulk};
+Point(12) = {-150.0, 100.0, 0, size_bulk};
+Point(13) = {-50.0, -100.0, 0, size_bulk};
+Point(14) = {-50.0, -50.0, 0, size_bulk};
+Point(15) = {-50.0, -25.0, 0, size_bulk};
+Point(16) = {-50.0, 25.0, 0, size_bulk};
+Point(17) = {-50.0, 50.0, 0, size_bulk};
+Point(18) = {-50.0, 100.0, 0, size_bulk};
+Point(19) = {50.0, -100.0, 0, size_bulk};
+Point(20) = {50.0, -50.0, 0, size_bulk};
+Point(21) = {50.0, -25.0, 0, size_bulk};
+Point(22) = {50.0, 25.0, 0, size_bulk};
+Point(23) = {50.0, 50.0, 0, size_bulk};
+Point(24) = {50.0, 100.0, 0, size_bulk};
+Point(25) = {150.0, -100.0, 0, size_bulk};
+Point(26) = {150.0, -50.0, 0, size_bulk};
+Point(27) = {150.0, -25.0, 0, size_bulk};
+Point(28) = {150.0, 25.0, 0, size_bulk};
+Point(29) = {150.0, 50.0, 0, size_bulk};
+Point(30) = {150.0, 100.0, 0, size_bulk};
+Point(31) = {200.0, -100.0, 0, size_bulk};
+Point(32) = {200.0, -50.0, 0, size_bulk};
+Point(33) = {200.0, -25.0, 0, size_bulk};
+Point(34) = {200.0, 25.0, 0, size_bulk};
+Point(35) = {200.0, 50.0, 0, size_bulk};
+Point(36) = {200.0, 100.0, 0, size_bulk};
+
+Line(1) = {1, 7};
+Line(2) = {2, 8};
+Line(3) = {3, 9};
+Line(4) = {4, 10};
+Line(5) = {5, 11};
+Line(6) = {6, 12};
+Line(7) = {7, 13};
+Line(8) = {8, 14};
+Line(9) = {11, 17};
+Line(10) = {12, 18};
+Line(11) = {13, 19};
+Line(12) = {14, 20};
+Line(13) = {15, 21};
+Line(14) = {16, 22};
+Line(15) = {17, 23};
+Line(16) = {18, 24};
+Line(17) = {19, 25};
+Line(18) = {20, 26};
+Line(19) = {21, 27};
+Line(20) = {22, 28};
+Line(21) = {23, 29};
+Line(22) = {24, 30};
+Line(23) = {25, 31};
+Line(24) = {26, 32};
+Line(25) = {27, 33};
+Line(26) = {28, 34};
+Line(27) = {29, 35};
+Line(28) = {30, 36};
+Line(29) = {1, 2};
+Line(30) = {2, 3};
+Line(31) = {3, 4};
+Line(32) = {4, 5};
+Line(33) = {5, 6};
+Line(34) = {7, 8};
+Line(35) = {8, 9};
+Line(36) = {9, 10};
+Line(37) = {10, 11};
+Line(38) = {11, 12};
+Line(39) = {13, 14};
+Line(40) = {14, 15};
+Line(41) = {15, 16};
+Line(42) = {16, 17};
+Line(43) = {17, 18};
+Line(44) = {19, 20};
+Line(45) = {20, 21};
+Line(46) = {21, 22};
+Line(47) = {22, 23};
+Line(48) = {23, 24};
+Line(49) = {25, 26};
+Line(50) = {26, 27};
+Line(51) = {27, 28};
+Line(52) = {28, 29};
+Line(53) = {29, 30};
+Line(54) = {31, 32};
+Line(55) = {32, 33};
+Line(56) = {33, 34};
+Line(57) = {34, 35};
+Line(58) = {35, 36};
+Transfinite Line{1, 2, 3, 4, 5, 6, 23, 24, 25, 26, 27, 28, 29, 30, 32, 33, 34, 35, 37, 38, 39, 40, 42, 43, 44, 45, 47, 48, 49, 50, 52, 53, 54, 55, 57, 58} = 2;
+Transfinite Line{7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 31, 36, 41, 46, 51, 56} = 3;
+Transfinite Line{17, 18, 19, 20, 21, 22} = 5;
+Line Loop(62) = {1, 34, -2, -29};
+Plane Surface(63) = {62};
+Line Loop(64) = {2, 35, -3, -30};
+Plane Surface(65) = {64};
+Line Loop(66) = {3, 36, -4, -31};
+Plane Surface(67) = {66};
+Line Loop(68) = {4, 37, -5, -32};
+Plane Surface(69) = {68};
+Line Loop(70) = {5, 38, -6, -33};
+Plane Surface(71) = {70};
+Line Loop(72) = {7, 39, -8, -34};
+Plane Surface(73) = {72};
+Line Loop(74) = {9, 43, -10, -38};
+Plane Surface(75) = {74};
+Line Loop(76) = {11, 44, -12, -39};
+Plane Surface(77) = {76};
+Line Loop(78) = {12, 45, -13, -40};
+Plane Surface(79) = {78};
+Line Loop(80) = {13, 46, -14, -41};
+Plane Surface(81) = {80};
+Line Loop(82) = {14, 47, -15, -42};
+Plane Surface(83) = {82};
+Line Loop(84) = {15, 48, -16, -43};
+Plane Surface(85) = {84};
+Line Loop(86) = {17, 49, -18, -44};
+Plane Surface(87) = {86};
+Line Loop(88) = {18, 50, -19, -45};
+Plane Surface(89) = {88};
+Line Loop(90) = {19, 51, -20, -46};
+Plane Surface(91) = {90};
+Line Loop(92) = {20, 52, -21, -47};
+Plane Surface(93) = {92};
+Line Loop(94) = {21, 53, -22, -48};
+Plane Surface(95) = {94};
+Line Loop(96) = {23, 54, -24, -49};
+Plane Surface(97) = {96};
+Line Loop(98) = {24, 55, -25, -50};
+Plane Surface(99) = {98};
+Line Loop(100) = {25, 56, -26, -51};
+Plane Surface(101) = {100};
+Line Loop(102) = {26, 57, -27, -52};
+Plane Surface(103) = {102};
+Line Loop(104) = {27, 58, -28, -53};
+Plane Surface(105) = {104};
+Transfinite Surface{63, 65, 67, 69, 71, 73, 75, 77, 79, 81, 83, 85, 87, 89, 91, 93, 95, 97, 99, 101, 103, 105};
+Recombine Surface{63, 65, 67, 69, 71, 73, 75, 77, 79, 81, 83, 85, 87, 89, 91, 93, 95, 97, 99, 101, 103, 105};
+Periodic Line(29) = {54};
+Periodic Line(30) = {55};
+Periodic Line(31) = {56};
+Periodic Line(32) = {57};
+Periodic Line(33) = {58};
+
+Physical Line("minus_x") = {29, 30, 31, 32, 33};
+Physical Line("plus_x") = {54, 55, 56, 57, 58};
+Physical Surface("mat1") = {63, 65, 67, 69, 71, 73, 75, 77, 79, 81, 83, 85, 87, 89, 93, 95, 97, 99, 101, 103, 105};
+Physical Surface("mat2") = {91};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_structured_mesh_3d(self):
+        mesh = Crystal(**description(100)).mesh()
+        self.assertEquals(mesh.count('Layers{4}; Recombine;'), 22)
+        self.assertEquals(mesh.count('Transfinite Surface'), 1)
+
+    def test_structured_shapes(self):
+        ellipses = description()
+        ellipses['inclusion_types'][0].shape = 'ellipse'
+        self.assertRaises(AssertionError, Crystal, **ellipses)
+
+    def test_block_grid(self):
+        xs, ys, owners = block_grid(0, 10, 0, 4, [(2, 4, 1, 3),
+                                                  (8, 12, 0, 2)])
+        self.assertEquals(xs.tolist(), [0, 2, 4, 8, 10])
+        self.assertEquals(ys.tolist(), [0, 1, 2, 3, 4])
+        self.assertEquals(owners.tolist(), [[-1, -1, -1, -1],
+                                            [-1, 0, 0, -1],
+                                            [-1, -1, -1, -1],
+                                            [1, 1, -1, -1]])
+        sizes = numpy.array([[1.0, 2.0], [numpy.nan, 3.0]])
+        self.assertEquals(nb_nodes(numpy.array([5, 5]), sizes).tolist(),
+                          [6, 3])
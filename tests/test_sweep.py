@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+from generator import Crystal
+from sweep import MANIFEST, parameter_grid, sweep, with_parameters
+from tests.test_write_mesh import description
+
+
+def small_description():
+    result = description()
+    result['nb_x'] = result['nb_y'] = 2
+    result['physical_line_map'] = [('Line', [(0, 0, 0), (100, 0, 0)])]
+    return result
+
+
+GRIDS = [('space_x', [180, 300]), ('inclusion_types.0.el_size', [20, 30])]
+
+
+class SweepTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parameter_grid(self):
+        self.assertEquals(parameter_grid([('a', [1, 2]), ('b', [3, 4])]),
+                          [{'a': 1, 'b': 3}, {'a': 1, 'b': 4},
+                           {'a': 2, 'b': 3}, {'a': 2, 'b': 4}])
+
+    def test_inputs_unchanged(self):
+        base = small_description()
+        variant = with_parameters(base, {'inclusion_types.0.el_size': 30})
+        self.assertEquals(variant['inclusion_types'][0].el_size, 30)
+        self.assertEquals(base['inclusion_types'][0].el_size, 20)
+        # The same description gives the same crystal twice
+        self.assertEquals(Crystal(**base).mesh(), Crystal(**base).mesh())
+        self.assertEquals(base['physical_line_map'][0][1],
+                          [(0, 0, 0), (100, 0, 0)])
+
+    def test_sweep(self):
+        rows = sweep(small_description(), GRIDS, self.directory, image=True,
+                     max_workers=2, chunk_size=1)
+        self.assertEquals([row['index'] for row in rows], [0, 1, 2, 3])
+        self.assertEquals(rows[3]['parameters'],
+                          {'space_x': 300, 'inclusion_types.0.el_size': 30})
+        geo = open(os.path.join(self.directory, rows[3]['geo'])).read()
+        self.assertTrue(geo.startswith('//WriteMesh_00003, created'))
+        self.assertTrue('size_1 = 30;' in geo)
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    rows[3]['svg'])))
+
+    def test_errors(self):
+        rows = sweep(small_description(), [('crystal_shape', ['triangle'])],
+                     self.directory, max_workers=1)
+        self.assertEquals(rows[0]['error'], 'Wrong crystal type!')
+        self.assertEquals(rows[0]['error_type'], 'AssertionError')
+
+    def test_other_errors(self):
+        rows = sweep(small_description(), [('nb_x', ['two', 2])],
+                     self.directory, max_workers=1)
+        self.assertEquals(rows[0]['error_type'], 'TypeError')
+        self.assertFalse('geo' in rows[0])
+        self.assertEquals([filename for filename in os.listdir(self.directory)
+                           if filename.endswith('.tmp')], [])
+        self.assertFalse('error' in rows[1])
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    rows[1]['geo'])))
+
+    def test_resume(self):
+        sweep(small_description(), GRIDS, self.directory, max_workers=1)
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        lines = open(manifest_path).readlines()
+        self.assertEquals(len(lines), 4)
+        # A crash in the middle of the third row
+        manifest = open(manifest_path, 'w')
+        manifest.write(''.join(lines[:2]) + lines[2][:10])
+        manifest.close()
+        rows = sweep(small_description(), GRIDS, self.directory,
+                     max_workers=1)
+        self.assertEquals([row['index'] for row in rows], [0, 1, 2, 3])
+        rebuilt = [json.loads(line)['index']
+                   for line in open(manifest_path).readlines()[3:]]
+        self.assertEquals(sorted(rebuilt),
+                          sorted([json.loads(line)['index']
+                                  for line in lines[2:]]))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase
+from generator import Crystal
+from symmetry import clip_segment, mirror_invariant
+from tests.test_occ import description
+
+
+def symmetric_description():
+    result = description()
+    result['periodicity'] = (False, False, False)
+    result['nb_x'] = 3
+    result['basis'] = None
+    result['inclusion_map'] = [[1, 0, 1]]
+    result['physical_line_map'] = [('rcv', [(-200, 100, 0), (200, 100, 0)])]
+    result['symmetry'] = True
+    return result
+
+
+class SymmetryTests(GeneratorTestCase):
+    def test_mirror_invariant(self):
+        rows = [[0, -10, 5], [0, 10, 5], [1, 0, -5]]
+        self.assertTrue(mirror_invariant(rows, [1], 1e-3))
+        self.assertFalse(mirror_invariant(rows, [2], 1e-3))
+
+    def test_clip_segment(self):
+        self.assertEquals(clip_segment((-200, 100, 0), (200, 50, 0), 0),
+                          ((0, 75, 0), (200, 50, 0)))
+        self.assertEquals(clip_segment((-200, 100, 0), (-100, 50, 0), 0),
+                          None)
+        self.assertEquals(clip_segment((0, 100, 0), (200, 50, 0), 1),
+                          ((0, 100, 0), (200, 50, 0)))
+
+    def test_mirror_axes(self):
+        crystal = Crystal(**symmetric_description())
+        self.assertEquals(crystal.built().symmetry, (True, False))
+        self.assertEquals(crystal.symmetry, True)
+        asymmetric = symmetric_description()
+        asymmetric['inclusion_map'] = [[1, 0, 0]]
+        self.assertEquals(Crystal(**asymmetric).built().symmetry,
+                          (False, False))
+        periodic = symmetric_description()
+        periodic['periodicity'] = (True, False, False)
+        self.assertEquals(Crystal(**periodic).built().symmetry, (False, False))
+        without_line = symmetric_description()
+        without_line['physical_line_map'] = []
+        self.assertEquals(Crystal(**without_line).built().symmetry,
+                          (True, True))
+
+    def test_half_domain(self):
+        expected = """\
+//Occ, created with crystalpy
+SetFactory("OpenCASCADE");
+size_bulk = 25;
+size_1 = 20;
+size_2 = 15;
+
+Point(1) = {200, 100, 0, 25};
+Point(2) = {0, 100.0, 0.0, 25};
+
+Line(1) = {1, 2};
+Rectangle(2) = {0, -150.0, 0, 250.0, 300};
+Disk(3) = {0.0, 0.0, 0, 50.0};
+Disk(4) = {250.0, 0.0, 0, 50.0, 30.0};
+Rotate {{0, 0, 1}, {250.0, 0.0, 0}, Pi / 2} { Surface{4}; }
+Characteristic Length{ PointsOf{ Surface{2}; } } = size_bulk;
+Characteristic Length{ PointsOf{ Surface{3}; } } = size_1;
+Characteristic Length{ PointsOf{ Surface{4}; } } = size_2;
+clip_8() = BooleanIntersection{ Surface{3}; Delete; }{ Surface{2}; };
+clip_9() = BooleanIntersection{ Surface{4}; Delete; }{ Surface{2}; };
+matrix() = BooleanDifference{ Surface{2}; Delete; }{ Surface{clip_8()}; Delete; };
+BooleanFragments{ Surface{matrix()}; Delete; }{ Surface{clip_9()}; Curve{1}; Delete; }
+matrix() = Surface{:};
+matrix() -= {clip_9()};
+symmetry_x() = Curve In BoundingBox{-0.0005, -150.0005, -0.0005, 0.0005, 150.0005, 0.0005};
+
+Physical Line("rcv") = {1};
+Physical Surface("mat1") = {matrix()};
+Physical Surface("mat2") = {clip_9()};
+Physical Line("symmetry_x") = {symmetry_x()};
+"""
+        self.mesh_equal_string(symmetric_description(), expected)
+
+    def test_quarter_domain_3d(self):
+        quarter = symmetric_description()
+        quarter['dim_z'] = 200
+        quarter['physical_line_map'] = []
+        geo = Crystal(**quarter).mesh()
+        self.assertTrue('Box(1) = {0, 0, 0, 250.0, 150.0, 200};' in geo)
+        self.assertTrue('Physical Surface("symmetry_x")' in geo)
+        self.assertTrue('Physical Surface("symmetry_y")' in geo)
+
+    def test_occ_only(self):
+        explicit = symmetric_description()
+        explicit['output_mode'] = 'explicit'
+        self.assertRaises(AssertionError, Crystal, **explicit)
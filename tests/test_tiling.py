@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+from tests import GeneratorTestCase, base_description, inclusion_type
+from generator import Crystal
+from tiling import tile_cuts
+
+
+def description(dim_z=0):
+    holes = inclusion_type(dim_x = 40,
+                           dim_y = 40,
+                           dim_z = dim_z,
+                           el_size = 10)
+    return base_description(name = 'Tiles',
+                            dim_x = 200,
+                            dim_y = 100,
+                            dim_z = dim_z,
+                            periodicity = (True, False, False),
+                            space_x = 100,
+                            space_y = 100,
+                            el_size_bulk = 20,
+                            inclusion_map = None,
+                            inclusion_types = [holes],
+                            tiles = (2, 2))
+
+
+class TilingTests(GeneratorTestCase):
+    def test_tile_cuts(self):
+        lows = [0, 20, 40]
+        highs = [10, 30, 50]
+        self.assertEquals(tile_cuts(lows, highs, -5, 55, 3), [15, 35])
+        self.assertEquals(tile_cuts(lows, highs, -5, 55, 6),
+                          [-2.5, 15, 35, 52.5])
+        self.assertEquals(tile_cuts([0], [50], 0, 50, 2), [])
+        self.assertEquals(tile_cuts([], [], 0, 60, 3), [20, 40])
+
+    def test_tiles_2d(self):
+        expected = """\
+//Tiles, created with crystalpy
+size_bulk = 20;
+size_1 = 10;
+
+Point(1) = {-50.0, 0.0, 0, size_1};
+Point(2) = {-70.0, 0.0, 0, size_1};
+Point(3) = {-30.0, 0.0, 0, size_1};
+Point(4) = {50.0, 0.0, 0, size_1};
+Point(5) = {30.0, 0.0, 0, size_1};
+Point(6) = {70.0, 0.0, 0, size_1};
+Point(7) = {-100.0, -50.0, 0, size_bulk};
+Point(8) = {-100.0, -35.0, 0, size_bulk};
+Point(9) = {-100.0, 50.0, 0, size_bulk};
+Point(10) = {0.0, -50.0, 0, size_bulk};
+Point(11) = {0.0, -35.0, 0, size_bulk};
+Point(12) = {0.0, 50.0, 0, size_bulk};
+Point(13) = {100.0, -50.0, 0, size_bulk};
+Point(14) = {100.0, -35.0, 0, size_bulk};
+Point(15) = {100.0, 50.0, 0, size_bulk};
+
+Circle(1) = {2, 1, 3};
+Circle(2) = {3, 1, 2};
+Circle(3) = {5, 4, 6};
+Circle(4) = {6, 4, 5};
+Line(5) = {7, 10};
+Line(6) = {8, 11};
+Line(7) = {9, 12};
+Line(8) = {10, 13};
+Line(9) = {11, 14};
+Line(10) = {12, 15};
+Line(11) = {7, 8};
+Line(12) = {8, 9};
+Line(13) = {10, 11};
+Line(14) = {11, 12};
+Line(15) = {13, 14};
+Line(16) = {14, 15};
+Periodic Line(11) = {15};
+Periodic Line(12) = {16};
+Line Loop(19) = {11, 6, -13, -5};
+Plane Surface(20) = {19};
+Line Loop(21) = {12, 7, -14, -6, -1, -2};
+Plane Surface(22) = {21};
+Line Loop(23) = {13, 9, -15, -8};
+Plane Surface(24) = {23};
+Line Loop(25) = {14, 10, -16, -9, -3, -4};
+Plane Surface(26) = {25};
+
+Physical Line("minus_x") = {11, 12};
+Physical Line("plus_x") = {15, 16};
+Physical Surface("mat1") = {20, 22, 24, 26};
+"""
+        self.mesh_equal_string(description(), expected)
+
+    def test_tiles_3d(self):
+        result = Crystal(**description(50)).mesh()
+        self.assertEquals(result.count('\nVolume('), 4)
+        self.assertTrue('Physical Volume("mat1") = {' in result)
+        self.assertEquals(result.count('Periodic Surface('), 2)
+        self.assertEquals(result.count('Periodic Line('), 7)
+
+    def test_tiles_physical_line(self):
+        lines = description()
+        lines['physical_line_map'] = [('Receiver', [(-10, 0, 0), (10, 0, 0)])]
+        crystal = Crystal(**lines).built()
+        # No tile side crosses the physical line
+        self.assertEquals(crystal.tile_bounds[0], [-100, -20, 100])
+        self.assertTrue('Line{1} In Surface {27};' in crystal.mesh())
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+import numpy
+from disorder import random_packing
+from generator import Crystal, InclusionType
+from lattice import make_sites
+from tests.test_write_mesh import description
+from validation import find_conflicts
+
+
+class ValidationTests(TestCase):
+    def test_valid_crystal(self):
+        report = Crystal(**description()).validate()
+        self.assertEquals(report.outside, [17, 19])
+        valid = description()
+        valid['dim_x'] = 1200
+        report = Crystal(**valid).validate()
+        self.assertTrue(report.is_valid())
+        report = Crystal(**valid).validate(min_gap=90)
+        self.assertEquals(len(report.too_close), 16)
+        self.assertEquals(report.too_close[0], (0, 4, 80.0))
+        self.assertEquals(report.outside, [])
+
+    def test_conflicts(self):
+        rectangle = InclusionType(type='inclusion', shape='rectangle',
+                                  tag='mat2', dim_x=100, dim_y=60, dim_z=0,
+                                  el_size=20)
+        conflicts = description()
+        conflicts['inclusion_types'].append(rectangle)
+        # Crossing ellipses, touching rectangles, an ellipse close to a
+        # rectangle corner, and an ellipse crossing the matrix boundary
+        conflicts['sites'] = make_sites(
+            [0, 90, 300, 400, 0, 88, 470],
+            [0, 30, 0, 0, 300, 372, 300],
+            [0, 0, 1, 1, 1, 0, 0])
+        report = Crystal(**conflicts).validate(min_gap=10)
+        self.assertEquals(report.overlaps, [(0, 1), (2, 3)])
+        self.assertEquals([pair[:2] for pair in report.too_close], [(4, 5)])
+        self.assertTrue(0 < report.too_close[0][2] < 10)
+        self.assertEquals(report.outside, [6])
+
+    def test_random_packing(self):
+        sites = random_packing(2000, 2000, 0, 40, 0.4, min_gap=2, seed=3)
+        half = sites['dim_x'] / 2
+        ellipse = numpy.ones(len(sites), dtype=bool)
+        report = find_conflicts(sites['x'], sites['y'], half, half, ellipse,
+                                1000, 1000, min_gap=2)
+        self.assertEquals((report.overlaps, report.too_close), ([], []))
+        report = find_conflicts(sites['x'], sites['y'], half * 1.1, half,
+                                ellipse, 1000, 1000, min_gap=2)
+        self.assertFalse(report.is_valid())
+
+    def test_near_tangent(self):
+        # The second ellipse touches the first one at the angle t, where
+        # their normals are opposite, and is then moved along the normal
+        half_x = numpy.array([50., 20.])
+        half_y = numpy.array([30., 45.])
+        ellipse = numpy.ones(2, dtype=bool)
+        for t in numpy.linspace(0.1, 6, 12):
+            normal = numpy.array([numpy.cos(t) / 50, numpy.sin(t) / 30])
+            normal /= numpy.hypot(*normal)
+            contact = numpy.array([50 * numpy.cos(t), 30 * numpy.sin(t)])
+            radius = numpy.hypot(20 * normal[0], 45 * normal[1])
+            center = contact + numpy.array([20 ** 2 * normal[0],
+                                            45 ** 2 * normal[1]]) / radius
+            for shift, overlapping in [(-1e-4, True), (1e-4, False)]:
+                x, y = center + shift * normal
+                report = find_conflicts(numpy.array([0, x]),
+                                        numpy.array([0, y]), half_x, half_y,
+                                        ellipse, numpy.inf, numpy.inf)
+                self.assertEquals(bool(report.overlaps), overlapping)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from tests import base_description, inclusion_type
+from generator import Crystal
+
+
+def description():
+    holes = inclusion_type(dim_z = 300)
+    return base_description(name = 'WriteMesh',
+                            dim_x = 1000,
+                            dim_y = 1000,
+                            periodicity = (True, True, False),
+                            nb_x = 5,
+                            nb_y = 4,
+                            space_x = 180,
+                            crystal_shape = 'hexa',
+                            inclusion_map = None,
+                            inclusion_types = [holes],
+                            physical_point_map = [('PointSource',
+                                                   [(0, 0, 0)])])
+
+
+class WriteMeshTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_mesh_gzip(self):
+        expected = Crystal(**description()).mesh()
+        path = os.path.join(self.directory, 'WriteMesh.geo.gz')
+        fileobj = gzip.open(path, 'wb')
+        Crystal(**description()).write_mesh(fileobj)
+        fileobj.close()
+        fileobj = gzip.open(path, 'rb')
+        self.assertEquals(fileobj.read(), expected)
+        fileobj.close()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Splitting of the matrix into tiles, along the gaps between inclusions."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+def free_intervals(lows, highs, bound_min, bound_max):
+    """
+    Intervals of [bound_min, bound_max] which meet none of the
+    [lows[k], highs[k]] ones.
+
+    @return: (starts, ends) arrays
+    """
+    order = numpy.argsort(lows, kind='mergesort')
+    reach = numpy.maximum.accumulate(numpy.asarray(highs, dtype=float)[order])
+    starts = numpy.concatenate([[bound_min], reach])
+    ends = numpy.concatenate([numpy.asarray(lows, dtype=float)[order],
+                              [bound_max]])
+    free = ends > starts
+    return starts[free], ends[free]
+
+
+def tile_cuts(lows, highs, bound_min, bound_max, nb_tiles):
+    """
+    Positions of the cuts splitting [bound_min, bound_max] into about
+    nb_tiles tiles, none of them crossing a [lows[k], highs[k]] interval.
+
+    Each cut is put in the middle of the free interval closest to its
+    place in an even split, so there are fewer tiles when the intervals
+    leave no room for some cuts.
+    """
+    targets = (bound_min + (bound_max - bound_min)
+               * numpy.arange(1, nb_tiles) / nb_tiles)
+    if len(targets) == 0:
+        return []
+    if len(lows) == 0:
+        return targets.tolist()
+    starts, ends = free_intervals(lows, highs, bound_min, bound_max)
+    middles = (starts + ends) / 2
+    middles = middles[(middles > bound_min) & (middles < bound_max)]
+    if len(middles) == 0:
+        return []
+    nearest = abs(middles[:, None] - targets).argmin(axis=0)
+    return numpy.unique(middles[nearest]).tolist()
+
+
+def tile_indices(positions, cuts):
+    """Index of the tile of each position, along an axis."""
+    return numpy.searchsorted(cuts, positions)
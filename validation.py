@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""Detection of the overlapping inclusions of a crystal."""
+
+from __future__ import division
+import numpy
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+# Number of points sampled on the boundary of an ellipse, to compute its
+# distance to another shape
+NB_SAMPLES = 64
+
+# Number of candidate pairs handled at once by the sampled distances
+PAIRS_CHUNK_SIZE = 256
+
+# Tolerance of the exact intersection tests, on the equations of the
+# ellipses, which are scaled to the unit circle
+EXACT_TOLERANCE = 1e-12
+
+# Neighbouring cells of a cell, each pair of cells being seen only once
+NEIGHBOURS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+class ValidationReport:
+    def __init__(self, overlaps, too_close, outside):
+        """
+        @param overlaps: (index1, index2) of the intersecting or touching
+            inclusions
+        @param too_close: (index1, index2, gap) of the inclusions closer
+            than the minimal gap
+        @param outside: indices of the inclusions crossing, touching or
+            too close to the boundary of the matrix
+        """
+        self.overlaps = overlaps
+        self.too_close = too_close
+        self.outside = outside
+
+    def is_valid(self):
+        return not (self.overlaps or self.too_close or self.outside)
+
+    def __repr__(self):
+        return ("%d overlapping pairs, %d pairs too close, "
+                "%d inclusions out of the matrix"
+                % (len(self.overlaps), len(self.too_close),
+                   len(self.outside)))
+
+
+def candidate_pairs(x, y, half_x, half_y, min_gap):
+    """
+    Return the pairs of shapes whose bounding boxes are closer than min_gap.
+
+    The shapes are hashed on a uniform grid whose cells are larger than any
+    bounding box, so that only the shapes of neighbouring cells need to be
+    compared, in a time linear with the number of shapes.
+    """
+    nb_shapes = len(x)
+    if nb_shapes < 2:
+        return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+    cell_size = 2 * max(half_x.max(), half_y.max()) + min_gap
+    cells_x = numpy.floor((x - x.min()) / cell_size).astype(numpy.int64)
+    cells_y = numpy.floor((y - y.min()) / cell_size).astype(numpy.int64)
+    # Margin of one cell, so that the neighbours of a cell never wrap
+    stride = cells_y.max() + 3
+    keys = cells_x * stride + cells_y + 1
+
+    order = numpy.argsort(keys, kind='mergesort')
+    cell_keys, starts, counts = numpy.unique(keys[order], return_index=True,
+                                             return_counts=True)
+    firsts, seconds = [], []
+    for offset_x, offset_y in NEIGHBOURS:
+        neighbour_keys = cell_keys + offset_x * stride + offset_y
+        neighbours = numpy.searchsorted(cell_keys, neighbour_keys)
+        neighbours[neighbours == len(cell_keys)] = 0
+        found = cell_keys[neighbours] == neighbour_keys
+        cells_1 = numpy.flatnonzero(found)
+        cells_2 = neighbours[found]
+        # All the pairs made of one shape of each cell
+        sizes = counts[cells_1] * counts[cells_2]
+        pair_cells_1 = numpy.repeat(cells_1, sizes)
+        pair_cells_2 = numpy.repeat(cells_2, sizes)
+        ranks = (numpy.arange(sizes.sum())
+                 - numpy.repeat(numpy.cumsum(sizes) - sizes, sizes))
+        ranks_1 = ranks // counts[pair_cells_2]
+        ranks_2 = ranks % counts[pair_cells_2]
+        if (offset_x, offset_y) == (0, 0):
+            distinct = ranks_1 < ranks_2
+            pair_cells_1, ranks_1 = pair_cells_1[distinct], ranks_1[distinct]
+            pair_cells_2, ranks_2 = pair_cells_2[distinct], ranks_2[distinct]
+        firsts.append(order[starts[pair_cells_1] + ranks_1])
+        seconds.append(order[starts[pair_cells_2] + ranks_2])
+    firsts = numpy.concatenate(firsts)
+    seconds = numpy.concatenate(seconds)
+
+    close = ((abs(x[firsts] - x[seconds])
+              <= half_x[firsts] + half_x[seconds] + min_gap)
+             & (abs(y[firsts] - y[seconds])
+                <= half_y[firsts] + half_y[seconds] + min_gap))
+    return firsts[close], seconds[close]
+
+
+def boxes_gaps(x1, y1, half_x1, half_y1, x2, y2, half_x2, half_y2):
+    """Distance between rectangles, negative when they intersect."""
+    gap_x = abs(x1 - x2) - half_x1 - half_x2
+    gap_y = abs(y1 - y2) - half_y1 - half_y2
+    return numpy.where((gap_x > 0) | (gap_y > 0),
+                       numpy.hypot(numpy.maximum(gap_x, 0),
+                                   numpy.maximum(gap_y, 0)),
+                       numpy.maximum(gap_x, gap_y))
+
+
+def boundary(x, y, half_x, half_y, ellipse):
+    """Points sampled on the boundaries of shapes, of shape (n, samples)."""
+    angles = numpy.linspace(0, 2 * numpy.pi, NB_SAMPLES, endpoint=False)
+    cos, sin = numpy.cos(angles), numpy.sin(angles)
+    # The points of a rectangle are taken on the same rays as for an
+    # ellipse, pushed to its boundary
+    scale = numpy.where(ellipse[:, None], 1,
+                        1 / numpy.maximum(abs(cos), abs(sin)))
+    return (x[:, None] + half_x[:, None] * scale * cos,
+            y[:, None] + half_y[:, None] * scale * sin)
+
+
+def inside(points_x, points_y, x, y, half_x, half_y, ellipse):
+    """Tell which points are inside or on the shapes, given by pair."""
+    dx = (points_x - x[:, None]) / half_x[:, None]
+    dy = (points_y - y[:, None]) / half_y[:, None]
+    return numpy.where(ellipse[:, None], dx ** 2 + dy ** 2 <= 1,
+                       numpy.maximum(abs(dx), abs(dy)) <= 1)
+
+
+def sampled_gaps(x1, y1, half_x1, half_y1, ellipse1,
+                 x2, y2, half_x2, half_y2, ellipse2):
+    """
+    Approximate distance between shapes, negative when they intersect.
+
+    The distance is the one between points sampled on their boundaries, so
+    it is overestimated by less than the sampling errors of the shapes.
+    The shapes which are not seen intersecting, but are closer than these
+    errors, are checked exactly, so that no intersection is missed.
+    """
+    gaps = numpy.empty(len(x1))
+    for start in range(0, len(x1), PAIRS_CHUNK_SIZE):
+        chunk = slice(start, start + PAIRS_CHUNK_SIZE)
+        shape1 = (x1[chunk], y1[chunk], half_x1[chunk], half_y1[chunk],
+                  ellipse1[chunk])
+        shape2 = (x2[chunk], y2[chunk], half_x2[chunk], half_y2[chunk],
+                  ellipse2[chunk])
+        points_x1, points_y1 = boundary(*shape1)
+        points_x2, points_y2 = boundary(*shape2)
+        distances = numpy.hypot(points_x1[:, :, None] - points_x2[:, None],
+                                points_y1[:, :, None] - points_y2[:, None])
+        intersect = (inside(points_x1, points_y1, *shape2).any(axis=1)
+                     | inside(points_x2, points_y2, *shape1).any(axis=1))
+        gaps[chunk] = numpy.where(intersect, -1,
+                                  distances.min(axis=2).min(axis=1))
+
+    unsure = numpy.flatnonzero(
+        (gaps > 0) & (gaps <= sampling_error(half_x1, half_y1)
+                      + sampling_error(half_x2, half_y2)))
+    shape1 = [array[unsure] for array in (x1, y1, half_x1, half_y1,
+                                          ellipse1)]
+    shape2 = [array[unsure] for array in (x2, y2, half_x2, half_y2,
+                                          ellipse2)]
+    gaps[unsure[shapes_intersect(shape1, shape2)]] = -1
+    return gaps
+
+
+def sampling_error(half_x, half_y):
+    """
+    Bound of the distance between any point of the boundary of a shape
+    and the nearest point sampled on it, which is less than the length of
+    the sampled arcs.
+    """
+    return 2 * numpy.pi / NB_SAMPLES * 2 * numpy.maximum(half_x, half_y)
+
+
+def ellipse_values(x, y, center_x, center_y, half_x, half_y):
+    """Negative inside the ellipses, zero on them and positive outside."""
+    return (((x - center_x) / half_x) ** 2
+            + ((y - center_y) / half_y) ** 2 - 1)
+
+
+def shapes_intersect(shape1, shape2):
+    """
+    Tell exactly which shapes, given by pair, intersect or touch, at least
+    one of each pair being an ellipse.
+
+    Two convex shapes intersect when the boundary of one meets the other,
+    or when one is inside the other, and so contains its center.  The
+    boundary of an ellipse or a rectangle meets an ellipse when the
+    minimum of the equation of the ellipse on it is not positive.
+
+    @param shape1, shape2: (x, y, half_x, half_y, ellipse) arrays
+    """
+    x1, y1, half_x1, half_y1, ellipse1 = shape1
+    x2, y2, half_x2, half_y2, ellipse2 = shape2
+    # The ellipse of each pair is the second shape
+    swap = ~ellipse2
+    for first, second in zip(shape1, shape2):
+        first[swap], second[swap] = second[swap], first[swap].copy()
+    minimums = numpy.where(
+        ellipse1,
+        ellipse_minimums(x1, y1, half_x1, half_y1, x2, y2, half_x2, half_y2),
+        rectangle_minimums(x1, y1, half_x1, half_y1,
+                           x2, y2, half_x2, half_y2))
+    center_inside = (ellipse_values(x1, y1, x2, y2, half_x2, half_y2) <= 0)
+    center_inside |= numpy.where(
+        ellipse1,
+        ellipse_values(x2, y2, x1, y1, half_x1, half_y1) <= 0,
+        (abs(x2 - x1) <= half_x1) & (abs(y2 - y1) <= half_y1))
+    return (minimums <= EXACT_TOLERANCE) | center_inside
+
+
+def ellipse_minimums(x1, y1, half_x1, half_y1, x2, y2, half_x2, half_y2):
+    """
+    Minimums of the equations of the second ellipses on the first ones.
+
+    On the point (x1 + half_x1 cos t, y1 + half_y1 sin t), the equation is
+    a trigonometric polynomial of t of degree 2, whose derivative becomes
+    a quartic of tan(t / 2), solved for each pair.
+    """
+    u = (x1 - x2) / half_x2
+    v = (y1 - y2) / half_y2
+    p = half_x1 / half_x2
+    q = half_y1 / half_y2
+    minimums = numpy.empty(len(u))
+    for index in range(len(u)):
+        u_i, v_i, p_i, q_i = u[index], v[index], p[index], q[index]
+        roots = numpy.roots([-v_i * q_i,
+                             -2 * u_i * p_i - 2 * (q_i ** 2 - p_i ** 2),
+                             0,
+                             -2 * u_i * p_i + 2 * (q_i ** 2 - p_i ** 2),
+                             v_i * q_i])
+        # Near a double root, as for touching ellipses, the roots may get
+        # a small imaginary part
+        angles = numpy.append(2 * numpy.arctan(roots.real), numpy.pi)
+        minimums[index] = ((u_i + p_i * numpy.cos(angles)) ** 2
+                           + (v_i + q_i * numpy.sin(angles)) ** 2 - 1).min()
+    return minimums
+
+
+def rectangle_minimums(x1, y1, half_x1, half_y1, x2, y2, half_x2, half_y2):
+    """
+    Minimums of the equations of the ellipses on the sides of the
+    rectangles, on each of which the equation is a quadratic.
+    """
+    minimums = numpy.empty(len(x1))
+    minimums.fill(numpy.inf)
+    corners = [(-1, -1), (1, -1), (1, 1), (-1, 1), (-1, -1)]
+    for (sign_x1, sign_y1), (sign_x2, sign_y2) in zip(corners[:-1],
+                                                      corners[1:]):
+        # Side from (start_x, start_y) along (side_x, side_y), scaled so
+        # that the ellipse is the unit circle
+        start_x = (x1 + sign_x1 * half_x1 - x2) / half_x2
+        start_y = (y1 + sign_y1 * half_y1 - y2) / half_y2
+        side_x = (sign_x2 - sign_x1) * half_x1 / half_x2
+        side_y = (sign_y2 - sign_y1) * half_y1 / half_y2
+        parameters = numpy.clip(
+            -(start_x * side_x + start_y * side_y)
+            / (side_x ** 2 + side_y ** 2), 0, 1)
+        minimums = numpy.minimum(
+            minimums, (start_x + parameters * side_x) ** 2
+            + (start_y + parameters * side_y) ** 2 - 1)
+    return minimums
+
+
+def find_conflicts(x, y, half_x, half_y, ellipse,
+                   domain_half_x, domain_half_y, min_gap=0):
+    """
+    Check a layout of inclusions in a matrix centered on (0, 0).
+
+    @param x, y: centers of the inclusions
+    @param half_x, half_y: half dimensions of the inclusions
+    @param ellipse: true for the elliptic inclusions, false for the
+        rectangular ones
+    @return: ValidationReport
+    """
+    firsts, seconds = candidate_pairs(x, y, half_x, half_y, min_gap)
+    shape1 = (x[firsts], y[firsts], half_x[firsts], half_y[firsts])
+    shape2 = (x[seconds], y[seconds], half_x[seconds], half_y[seconds])
+    gaps = boxes_gaps(*(shape1 + shape2))
+
+    circles = ellipse & (half_x == half_y)
+    both_circles = circles[firsts] & circles[seconds]
+    gaps[both_circles] = (numpy.hypot(x[firsts] - x[seconds],
+                                      y[firsts] - y[seconds])
+                          - half_x[firsts] - half_x[seconds])[both_circles]
+
+    # The distance between bounding boxes is a lower bound of the distance
+    # between shapes, so only the boxes closer than min_gap are refined
+    sampled = ((ellipse[firsts] | ellipse[seconds]) & ~both_circles
+               & (gaps < min_gap))
+    shape1 = tuple([array[sampled] for array in shape1]
+                   + [ellipse[firsts][sampled]])
+    shape2 = tuple([array[sampled] for array in shape2]
+                   + [ellipse[seconds][sampled]])
+    gaps[sampled] = sampled_gaps(*(shape1 + shape2))
+
+    overlapping = gaps <= 0
+    close = ~overlapping & (gaps < min_gap)
+    overlaps = zip(firsts[overlapping].tolist(), seconds[overlapping].tolist())
+    too_close = zip(firsts[close].tolist(), seconds[close].tolist(),
+                    gaps[close].tolist())
+
+    outside = numpy.flatnonzero(
+        (abs(x) + half_x + min_gap >= domain_half_x)
+        | (abs(y) + half_y + min_gap >= domain_half_y))
+    return ValidationReport(sorted(overlaps), sorted(too_close),
+                            outside.tolist())
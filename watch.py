@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Regeneration of the geometry of a crystal at each edit of its description.
+
+Usage: python watch.py description.py directory
+
+The description file is a Python script defining a dict named description,
+holding the arguments of Crystal.  Its storage is forced to 'sections', so
+that only the files of the edited parts of the crystal are written again.
+"""
+
+from __future__ import division
+import os
+import sys
+import time
+import traceback
+from generator import Crystal
+
+__copyright__ = "© 2012 Peter Potrowl <peter017@gmail.com>"
+
+__license__ = """
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see U{http://www.gnu.org/licenses/}.
+"""
+
+
+def load_description(path):
+    """Run a description file, and return its description dict."""
+    namespace = {'__file__': path}
+    execfile(path, namespace)
+    return namespace['description']
+
+
+def regenerate(path, directory):
+    """
+    Write the sections of the crystal of a description file.
+
+    @return: names of the files written
+    """
+    description = dict(load_description(path))
+    description['storage'] = 'sections'
+    return Crystal(**description).write_sections(directory)
+
+
+def watch(path, directory, interval=1, nb_checks=None):
+    """
+    Regenerate the crystal of a description file each time it is modified.
+    The errors of a description being edited are printed, and the next
+    edit is waited for.
+
+    @param interval: time between two checks of the file, in seconds
+    @param nb_checks: number of checks before returning, None for ever
+    """
+    modified = None
+    checks = 0
+    while nb_checks is None or checks < nb_checks:
+        if checks:
+            time.sleep(interval)
+        checks += 1
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        # The size tells apart the edits made in the same second
+        if (stat.st_mtime, stat.st_size) == modified:
+            continue
+        modified = (stat.st_mtime, stat.st_size)
+        try:
+            written = regenerate(path, directory)
+        except Exception:
+            traceback.print_exc()
+            continue
+        print 'Written: %s' % (', '.join(written) or 'nothing')
+
+
+if __name__ == '__main__':
+    watch(sys.argv[1], sys.argv[2])